@@ -4,25 +4,26 @@ SwitchBot Monitor - ダッシュボード形式
 🏠 統合デバイス管理ダッシュボード
 """
 
-import streamlit as st
-import os
-from datetime import datetime
-from switchbot_api import SwitchBotAPI
-from dotenv import load_dotenv
+import time
 
-# .envファイルを読み込み
-load_dotenv()
+# スクリプト実行開始時刻（初回描画までの時間計測用）
+_RUN_START = time.perf_counter()
 
-# ページ設定
-st.set_page_config(
-    page_title="SwitchBot Monitor",
-    page_icon="🏠",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
+import importlib
+import os
+import streamlit as st
+from datetime import datetime
+from account_pool import AccountPool, AccountRouter, load_accounts
+from command_dispatch import CommandDispatcher
+from switchbot_api import AC_FAN_VALUES, AC_MODE_VALUES, format_set_all
+from ir_state import get_state_store
+from device_index import CATEGORIES, index_for, load_rooms
+from settings import SettingsStore, apply_to_pool
+from status_cache import StatusCache
+from status_sources import BleAdvertisementSource, CloudSource, RingBufferSource, newest_reading
 
 # カスタムCSS
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .summary-card {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -42,6 +43,10 @@ st.markdown("""
     .thermometer-card {
         border-left: 4px solid #3498db;
     }
+    .thermometer-card.stale {
+        border-left-color: #e67e22;
+        background: #fdf5ec;
+    }
     .tv-card {
         border-left: 4px solid #e74c3c;
     }
@@ -75,7 +80,259 @@ st.markdown("""
         padding: 0.3rem 0.5rem;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# 開いたときだけ読み込むパネル: (キー, ラベル, "モジュール:関数")
+OPTIONAL_PANELS = [
+    ("startup", "⏱️ 起動メトリクス", "startup_metrics:render_startup_panel"),
+    ("alerts", "🚨 アラート", "alert_engine:render_alerts_panel"),
+    ("forecast", "📈 温度予測", "forecast:render_forecast_panel"),
+    ("anomaly", "🩺 センサー異常", "anomaly:render_anomaly_panel"),
+    ("runtime", "🔌 稼働時間", "runtime_ledger:render_runtime_panel"),
+]
+
+@st.cache_resource
+def get_settings_store():
+    """設定ファイルを読み込み、変更を監視（不正な設定は起動時に例外）"""
+    store = SettingsStore()
+    store.start_watching()
+    return store
+
+def get_settings():
+    """現在の設定（ファイルの変更は再起動なしで反映される）"""
+    return get_settings_store().settings
+
+@st.cache_resource
+def get_pool():
+    """アカウントごとのクライアントとデバイスカタログを取得（プロセスごとに1回だけ生成）"""
+    accounts = load_accounts()
+    if not accounts:
+        return None
+    pool = AccountPool(accounts)
+    get_settings_store().subscribe(lambda settings: apply_to_pool(pool, settings))
+    pool.start_catalogs()
+    return pool
+
+@st.cache_resource
+def get_dispatcher():
+    """コマンド送信用のワーカーを取得（プロセスごとに1回だけ生成）"""
+    return CommandDispatcher(max_workers=get_settings().concurrency.command_workers)
+
+def dispatch(device_id, label, send, api=None, expected=None):
+    """
+    コマンドをバックグラウンドで送信し、すぐに画面へ戻る
+    
+    物理デバイスは api と expected（例: {"power": "on"}）を渡すと、送信後に状態を再取得して結果を確認する
+    """
+    check = (lambda: api.get_device_status(device_id)) if api is not None and expected else None
+    get_dispatcher().submit(device_id, label, send, check, expected)
+
+# 送信結果を表示し続ける秒数
+COMMAND_RESULT_SECONDS = 300
+
+def display_command_state(device_id):
+    """カードの最後に直近のコマンドの状態を表示（送信中は1秒ごとに更新）"""
+    command = get_dispatcher().latest(device_id)
+    if command is None:
+        return
+    if command.pending:
+        st.fragment(_watch_command, run_every=1)(device_id)
+    elif time.time() - command.finished_at < COMMAND_RESULT_SECONDS:
+        _show_command(command)
+
+def _watch_command(device_id):
+    command = get_dispatcher().latest(device_id)
+    if not command.pending:
+        # 結果が出たらカード全体を再描画して状態を反映
+        st.rerun()
+    _show_command(command)
+
+def _show_command(command):
+    if command.state == "sending":
+        st.caption(f"⏳ {command.label}: 送信中...")
+    elif command.state == "confirming":
+        st.caption(f"⏳ {command.label}: 送信済み・デバイスの状態を確認中...")
+    elif command.state == "sent":
+        st.success(f"✅ {command.label}")
+    elif command.state == "confirmed":
+        st.success(f"✅ {command.label}（デバイスの状態を確認済み）")
+    elif command.state == "mismatch":
+        actual = ", ".join(f"{k}: {(command.status or {}).get(k, '?')}" for k in command.expected)
+        st.warning(f"⚠️ {command.label}: デバイスの状態が変わっていません（現在 {actual}）")
+    else:
+        st.error(f"❌ {command.label}エラー: {command.error}")
+
+@st.fragment(run_every=3)
+def watch_catalog(pool):
+    """カタログが変わったときだけ画面を再描画"""
+    if st.session_state.get('catalog_version') != pool.version:
+        st.session_state['catalog_version'] = pool.version
+        st.rerun()
+
+def select_sites(pool):
+    """複数拠点のときはサイドバーで表示する拠点を選択"""
+    if len(pool.sites) <= 1:
+        return pool.sites
+    selected = st.sidebar.multiselect("🏢 拠点", pool.sites, default=pool.sites, key="sites")
+    for site in pool.sites:
+        budget = pool.budget(site)
+        st.sidebar.caption(f"{site}: 残りAPI {budget.remaining}/{budget.daily_limit}")
+    return selected or pool.sites
+
+# 1ページに表示するデバイス数の選択肢
+PAGE_SIZES = [6, 12, 24, 48]
+
+def select_view_options():
+    """サイドバーで検索・絞り込み・表示方法を選択"""
+    st.sidebar.markdown("### 🔍 表示")
+    query = st.sidebar.text_input("デバイス検索", key="device_search", placeholder="名前・ID・種別・部屋")
+    categories = st.sidebar.multiselect(
+        "カテゴリ", list(CATEGORIES), default=list(CATEGORIES),
+        format_func=lambda key: f"{CATEGORIES[key].icon} {CATEGORIES[key].label}", key="categories")
+    default_size = get_settings().layout.page_size
+    page_size = st.sidebar.select_slider("1ページの件数", sorted(set(PAGE_SIZES + [default_size])),
+                                         value=default_size, key="page_size")
+    group_by_room = st.sidebar.toggle("部屋ごとにまとめる", key="group_by_room")
+    meter_table = st.sidebar.toggle("温度計を表で表示", key="meter_table")
+    return {
+        'query': query,
+        'categories': categories or list(CATEGORIES),
+        'page_size': page_size,
+        'group_by_room': group_by_room,
+        'meter_table': meter_table,
+    }
+
+def paginate(items, page_size, key):
+    """表示中のページの要素だけを返す（複数ページのときはページ選択を表示）"""
+    pages = max(1, (len(items) + page_size - 1) // page_size)
+    if pages == 1:
+        return items
+    page = st.number_input(f"ページ（全{pages}ページ・{len(items)}台）", 1, pages, 1, key=f"page_{key}")
+    start = (page - 1) * page_size
+    return items[start:start + page_size]
+
+@st.cache_resource
+def get_status_cache():
+    """デバイス状態のキャッシュを取得（プロセス内で共有。再取得までの秒数は設定の cache.max_age）"""
+    settings = get_settings()
+    return StatusCache(max_age=settings.cache.max_age_for('default'),
+                       max_workers=settings.concurrency.status_refresh_workers)
+
+@st.cache_resource
+def get_local_sources():
+    """APIを消費しない状態の取得元（ポーリングサービスのリングバッファ、SWITCHSENSE_BLE=1 ならBLE受信も）"""
+    sources = [RingBufferSource()]
+    if os.getenv("SWITCHSENSE_BLE") == "1":
+        ble = BleAdvertisementSource()
+        try:
+            ble.start()
+            sources.append(ble)
+        except Exception as e:
+            print(f"[ble] {str(e)}")
+    return sources
+
+@st.fragment(run_every=2)
+def watch_statuses():
+    """バックグラウンド更新で新しい値が届いたときだけ画面を再描画"""
+    if st.session_state.get('status_version') != get_status_cache().version:
+        st.rerun()
+
+def get_meter_status(device_id, api):
+    """
+    温度計の最後の値をすぐに返す（APIの応答は待たない）
+    
+    ローカルの取得元（リングバッファ・BLE）の値を優先し、古ければバックグラウンドでAPIから更新する
+    """
+    cache = get_status_cache()
+    reading = newest_reading(get_local_sources(), device_id)
+    if reading is not None:
+        cache.put(device_id, reading.to_dict(), reading.timestamp)
+    cloud = CloudSource(api)
+    return cache.get(device_id, lambda: _reading_dict(cloud.read(device_id)),
+                     max_age=get_settings().cache.max_age_for('thermometer'))
+
+def _reading_dict(reading):
+    return None if reading is None else reading.to_dict()
+
+def format_age(seconds):
+    """経過秒数を「3分前」のような表記に変換"""
+    if seconds < 60:
+        return "たった今"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}分前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}時間前"
+    return f"{int(seconds // 86400)}日前"
+
+def display_meter_table(devices, api, rooms):
+    """温度計を1つの表で表示（カードより軽量）"""
+    rows = []
+    for device in devices:
+        device_id = device.get('deviceId', 'N/A')
+        row = {
+            '名前': device.get('deviceName', 'Unknown'),
+            '部屋': rooms.get(device_id, ''),
+            '温度 (°C)': None,
+            '湿度 (%)': None,
+            '電池 (%)': None,
+            '更新': '取得中...',
+            'ID': device_id,
+        }
+        cached = get_meter_status(device_id, api)
+        if cached.value:
+            row.update({'温度 (°C)': cached.value.get('temperature'), '湿度 (%)': cached.value.get('humidity'),
+                        '電池 (%)': cached.value.get('battery'), '更新': format_age(cached.age())})
+        rows.append(row)
+    st.dataframe(rows, hide_index=True, column_config={
+        '温度 (°C)': st.column_config.NumberColumn(format="%.1f"),
+        '電池 (%)': st.column_config.ProgressColumn(min_value=0, max_value=100, format="%d%%"),
+    })
+
+def display_device_grid(devices, render, api, columns):
+    """デバイスカードをグリッドで表示"""
+    cols = st.columns(min(columns, len(devices)))
+    for i, device in enumerate(devices):
+        with cols[i % len(cols)]:
+            render(device, api)
+
+@st.cache_resource
+def get_startup_timings():
+    """プロセス全体で共有する起動時間の記録"""
+    return {}
+
+def setup_page():
+    """ページ設定とCSSを適用"""
+    st.set_page_config(
+        page_title="SwitchBot Monitor",
+        page_icon="🏠",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+def record_first_paint():
+    """初回描画までの時間を記録"""
+    timings = get_startup_timings()
+    elapsed_ms = (time.perf_counter() - _RUN_START) * 1000
+    timings['first_paint_ms'] = elapsed_ms
+    if 'cold_first_paint_ms' not in timings:
+        timings['cold_first_paint_ms'] = elapsed_ms
+        print(f"[startup] time-to-first-paint: {elapsed_ms:.0f} ms")
+
+def record_render_complete():
+    """全体描画の完了時間を記録"""
+    get_startup_timings()['last_render_ms'] = (time.perf_counter() - _RUN_START) * 1000
+
+def render_optional_panels(api, catalog):
+    """サイドバーで選択されたパネルだけをimportして表示"""
+    context = {'timings': get_startup_timings(), 'devices': catalog.devices, 'remotes': catalog.remotes}
+    for key, label, target in OPTIONAL_PANELS:
+        if not st.sidebar.toggle(label, key=f"panel_{key}"):
+            continue
+        module_name, func_name = target.split(":")
+        render = getattr(importlib.import_module(module_name), func_name)
+        with st.expander(label, expanded=True):
+            render(api, context)
 
 def display_summary_cards(devices_summary):
     """サマリーカードを表示"""
@@ -97,51 +354,63 @@ def display_summary_cards(devices_summary):
     st.write(" | ".join(summary_text))
 
 def display_thermometer_card(device, api):
-    """温度計カードを表示"""
+    """温度計カードを表示（最後の値をすぐに表示し、古ければ裏で更新）"""
     device_name = device.get('deviceName', 'Unknown')
     device_id = device.get('deviceId', 'N/A')
     
-    try:
-        device_status = api.get_device_status(device_id)
-        if device_status:
-            temperature = device_status.get('temperature', 0)
-            humidity = device_status.get('humidity', 0)
-            battery = device_status.get('battery', 0)
-            
-            # バッテリー状態の色を取得
-            if battery >= 80:
-                battery_color = "🟢"
-            elif battery >= 50:
-                battery_color = "🟡"
-            elif battery >= 20:
-                battery_color = "🟠"
-            else:
-                battery_color = "🔴"
-            
-            st.markdown(f"""
-            <div class="device-card thermometer-card">
-                <h4>🌡️ {device_name}</h4>
-                <div class="metric-row">
-                    <span><strong>{temperature:.1f}°C</strong></span>
-                    <span>💧 {humidity}%</span>
-                    <span>{battery_color} {battery}%</span>
-                </div>
-                <small>ID: {device_id}</small>
-            </div>
-            """, unsafe_allow_html=True)
+    cached = get_meter_status(device_id, api)
+    device_status = cached.value
+    if device_status:
+        # BLE・リングバッファの値は項目が欠けている（None）ことがある
+        temperature = device_status.get('temperature')
+        humidity = device_status.get('humidity')
+        battery = device_status.get('battery')
+        
+        # バッテリー状態の色を取得
+        if battery is None:
+            battery_color = "⚪"
+        elif battery >= 80:
+            battery_color = "🟢"
+        elif battery >= 50:
+            battery_color = "🟡"
+        elif battery >= 20:
+            battery_color = "🟠"
         else:
-            st.markdown(f"""
-            <div class="device-card thermometer-card">
-                <h4>🌡️ {device_name}</h4>
-                <p>❌ データ取得エラー</p>
-                <small>ID: {device_id}</small>
+            battery_color = "🔴"
+        
+        # 値の鮮度（古い値は色を変えて警告）
+        age = cached.age()
+        stale = age > get_settings().cache.stale
+        freshness = f"{'⚠️' if stale else '🕒'} {format_age(age)}"
+        if cached.refreshing:
+            freshness += "・更新中"
+        elif cached.error:
+            freshness += "・更新失敗"
+        
+        st.markdown(f"""
+        <div class="device-card thermometer-card{' stale' if stale else ''}">
+            <h4>🌡️ {device_name}</h4>
+            <div class="metric-row">
+                <span><strong>{'—' if temperature is None else f'{temperature:.1f}'}°C</strong></span>
+                <span>💧 {'—' if humidity is None else humidity}%</span>
+                <span>{battery_color} {'—' if battery is None else battery}%</span>
             </div>
-            """, unsafe_allow_html=True)
-    except Exception as e:
+            <small>{freshness} | ID: {device_id}</small>
+        </div>
+        """, unsafe_allow_html=True)
+    elif cached.error and not cached.refreshing:
         st.markdown(f"""
         <div class="device-card thermometer-card">
             <h4>🌡️ {device_name}</h4>
-            <p>❌ エラー: {str(e)}</p>
+            <p>❌ データ取得エラー: {cached.error}</p>
+            <small>ID: {device_id}</small>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="device-card thermometer-card">
+            <h4>🌡️ {device_name}</h4>
+            <p>⏳ 取得中...</p>
             <small>ID: {device_id}</small>
         </div>
         """, unsafe_allow_html=True)
@@ -164,57 +433,57 @@ def display_tv_card(device, api):
     </div>
     """, unsafe_allow_html=True)
     
+    # IRリモコンは最後に送ったコマンドから推定した状態を表示
+    if remote_type:
+        state = get_state_store().get(device_id)
+        if state:
+            parts = [f"電源: {state.get('power', '?').upper()}"]
+            if state.get("volume") is not None:
+                parts.append(f"音量: {state['volume']}")
+            if state.get("channel") is not None:
+                parts.append(f"CH: {state['channel']}")
+            st.caption("📝 最終状態 | " + " | ".join(parts))
+    
     # ボタングリッド
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         if st.button("🔌 電源", key=f"tv_power_{device_id}"):
-            try:
-                if remote_type:
-                    api.send_infrared_command(device_id, "turnOn")
-                else:
-                    api.tv_power(device_id)
-                st.success("電源操作完了！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            if remote_type:
+                # 電源ボタンはトグルのことが多いので状態に関係なく送信
+                dispatch(device_id, "電源操作", lambda: api.send_infrared_command(device_id, "turnOn", force=True))
+            else:
+                dispatch(device_id, "電源操作", lambda: api.tv_power(device_id))
     
     with col2:
         if st.button("🔊 音量+", key=f"tv_vol_up_{device_id}"):
-            try:
-                if remote_type:
-                    api.send_infrared_command(device_id, "volumeAdd")
-                else:
-                    api.tv_volume_up(device_id)
-                st.success("音量アップ！")
-            except Exception as e:
-                st.error(f"音量操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "音量アップ", lambda: api.send_infrared_command(device_id, "volumeAdd"))
+            else:
+                dispatch(device_id, "音量アップ", lambda: api.tv_volume_up(device_id))
     
     with col3:
         if st.button("🔉 音量-", key=f"tv_vol_down_{device_id}"):
-            try:
-                if remote_type:
-                    api.send_infrared_command(device_id, "volumeSub")
-                else:
-                    api.tv_volume_down(device_id)
-                st.success("音量ダウン！")
-            except Exception as e:
-                st.error(f"音量操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "音量ダウン", lambda: api.send_infrared_command(device_id, "volumeSub"))
+            else:
+                dispatch(device_id, "音量ダウン", lambda: api.tv_volume_down(device_id))
     
     with col4:
         if st.button("📺 CH+", key=f"tv_ch_up_{device_id}"):
-            try:
-                api.tv_channel_up(device_id)
-                st.success("チャンネルアップ！")
-            except Exception as e:
-                st.error(f"チャンネル操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "チャンネルアップ", lambda: api.send_infrared_command(device_id, "channelAdd"))
+            else:
+                dispatch(device_id, "チャンネルアップ", lambda: api.tv_channel_up(device_id))
     
     with col5:
         if st.button("📺 CH-", key=f"tv_ch_down_{device_id}"):
-            try:
-                api.tv_channel_down(device_id)
-                st.success("チャンネルダウン！")
-            except Exception as e:
-                st.error(f"チャンネル操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "チャンネルダウン", lambda: api.send_infrared_command(device_id, "channelSub"))
+            else:
+                dispatch(device_id, "チャンネルダウン", lambda: api.tv_channel_down(device_id))
+    
+    display_command_state(device_id)
 
 def display_ac_card(device, api):
     """エアコンカードを表示"""
@@ -246,20 +515,28 @@ def display_virtual_ac_card(device, api):
     device_name = device.get('deviceName', 'Unknown')
     device_id = device.get('deviceId', 'N/A')
     
+    # 最後に送った設定をウィジェットの初期値にする
+    store = get_state_store()
+    state = store.get(device_id)
+    modes = ["auto", "cool", "dry", "fan", "heat"]
+    fans = ["auto", "low", "medium", "high"]
+    powers = ["on", "off"]
+    
     # 設定UI（4つのカラム）
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.markdown("**🌡️ 温度設定**")
         st.markdown("16°C - 30°C")
-        temp = st.slider("温度", 16, 30, 26, key=f"ac_temp_{device_id}", label_visibility="collapsed")
+        temp = st.slider("温度", 16, 30, min(30, max(16, state.get("temperature", 26))),
+            key=f"ac_temp_{device_id}", label_visibility="collapsed")
         st.markdown(f"**{temp}°C**")
     
     with col2:
         st.markdown("**🔄 モード**")
         st.markdown("運転モード選択")
         mode = st.selectbox("モード", 
-            ["auto", "cool", "dry", "fan", "heat"], 
+            modes, index=modes.index(state["mode"]) if state.get("mode") in modes else 0,
             key=f"ac_mode_{device_id}", label_visibility="collapsed")
         mode_display = {"auto": "🔄 自動", "cool": "❄️ 冷房", "dry": "💧 除湿", "fan": "🌪️ 送風", "heat": "🔥 暖房"}
         st.markdown(f"**{mode_display.get(mode, mode)}**")
@@ -268,7 +545,7 @@ def display_virtual_ac_card(device, api):
         st.markdown("**🌪️ ファン**")
         st.markdown("風量設定")
         fan = st.selectbox("ファン", 
-            ["auto", "low", "medium", "high"], 
+            fans, index=fans.index(state["fan"]) if state.get("fan") in fans else 0,
             key=f"ac_fan_{device_id}", label_visibility="collapsed")
         fan_display = {"auto": "🔄 自動", "low": "💨 弱風", "medium": "🌪️ 中風", "high": "💨 強風"}
         st.markdown(f"**{fan_display.get(fan, fan)}**")
@@ -276,7 +553,8 @@ def display_virtual_ac_card(device, api):
     with col4:
         st.markdown("**🔌 電源**")
         st.markdown("電源状態")
-        power = st.selectbox("電源", ["on", "off"], key=f"ac_power_{device_id}", label_visibility="collapsed")
+        power = st.selectbox("電源", powers, index=powers.index(state["power"]) if state.get("power") in powers else 0,
+            key=f"ac_power_{device_id}", label_visibility="collapsed")
         power_display = {"on": "🔌 ON", "off": "🔌 OFF"}
         st.markdown(f"**{power_display.get(power, power)}**")
     
@@ -287,22 +565,22 @@ def display_virtual_ac_card(device, api):
         if st.button("🎯 設定実行", key=f"ac_set_all_{device_id}", use_container_width=True):
             try:
                 # モードとファンのマッピング
-                mode_map = {"auto": 1, "cool": 2, "dry": 3, "fan": 4, "heat": 5}
-                fan_map = {"auto": 1, "low": 2, "medium": 3, "high": 4}
-                
-                mode_value = mode_map.get(mode, 1)
-                fan_value = fan_map.get(fan, 1)
+                mode_value = AC_MODE_VALUES.get(mode, 1)
+                fan_value = AC_FAN_VALUES.get(fan, 1)
                 
                 # setAllコマンドを構築
-                command = f"{temp},{mode_value},{fan_value},{power}"
-                api.send_infrared_command(device_id, "setAll", command)
+                command = format_set_all(temp, mode, fan, power)
                 
-                # 成功メッセージ
                 mode_name = {"auto": "自動", "cool": "冷房", "dry": "除湿", "fan": "送風", "heat": "暖房"}
                 fan_name = {"auto": "自動", "low": "弱風", "medium": "中風", "high": "強風"}
                 power_name = {"on": "ON", "off": "OFF"}
                 
-                st.success(f"✅ 設定完了！温度:{temp}°C モード:{mode_name.get(mode, mode)} ファン:{fan_name.get(fan, fan)} 電源:{power_name.get(power, power)}")
+                if store.is_redundant(device_id, "setAll", command):
+                    st.info("ℹ️ 現在の設定と同じため送信を省略しました")
+                else:
+                    dispatch(device_id,
+                        f"設定 温度:{temp}°C モード:{mode_name.get(mode, mode)} ファン:{fan_name.get(fan, fan)} 電源:{power_name.get(power, power)}",
+                        lambda: api.send_infrared_command(device_id, "setAll", command))
                 
                 # 現在設定表示
                 with st.expander("📋 設定詳細", expanded=False):
@@ -311,9 +589,10 @@ def display_virtual_ac_card(device, api):
                     st.markdown(f"**モード:** {mode_name.get(mode, mode)} (値: {mode_value})")
                     st.markdown(f"**ファン:** {fan_name.get(fan, fan)} (値: {fan_value})")
                     st.markdown(f"**電源:** {power_name.get(power, power)}")
-                    
+            
             except Exception as e:
                 st.error(f"❌ 設定エラー: {str(e)}")
+        display_command_state(device_id)
     
     # 説明テキスト
     st.markdown("---")
@@ -328,39 +607,27 @@ def display_physical_ac_card(device, api):
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🔌 ON", key=f"ac_on_{device_id}"):
-            try:
-                api.ac_power(device_id)
-                st.success("エアコンON！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            dispatch(device_id, "エアコンON", lambda: api.ac_power(device_id), api, {"power": "on"})
     
     with col2:
         if st.button("🔌 OFF", key=f"ac_off_{device_id}"):
-            try:
-                api.ac_power(device_id)
-                st.success("エアコンOFF！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            dispatch(device_id, "エアコンOFF", lambda: api.turn_off_device(device_id), api, {"power": "off"})
     
     # 温度・モード制御
     col3, col4 = st.columns(2)
     with col3:
         temp = st.slider("温度", 16, 30, 25, key=f"ac_temp_{device_id}")
         if st.button("🌡️ 設定", key=f"ac_set_temp_{device_id}"):
-            try:
-                api.ac_set_temperature(device_id, temp)
-                st.success(f"温度設定: {temp}°C！")
-            except Exception as e:
-                st.error(f"温度設定エラー: {str(e)}")
+            # setAll は温度とモードを同時に送るため、右のモード選択の値も使う
+            mode = st.session_state.get(f"ac_mode_{device_id}", "auto")
+            dispatch(device_id, f"温度設定: {temp}°C", lambda: api.ac_set_temperature(device_id, temp, mode))
     
     with col4:
         mode = st.selectbox("モード", ["auto", "cool", "heat", "fan", "dry"], key=f"ac_mode_{device_id}")
         if st.button("🔄 設定", key=f"ac_set_mode_{device_id}"):
-            try:
-                api.ac_set_mode(device_id, mode)
-                st.success(f"モード設定: {mode}！")
-            except Exception as e:
-                st.error(f"モード設定エラー: {str(e)}")
+            dispatch(device_id, f"モード設定: {mode}", lambda: api.ac_set_mode(device_id, mode, temp))
+    
+    display_command_state(device_id)
 
 def display_light_card(device, api):
     """照明カードを表示"""
@@ -384,25 +651,19 @@ def display_light_card(device, api):
     
     with col1:
         if st.button("💡 ON", key=f"light_on_{device_id}"):
-            try:
-                if remote_type:
-                    api.send_infrared_command(device_id, "turnOn")
-                else:
-                    api.turn_on_device(device_id)
-                st.success("照明ON！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "照明ON", lambda: api.send_infrared_command(device_id, "turnOn"))
+            else:
+                dispatch(device_id, "照明ON", lambda: api.turn_on_device(device_id), api, {"power": "on"})
     
     with col2:
         if st.button("💡 OFF", key=f"light_off_{device_id}"):
-            try:
-                if remote_type:
-                    api.send_infrared_command(device_id, "turnOff")
-                else:
-                    api.turn_off_device(device_id)
-                st.success("照明OFF！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            if remote_type:
+                dispatch(device_id, "照明OFF", lambda: api.send_infrared_command(device_id, "turnOff"))
+            else:
+                dispatch(device_id, "照明OFF", lambda: api.turn_off_device(device_id), api, {"power": "off"})
+    
+    display_command_state(device_id)
 
 def display_hub_card(device):
     """Hubカードを表示"""
@@ -436,25 +697,33 @@ def display_other_card(device, api):
     </div>
     """, unsafe_allow_html=True)
     
+    # 状態を確認できるのは物理デバイスだけ
+    physical = None if is_virtual_ir else api
+    
     col1, col2 = st.columns(2)
     
     with col1:
         if st.button("🔌 ON", key=f"other_on_{device_id}"):
-            try:
-                api.turn_on_device(device_id)
-                st.success("デバイスON！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            dispatch(device_id, "デバイスON", lambda: api.turn_on_device(device_id), physical, {"power": "on"})
     
     with col2:
         if st.button("🔌 OFF", key=f"other_off_{device_id}"):
-            try:
-                api.turn_off_device(device_id)
-                st.success("デバイスOFF！")
-            except Exception as e:
-                st.error(f"電源操作エラー: {str(e)}")
+            dispatch(device_id, "デバイスOFF", lambda: api.turn_off_device(device_id), physical, {"power": "off"})
+    
+    display_command_state(device_id)
+
+# カテゴリ → カード描画関数（未登録のカテゴリは「その他」カードで表示）
+CARD_RENDERERS = {
+    'thermometer': display_thermometer_card,
+    'tv': display_tv_card,
+    'ac': display_ac_card,
+    'light': display_light_card,
+    'hub': lambda device, api: display_hub_card(device),
+    'other': display_other_card,
+}
 
 def main():
+    setup_page()
     st.title("🏠 SwitchBot Monitor")
     st.markdown("統合デバイス管理ダッシュボード")
     
@@ -462,22 +731,38 @@ def main():
     st.markdown("---")
     st.markdown("📖 **参考資料**: [SwitchBot API 公式ドキュメント](https://github.com/OpenWonderLabs/SwitchBotAPI)")
     st.markdown("---")
+    record_first_paint()
     
-    # API認証情報を取得
-    token = os.getenv("SWITCHBOT_TOKEN")
-    secret = os.getenv("SWITCHBOT_SECRET")
+    # 設定ファイル（不正なら理由を表示して止める）
+    try:
+        settings_store = get_settings_store()
+    except ValueError as e:
+        st.error(f"⚠️ 設定ファイルが不正です: {str(e)}")
+        st.stop()
+    if settings_store.last_error:
+        st.sidebar.warning(f"⚙️ 設定の再読み込みに失敗したため、前回の設定を使用中です: {settings_store.last_error}")
     
-    if not token or not secret:
+    # APIクライアントを取得（プロセス内で共有）
+    pool = get_pool()
+    
+    if pool is None:
         st.error("⚠️ SwitchBot API認証情報が見つかりません！")
         st.markdown("""
         `.env`ファイルに以下の認証情報を設定してください：
         - `SWITCHBOT_TOKEN`: SwitchBot APIトークン
         - `SWITCHBOT_SECRET`: SwitchBot APIシークレット
+        
+        複数拠点の場合は `SWITCHBOT_ACCOUNTS` にアカウント一覧（JSON）を設定してください。
         """)
         return
     
-    # APIクライアントを初期化
-    api = SwitchBotAPI(token, secret)
+    # デバイス操作は所有アカウントのクライアントへ振り分け
+    api = AccountRouter(pool)
+    
+    # ディスク上のカタログから即座に表示（クラウドは待たない）
+    catalog = pool.merged_catalog(select_sites(pool))
+    st.session_state.setdefault('catalog_version', pool.version)
+    watch_catalog(pool)
     
     # 更新ボタン
     col1, col2 = st.columns([3, 1])
@@ -485,163 +770,91 @@ def main():
         st.markdown(f"📅 最終更新: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     with col2:
         if st.button("🔄 全体更新"):
+            pool.refresh_async()
             st.rerun()
     
+    render_optional_panels(api, catalog)
+    
     try:
-        with st.spinner("デバイス情報を取得中..."):
-            devices = api.get_devices()
-            
-        if not devices:
+        if not catalog.is_loaded:
+            if catalog.last_error:
+                raise Exception(catalog.last_error)
+            st.info("⏳ デバイス情報を取得中...（取得でき次第表示されます）")
+            return
+        
+        if not catalog.devices and not catalog.remotes:
             st.warning("デバイスが見つかりません")
             return
         
-        # デバイスを分類
-        thermometer_devices = []
-        tv_devices = []
-        ac_devices = []
-        light_devices = []
-        hub_devices = []
-        other_devices = []
+        # カタログのバージョンごとに1回だけ分類
+        index = index_for(catalog)
+        thermometer_devices = index.devices_in('thermometer')
         
-        # 物理デバイスを分類
-        for device in devices:
-            device_type = device.get('deviceType', '')
-            if 'Meter' in device_type:
-                thermometer_devices.append(device)
-            elif 'TV' in device_type or 'Television' in device_type:
-                tv_devices.append(device)
-            elif 'AC' in device_type or 'AirConditioner' in device_type:
-                ac_devices.append(device)
-            elif 'Light' in device_type or 'Bulb' in device_type:
-                light_devices.append(device)
-            elif 'Hub Mini' in device_type:
-                hub_devices.append(device)
-            else:
-                other_devices.append(device)
-        
-        # 仮想IRリモコンを分類
-        try:
-            infrared_remotes = api.get_infrared_remotes()
-            for remote in infrared_remotes:
-                remote_type = remote.get('remoteType', '')
-                if remote_type == 'TV':
-                    tv_devices.append(remote)
-                elif remote_type == 'Air Conditioner':
-                    ac_devices.append(remote)
-                elif remote_type == 'Light':
-                    light_devices.append(remote)
-                else:
-                    other_devices.append(remote)
-        except Exception as e:
-            st.warning(f"仮想IRリモコンの取得に失敗: {str(e)}")
+        # プッシュサーバーがあれば温度計はライブ表示（ステータス取得もしない）
+        push_url = os.getenv("SWITCHSENSE_PUSH_URL")
+        live = bool(push_url) and st.sidebar.toggle("📡 温度計をライブ表示", value=True, key="live_meters")
+        view = select_view_options()
+        rooms = {**load_rooms(), **get_settings().rooms}
         
         # サマリー情報を計算
         devices_summary = {}
+        for key, count in index.counts().items():
+            category = CATEGORIES[key]
+            devices_summary[category.label] = {'icon': category.icon, 'count': count}
         
-        if thermometer_devices:
-            # 温度の平均を計算
-            total_temp = 0
-            temp_count = 0
+        if thermometer_devices and not live:
+            # 温度の平均はポーリングサービス（とBLE）の最新値から計算（台数分のAPI呼び出しをしない）
+            sources = get_local_sources()
+            temps = []
             for device in thermometer_devices:
-                try:
-                    device_status = api.get_device_status(device['deviceId'])
-                    if device_status and device_status.get('temperature'):
-                        total_temp += device_status['temperature']
-                        temp_count += 1
-                except:
-                    pass
-            
-            avg_temp = total_temp / temp_count if temp_count > 0 else 0
-            devices_summary['温度計'] = {
-                'icon': '🌡️',
-                'count': len(thermometer_devices),
-                'status': f'<p>平均: {avg_temp:.1f}°C</p>' if temp_count > 0 else ''
-            }
-        
-        if tv_devices:
-            devices_summary['テレビ'] = {
-                'icon': '📺',
-                'count': len(tv_devices)
-            }
-        
-        if ac_devices:
-            devices_summary['エアコン'] = {
-                'icon': '❄️',
-                'count': len(ac_devices)
-            }
-        
-        if light_devices:
-            devices_summary['照明'] = {
-                'icon': '💡',
-                'count': len(light_devices)
-            }
-        
-        if hub_devices:
-            devices_summary['Hub'] = {
-                'icon': '🔧',
-                'count': len(hub_devices)
-            }
-        
-        if other_devices:
-            devices_summary['その他'] = {
-                'icon': '🔧',
-                'count': len(other_devices)
-            }
+                reading = newest_reading(sources, device['deviceId'])
+                if reading is not None and reading.temperature is not None:
+                    temps.append(reading.temperature)
+            if temps:
+                devices_summary[CATEGORIES['thermometer'].label]['status'] = f'<p>平均: {sum(temps) / len(temps):.1f}°C</p>'
         
         # サマリーカードを表示
         if devices_summary:
             display_summary_cards(devices_summary)
         
-        # デバイスグリッドを表示
-        st.markdown("## 📱 デバイス一覧")
-        
-        # 温度計デバイス
-        if thermometer_devices:
-            st.markdown("### 🌡️ 温度計デバイス")
-            cols = st.columns(min(4, len(thermometer_devices)))
-            for i, device in enumerate(thermometer_devices):
-                with cols[i % len(cols)]:
-                    display_thermometer_card(device, api)
+        # 描画前のバージョンを記録し、描画中や描画後に届いた値で再描画する
+        st.session_state['status_version'] = get_status_cache().version
+        watch_statuses()
         
-        # テレビデバイス
-        if tv_devices:
-            st.markdown("### 📺 テレビデバイス")
-            cols = st.columns(min(3, len(tv_devices)))
-            for i, device in enumerate(tv_devices):
-                with cols[i % len(cols)]:
-                    display_tv_card(device, api)
-        
-        # エアコンデバイス
-        if ac_devices:
-            st.markdown("### ❄️ エアコンデバイス")
-            cols = st.columns(min(3, len(ac_devices)))
-            for i, device in enumerate(ac_devices):
-                with cols[i % len(cols)]:
-                    display_ac_card(device, api)
-        
-        # 照明デバイス
-        if light_devices:
-            st.markdown("### 💡 照明デバイス")
-            cols = st.columns(min(3, len(light_devices)))
-            for i, device in enumerate(light_devices):
-                with cols[i % len(cols)]:
-                    display_light_card(device, api)
+        # デバイスグリッドを表示（検索・ページ分割して表示中のカードだけ描画）
+        st.markdown("## 📱 デバイス一覧")
         
-        # Hubデバイス
-        if hub_devices:
-            st.markdown("### 🔧 Hubデバイス")
-            cols = st.columns(min(4, len(hub_devices)))
-            for i, device in enumerate(hub_devices):
-                with cols[i % len(cols)]:
-                    display_hub_card(device)
+        shown = 0
+        for key in view['categories']:
+            category = CATEGORIES[key]
+            category_devices = index.search(view['query'], key, rooms)
+            if not category_devices:
+                continue
+            shown += len(category_devices)
+            render = CARD_RENDERERS.get(key, display_other_card)
+            st.markdown(f"### {category.icon} {category.title}")
+            if view['group_by_room']:
+                category_devices = sorted(category_devices, key=lambda d: rooms.get(d.get('deviceId'), '\uffff'))
+            page_devices = paginate(category_devices, view['page_size'], key)
+            if key == 'thermometer' and live:
+                from push_server import render_live_meters
+                render_live_meters(page_devices, push_url)
+                continue
+            if key == 'thermometer' and view['meter_table']:
+                display_meter_table(page_devices, api, rooms)
+                continue
+            if not view['group_by_room']:
+                display_device_grid(page_devices, render, api, category.columns)
+                continue
+            groups = {}
+            for device in page_devices:
+                groups.setdefault(rooms.get(device.get('deviceId'), '未設定'), []).append(device)
+            for room, room_devices in groups.items():
+                st.markdown(f"#### 🏠 {room}")
+                display_device_grid(room_devices, render, api, category.columns)
         
-        # その他デバイス
-        if other_devices:
-            st.markdown("### 🔧 その他デバイス")
-            cols = st.columns(min(3, len(other_devices)))
-            for i, device in enumerate(other_devices):
-                with cols[i % len(cols)]:
-                    display_other_card(device, api)
+        if view['query'] and shown == 0:
+            st.info(f"「{view['query']}」に一致するデバイスはありません")
     
     except Exception as e:
         st.error(f"デバイス情報の取得に失敗: {str(e)}")
@@ -652,6 +865,8 @@ def main():
         - デバイスがオンラインか確認
         - API制限に達していないか確認
         """)
+    
+    record_render_complete()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""
+Multi-account client pool with sharded polling
+
+Each site has its own SwitchBot account, daily quota and device catalog.
+AccountPool keeps one shared client per account, merges the catalogs for
+the dashboard and spreads status polling over worker processes while
+charging every request to the owning account's budget.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from device_catalog import DeviceCatalog
+from device_index import classify
+from rate_budget import DEFAULT_DAILY_LIMIT, RateBudget
+from request_scheduler import BACKGROUND, RequestScheduler, priority
+from switchbot_api import SwitchBotAPI, data_path, get_client, load_credentials
+from traffic_log import transport_from_env
+
+DEFAULT_SITE = "default"
+
+@dataclass
+class Account:
+    """Credentials and quota of one site"""
+    name: str
+    token: str
+    secret: str
+    daily_quota: int = DEFAULT_DAILY_LIMIT
+
+def load_accounts() -> List[Account]:
+    """
+    Load accounts from SWITCHBOT_ACCOUNTS, falling back to SWITCHBOT_TOKEN / SWITCHBOT_SECRET
+    
+    SWITCHBOT_ACCOUNTS is either a JSON list or the path of a JSON file with
+    entries like {"name": "tokyo", "token": "...", "secret": "...", "daily_quota": 10000}.
+    
+    Returns:
+        List of accounts (empty when nothing is configured)
+    """
+    token, secret = load_credentials()
+    raw = os.getenv("SWITCHBOT_ACCOUNTS", "").strip()
+    if raw:
+        if not raw.startswith("["):
+            with open(raw, "r", encoding="utf-8") as f:
+                raw = f.read()
+        try:
+            entries = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid SWITCHBOT_ACCOUNTS: {str(e)}")
+        return [
+            Account(e["name"], e["token"], e["secret"], int(e.get("daily_quota", DEFAULT_DAILY_LIMIT)))
+            for e in entries
+        ]
+    if token and secret:
+        return [Account(DEFAULT_SITE, token, secret)]
+    return []
+
+def _poll_shard(name: str, token: str, secret: str, device_ids: List[str], allowance: int) -> Tuple[str, Dict[str, Dict], int]:
+    """
+    Poll one shard of an account's devices (runs in a worker process)
+    
+    Args:
+        name: Site name
+        token: API token
+        secret: API secret
+        device_ids: Devices in this shard
+        allowance: Requests this shard may spend
+    
+    Returns:
+        (site name, {device_id: {"status": ...} or {"error": ...}}, requests used)
+    """
+    # 割り当て分は予約済みなので、シャード内では予備枠による制限をかけない
+    # SWITCHBOT_RECORD / SWITCHBOT_REPLAY はワーカープロセスでも有効にする
+    transport = transport_from_env(token, secret)
+    client = SwitchBotAPI(token, secret, budget=RateBudget(allowance), transport=transport,
+                          scheduler=RequestScheduler(max_in_flight=1))
+    results = {}
+    try:
+        with priority(BACKGROUND):
+            for device_id, status in client.iter_device_statuses(device_ids):
+                results[device_id] = {"error": str(status)} if isinstance(status, Exception) else {"status": status}
+    finally:
+        if transport is not None and hasattr(transport, "close"):
+            transport.close()
+    return name, results, client.budget.used
+
+class MergedCatalog:
+    """Read-only union of several site catalogs (entries carry a "site" key)"""
+    
+    def __init__(self, catalogs: Dict[str, DeviceCatalog], label_sites: bool = False):
+        self.devices: List[Dict] = []
+        self.remotes: List[Dict] = []
+        for name, catalog in catalogs.items():
+            for target, items in ((self.devices, catalog.devices), (self.remotes, catalog.remotes)):
+                for item in items:
+                    entry = dict(item, site=name)
+                    if label_sites:
+                        entry["deviceName"] = f"{item.get('deviceName', 'Unknown')} ({name})"
+                    target.append(entry)
+        self.version = merged_version(catalogs) + (":labelled" if label_sites else "")
+        self.is_loaded = any(c.is_loaded for c in catalogs.values())
+        self.last_error = next((c.last_error for c in catalogs.values() if c.last_error), None)
+
+def merged_version(catalogs: Dict[str, DeviceCatalog]) -> str:
+    """Version string that changes when any of the given catalogs changes"""
+    if not any(c.version for c in catalogs.values()):
+        return ""
+    key = "|".join(f"{name}={catalogs[name].version}" for name in sorted(catalogs))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class AccountPool:
+    """One client, budget and catalog per account"""
+    
+    def __init__(self, accounts: List[Account], max_workers: Optional[int] = None, shard_size: int = 50):
+        """
+        Args:
+            accounts: Configured accounts
+            max_workers: Worker processes for polling (default: CPU count)
+            shard_size: Devices per polling shard
+        """
+        if not accounts:
+            raise ValueError("At least one account is required")
+        self.accounts: Dict[str, Account] = {a.name: a for a in accounts}
+        self.clients: Dict[str, SwitchBotAPI] = {
+            a.name: get_client(a.token, a.secret, a.daily_quota) for a in accounts
+        }
+        self.catalogs: Dict[str, DeviceCatalog] = {}
+        for name, client in self.clients.items():
+            file_name = "device_catalog.json" if name == DEFAULT_SITE else f"device_catalog_{name}.json"
+            self.catalogs[name] = DeviceCatalog(client, path=data_path(file_name))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._owner_version = None
+        self._owners: Dict[str, str] = {}
+    
+    @property
+    def sites(self) -> List[str]:
+        return list(self.accounts)
+    
+    @property
+    def version(self) -> str:
+        return merged_version(self.catalogs)
+    
+    def budget(self, site: str) -> RateBudget:
+        return self.clients[site].budget
+    
+    def start_catalogs(self):
+        """Start background refresh for every site catalog"""
+        for catalog in self.catalogs.values():
+            catalog.start()
+    
+    def refresh_async(self):
+        """Refresh every site catalog in the background"""
+        for catalog in self.catalogs.values():
+            catalog.refresh_async()
+    
+    def merged_catalog(self, sites: Optional[List[str]] = None) -> MergedCatalog:
+        """
+        Merge the catalogs of the selected sites
+        
+        Args:
+            sites: Site names (default: all)
+        
+        Returns:
+            MergedCatalog; device names are suffixed with the site when several sites exist
+        """
+        selected = {name: self.catalogs[name] for name in (sites or self.sites) if name in self.catalogs}
+        return MergedCatalog(selected, label_sites=len(self.accounts) > 1)
+    
+    def site_of(self, device_id: str) -> str:
+        """Site that owns a device (first site when unknown)"""
+        version = self.version
+        if version != self._owner_version:
+            self._owners = {
+                d.get("deviceId"): name
+                for name, catalog in self.catalogs.items()
+                for d in catalog.devices + catalog.remotes
+            }
+            self._owner_version = version
+        return self._owners.get(device_id, self.sites[0])
+    
+    def client_for(self, device_id: str) -> SwitchBotAPI:
+        """Client of the account that owns a device"""
+        return self.clients[self.site_of(device_id)]
+    
+    def meter_ids(self, sites: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """Meter device IDs per site"""
+        return {
+            name: [d["deviceId"] for d in self.catalogs[name].devices if classify(d) == "thermometer"]
+            for name in (sites or self.sites)
+        }
+    
+    def poll_statuses(self, device_ids_by_site: Dict[str, List[str]], use_processes: bool = True) -> Dict[str, Dict[str, Dict]]:
+        """
+        Poll device statuses, sharded across worker processes
+        
+        Every shard gets an allowance taken from its site's budget up front;
+        unused requests are refunded afterwards. The share of the budget
+        reserved for interactive commands is never handed out, and devices
+        beyond the budget are reported with an error instead of being requested.
+        
+        Args:
+            device_ids_by_site: Device IDs to poll per site
+            use_processes: Run shards in worker processes (False: inline)
+        
+        Returns:
+            {site: {device_id: {"status": ...} or {"error": ...}}}
+        """
+        results: Dict[str, Dict[str, Dict]] = {name: {} for name in device_ids_by_site}
+        jobs = []
+        for name, device_ids in device_ids_by_site.items():
+            account = self.accounts[name]
+            budget = self.budget(name)
+            # 予備枠はクライアントのスケジューラの設定に従う（設定の再読み込みで変わる）
+            spare = budget.remaining - int(budget.daily_limit * self.clients[name].scheduler.reserve[BACKGROUND])
+            granted = budget.take_up_to(max(0, min(len(device_ids), spare)))
+            for device_id in device_ids[granted:]:
+                results[name][device_id] = {"error": "Daily API quota exhausted"}
+            allowed = device_ids[:granted]
+            for start in range(0, len(allowed), self.shard_size):
+                shard = allowed[start:start + self.shard_size]
+                jobs.append((account.name, account.token, account.secret, shard, len(shard)))
+        
+        if use_processes and len(jobs) > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            outputs = self._executor.map(_poll_shard, *zip(*jobs))
+        else:
+            outputs = (_poll_shard(*job) for job in jobs)
+        
+        for job, (name, shard_results, used) in zip(jobs, outputs):
+            results[name].update(shard_results)
+            self.budget(name).refund(job[4] - used)
+        return results
+    
+    def poll_meters(self, sites: Optional[List[str]] = None, use_processes: bool = True) -> Dict[str, Dict[str, Dict]]:
+        """Poll every meter of the selected sites"""
+        return self.poll_statuses(self.meter_ids(sites), use_processes=use_processes)
+    
+    def close(self):
+        """Stop worker processes and catalog refresh threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for catalog in self.catalogs.values():
+            catalog.stop()
+
+class AccountRouter:
+    """
+    SwitchBotAPI-compatible facade that routes device calls to the owning account
+    
+    Methods whose first argument is a device ID (get_device_status,
+    send_command, turn_on_device, ...) are forwarded to that device's
+    account client, so dashboard cards work unchanged across sites.
+    Account-level methods (device and scene lists, scene execution) are
+    implemented explicitly across every account.
+    """
+    
+    # 第1引数がデバイスID（またはリモコンID）で、所有アカウントへ振り分けるメソッド
+    DEVICE_METHODS = frozenset({
+        "get_device_status", "send_command", "execute", "turn_on_device", "turn_off_device",
+        "tv_power", "tv_volume_up", "tv_volume_down", "tv_channel_up", "tv_channel_down",
+        "tv_set_channel", "tv_set_volume", "ac_power", "ac_set_temperature", "ac_set_mode",
+        "get_infrared_remote_status", "send_infrared_command",
+    })
+    
+    def __init__(self, pool: AccountPool):
+        self.pool = pool
+        self._scene_sites: Dict[str, str] = {}
+    
+    def invalidate_cache(self):
+        for client in self.pool.clients.values():
+            client.invalidate_cache()
+    
+    def get_devices(self) -> List[Dict]:
+        """Physical devices of every account (entries carry a "site" key)"""
+        return [dict(d, site=name) for name, client in self.pool.clients.items() for d in client.get_devices()]
+    
+    def get_infrared_remotes(self) -> List[Dict]:
+        """Infrared remotes of every account (entries carry a "site" key)"""
+        return [dict(r, site=name) for name, client in self.pool.clients.items()
+                for r in client.get_infrared_remotes()]
+    
+    def get_devices_and_remotes(self) -> Tuple[List[Dict], List[Dict]]:
+        """Devices and remotes of every account (entries carry a "site" key)"""
+        devices, remotes = [], []
+        for name, client in self.pool.clients.items():
+            site_devices, site_remotes = client.get_devices_and_remotes()
+            devices.extend(dict(d, site=name) for d in site_devices)
+            remotes.extend(dict(r, site=name) for r in site_remotes)
+        return devices, remotes
+    
+    def get_device_types(self) -> Dict[str, List[str]]:
+        return next(iter(self.pool.clients.values())).get_device_types()
+    
+    def get_scenes(self) -> List[Dict]:
+        """Scenes of every account (entries carry a "site" key)"""
+        scenes = []
+        for name, client in self.pool.clients.items():
+            for scene in client.get_scenes():
+                self._scene_sites[scene.get("sceneId")] = name
+                scenes.append(dict(scene, site=name))
+        return scenes
+    
+    def execute_scene(self, scene_id: str) -> bool:
+        """Execute a scene on the account that owns it"""
+        if scene_id not in self._scene_sites:
+            self.get_scenes()
+        site = self._scene_sites.get(scene_id)
+        if site is None:
+            raise Exception(f"Unknown scene: {scene_id}")
+        return self.pool.clients[site].execute_scene(scene_id)
+    
+    def __getattr__(self, name):
+        if name not in self.DEVICE_METHODS:
+            raise AttributeError(f"{type(self).__name__} does not route {name!r}")
+        
+        def call(device_id, *args, **kwargs):
+            return getattr(self.pool.client_for(device_id), name)(device_id, *args, **kwargs)
+        
+        return call
@@ -0,0 +1,366 @@
+"""
+Rule-based alert engine over meter streams
+
+Rules (threshold, rate of change, sustained-for-N-minutes, low battery
+and stale device) are compiled once into per-device masks and evaluated
+with NumPy across every meter on each poll tick. Only state transitions
+produce alerts: a rule fires once when its condition starts holding and
+resolves once when it stops, and each transition goes to the configured
+sinks (NDJSON file, local webhook, in-memory buffer).
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+import numpy as np
+import requests
+
+from models import MeterStatus
+from switchbot_api import data_path
+
+RULE_TYPES = ("threshold", "rate_of_change", "sustained", "low_battery", "stale")
+METRICS = ("temperature", "humidity", "battery")
+OPS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+# ルールファイルがないときの既定ルール
+DEFAULT_RULES = [
+    {"name": "low_battery", "type": "low_battery", "value": 20, "severity": "warning"},
+    {"name": "stale_meter", "type": "stale", "minutes": 30, "severity": "warning"},
+]
+
+@dataclass
+class Rule:
+    """Alert rule definition"""
+    name: str
+    type: str
+    metric: str = "temperature"
+    op: str = ">"
+    value: float = 0.0
+    minutes: float = 0.0
+    devices: Optional[List[str]] = None
+    severity: str = "warning"
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Rule":
+        """
+        Build and validate a rule
+        
+        Args:
+            data: Rule fields, e.g. {"name": "hot", "type": "sustained", "metric": "temperature",
+                  "op": ">", "value": 30, "minutes": 10}
+        
+        Returns:
+            Rule
+        """
+        rule = cls(**data)
+        if rule.type not in RULE_TYPES:
+            raise ValueError(f"Unknown rule type for {rule.name}: {rule.type}")
+        if rule.metric not in METRICS:
+            raise ValueError(f"Unknown metric for {rule.name}: {rule.metric}")
+        if rule.op not in OPS:
+            raise ValueError(f"Unknown operator for {rule.name}: {rule.op}")
+        if rule.type in ("sustained", "stale") and rule.minutes <= 0:
+            raise ValueError(f"Rule {rule.name} needs minutes > 0")
+        return rule
+
+@dataclass
+class Alert:
+    """Rule state transition for one device"""
+    rule: str
+    device_id: str
+    state: str
+    severity: str
+    value: Optional[float]
+    message: str
+    timestamp: float = field(default_factory=time.time)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "rule": self.rule,
+            "deviceId": self.device_id,
+            "state": self.state,
+            "severity": self.severity,
+            "value": self.value,
+            "message": self.message,
+            "timestamp": self.timestamp,
+        }
+
+def load_rules(path: Optional[str] = None) -> List[Rule]:
+    """
+    Load rules from a JSON list, falling back to DEFAULT_RULES
+    
+    Args:
+        path: Rule file (default: DATA_DIR/alert_rules.json)
+    
+    Returns:
+        List of validated rules
+    """
+    path = path or data_path("alert_rules.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        entries = DEFAULT_RULES
+    return [Rule.from_dict(e) for e in entries]
+
+# ===== 通知先 =====
+
+class FileSink:
+    """Append alerts to an NDJSON file"""
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or data_path("alerts.ndjson")
+        self._lock = threading.Lock()
+    
+    def __call__(self, alert: Alert):
+        line = json.dumps(alert.to_dict(), ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class WebhookSink:
+    """POST alerts as JSON to a local webhook without blocking the engine"""
+    
+    def __init__(self, url: str, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+        self._queue: "queue.Queue[Alert]" = queue.Queue(maxsize=1000)
+        self._session = requests.Session()
+        threading.Thread(target=self._worker, name="alert-webhook", daemon=True).start()
+    
+    def __call__(self, alert: Alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            pass
+    
+    def _worker(self):
+        while True:
+            alert = self._queue.get()
+            try:
+                self._session.post(self.url, json=alert.to_dict(), timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                print(f"[alerts] webhook failed: {str(e)}")
+
+class MemorySink:
+    """Keep the most recent alerts in memory"""
+    
+    def __init__(self, maxlen: int = 500):
+        self.alerts: Deque[Alert] = deque(maxlen=maxlen)
+    
+    def __call__(self, alert: Alert):
+        self.alerts.append(alert)
+
+# ===== エンジン =====
+
+class AlertEngine:
+    """Incremental, vectorized rule evaluation across all meters"""
+    
+    def __init__(self, rules: List[Rule], sinks: Optional[List[Callable[[Alert], None]]] = None):
+        """
+        Args:
+            rules: Rules to evaluate
+            sinks: Callables receiving each Alert
+        """
+        self.rules = rules
+        self.sinks = sinks or []
+        self.device_ids: List[str] = []
+        self._columns: Dict[str, int] = {}
+        self._capacity = 0
+        self._allocate(64)
+    
+    def _allocate(self, capacity: int):
+        """Grow every per-device array to capacity, keeping existing state"""
+        def grow(old, fill, dtype):
+            new = np.full(old.shape[:-1] + (capacity,), fill, dtype=dtype)
+            new[..., :old.shape[-1]] = old
+            return new
+        
+        n_rules, n_metrics = len(self.rules), len(METRICS)
+        if self._capacity == 0:
+            self.last_values = np.full((n_metrics, 0), np.nan)
+            self.last_ts = np.full(0, np.nan)
+            self.masks = np.zeros((n_rules, 0), dtype=bool)
+            self.since = np.full((n_rules, 0), np.nan)
+            self.firing = np.zeros((n_rules, 0), dtype=bool)
+        self.last_values = grow(self.last_values, np.nan, float)
+        self.last_ts = grow(self.last_ts, np.nan, float)
+        self.masks = grow(self.masks, False, bool)
+        self.since = grow(self.since, np.nan, float)
+        self.firing = grow(self.firing, False, bool)
+        self._capacity = capacity
+    
+    def _column(self, device_id: str) -> int:
+        """Column of a device, registering it and compiling rule masks on first sight"""
+        column = self._columns.get(device_id)
+        if column is None:
+            column = len(self.device_ids)
+            if column >= self._capacity:
+                self._allocate(self._capacity * 2)
+            self.device_ids.append(device_id)
+            self._columns[device_id] = column
+            for r, rule in enumerate(self.rules):
+                self.masks[r, column] = rule.devices is None or device_id in rule.devices
+        return column
+    
+    def process(self, samples: List[MeterStatus], now: Optional[float] = None) -> List[Alert]:
+        """
+        Evaluate every rule against one tick of readings
+        
+        Args:
+            samples: Readings received this tick
+            now: Evaluation time (default: now)
+        
+        Returns:
+            Alerts emitted for this tick (also sent to the sinks)
+        """
+        now = time.time() if now is None else now
+        columns = np.fromiter((self._column(s.device_id) for s in samples), dtype=np.intp, count=len(samples))
+        n = len(self.device_ids)
+        
+        seen = np.zeros(n, dtype=bool)
+        seen[columns] = True
+        ts = np.full(n, np.nan)
+        ts[columns] = [s.timestamp for s in samples]
+        values = np.full((len(METRICS), n), np.nan)
+        for m, metric in enumerate(METRICS):
+            values[m, columns] = [np.nan if getattr(s, metric) is None else getattr(s, metric) for s in samples]
+        
+        last_values = self.last_values[:, :n]
+        last_ts = self.last_ts[:n]
+        alerts = []
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for r, rule in enumerate(self.rules):
+                mask = self.masks[r, :n]
+                firing = self.firing[r, :n]
+                m = METRICS.index(rule.metric)
+                current = values[m]
+                
+                if rule.type == "threshold":
+                    cond = seen & OPS[rule.op](current, rule.value)
+                    new_firing = np.where(seen, cond, firing)
+                elif rule.type == "low_battery":
+                    current = values[METRICS.index("battery")]
+                    cond = seen & (current < rule.value)
+                    new_firing = np.where(seen, cond, firing)
+                elif rule.type == "rate_of_change":
+                    # 1分あたりの変化量（前回値との差分）
+                    rate = (current - last_values[m]) / ((ts - last_ts) / 60.0)
+                    current = rate
+                    valid = seen & np.isfinite(rate)
+                    cond = valid & OPS[rule.op](np.abs(rate), rule.value)
+                    new_firing = np.where(seen, cond, firing)
+                elif rule.type == "sustained":
+                    since = self.since[r, :n]
+                    raw = seen & OPS[rule.op](current, rule.value)
+                    since[:] = np.where(raw, np.where(np.isnan(since), ts, since), np.where(seen, np.nan, since))
+                    cond = raw & (now - since >= rule.minutes * 60)
+                    new_firing = np.where(seen, cond, firing)
+                else:  # stale
+                    known = ~np.isnan(last_ts) | seen
+                    latest = np.where(seen, ts, last_ts)
+                    current = (now - latest) / 60.0
+                    new_firing = known & (now - latest > rule.minutes * 60)
+                
+                new_firing &= mask
+                started = np.flatnonzero(new_firing & ~firing)
+                resolved = np.flatnonzero(firing & ~new_firing)
+                firing[:] = new_firing
+                for column in started:
+                    alerts.append(self._alert(rule, column, "firing", current[column], now))
+                for column in resolved:
+                    alerts.append(self._alert(rule, column, "resolved", current[column], now))
+        
+        # 次のティックの変化率計算用に最新値を保存（今回届いた値のみ）
+        last_values[:, columns] = values[:, columns]
+        last_ts[columns] = ts[columns]
+        
+        for alert in alerts:
+            for sink in self.sinks:
+                try:
+                    sink(alert)
+                except Exception as e:
+                    print(f"[alerts] sink failed: {str(e)}")
+        return alerts
+    
+    def _alert(self, rule: Rule, column: int, state: str, value: float, now: float) -> Alert:
+        device_id = self.device_ids[column]
+        value = None if value is None or np.isnan(value) else round(float(value), 2)
+        if rule.type == "stale":
+            detail = f"no reading for {value} min"
+        elif rule.type == "rate_of_change":
+            detail = f"{rule.metric} changing {value}/min"
+        elif rule.type == "low_battery":
+            detail = f"battery {value}%"
+        else:
+            detail = f"{rule.metric} {value} {rule.op} {rule.value}"
+        return Alert(rule.name, device_id, state, rule.severity, value, f"{rule.name}: {detail}", now)
+    
+    def firing_alerts(self) -> List[Dict]:
+        """Rules currently firing per device"""
+        n = len(self.device_ids)
+        return [
+            {"rule": rule.name, "deviceId": self.device_ids[column], "severity": rule.severity}
+            for r, rule in enumerate(self.rules)
+            for column in np.flatnonzero(self.firing[r, :n])
+        ]
+
+def read_recent_alerts(path: Optional[str] = None, limit: int = 200) -> List[Dict]:
+    """
+    Read the newest alerts from an NDJSON alert log
+    
+    Args:
+        path: Alert log (default: DATA_DIR/alerts.ndjson)
+        limit: Maximum number of alerts
+    
+    Returns:
+        Alerts, newest first
+    """
+    path = path or data_path("alerts.ndjson")
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(max(0, size - 256 * 1024))
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    if size > 256 * 1024:
+        lines = lines[1:]
+    return [json.loads(line) for line in reversed(lines[-limit:]) if line.strip()]
+
+def render_alerts_panel(api, context: Dict):
+    """アラートパネルを表示"""
+    import streamlit as st
+    from datetime import datetime
+    
+    alerts = read_recent_alerts()
+    if not alerts:
+        st.info("アラートはまだありません（`python meter_poller.py` で監視を開始します）")
+        return
+    
+    # ルール×デバイスごとの最新状態
+    latest = {}
+    for alert in reversed(alerts):
+        latest[(alert["rule"], alert["deviceId"])] = alert
+    firing = [a for a in latest.values() if a["state"] == "firing"]
+    
+    st.metric("🚨 発生中のアラート", len(firing))
+    for alert in firing:
+        icon = "🔴" if alert["severity"] == "critical" else "🟠"
+        st.markdown(f"{icon} **{alert['deviceId']}** {alert['message']}")
+    
+    st.markdown("**📋 履歴**")
+    st.dataframe([
+        {
+            "時刻": datetime.fromtimestamp(a["timestamp"]).strftime("%m-%d %H:%M"),
+            "状態": a["state"],
+            "デバイス": a["deviceId"],
+            "内容": a["message"],
+        }
+        for a in alerts
+    ], hide_index=True)
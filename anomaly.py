@@ -0,0 +1,255 @@
+"""
+Streaming anomaly detection for meters
+
+Each meter keeps its last `window` temperatures and humidities in a
+fixed-size NumPy ring buffer, so memory per device is constant and no
+history is ever re-read. On every poll tick the whole fleet is checked
+in a few vectorized operations:
+
+- spike: the new reading is far from the median of the last readings
+  in robust z-score terms (|x - median| / (1.4826 * MAD))
+- flatline: temperature and humidity have not changed at all for the
+  last `flat_samples` readings (stuck sensor or frozen cloud value)
+- decorrelated: while the fleet as a whole is moving, a meter's window
+  does not follow the fleet median (e.g. a sensor lying in the sun)
+
+Transitions are reported as alert_engine.Alert objects to the usual
+sinks, and the current flags are written to a snapshot file for the
+dashboard.
+"""
+
+import json
+import os
+import time
+import warnings
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from alert_engine import Alert
+from models import MeterStatus
+from switchbot_api import data_path
+
+CHECKS = ("spike", "flatline", "decorrelated")
+_METRICS = ("temperature", "humidity")
+
+class AnomalyDetector:
+    """Fixed-memory, vectorized anomaly checks across all meters"""
+    
+    def __init__(self, window: int = 60, z_threshold: float = 6.0, flat_samples: int = 30,
+                 min_mad: float = 0.2, min_correlation: float = 0.3, min_fleet_std: float = 0.3,
+                 sinks: Optional[List[Callable[[Alert], None]]] = None,
+                 snapshot_path: Optional[str] = None):
+        """
+        Args:
+            window: Readings kept per device
+            z_threshold: Robust z-score above which a reading is a spike
+            flat_samples: Identical readings in a row that count as a flatline
+            min_mad: Lower bound of the MAD (°C) so quiet rooms do not flag small steps
+            min_correlation: Correlation with the fleet median below which a meter is flagged
+            min_fleet_std: Minimum movement (°C) of the fleet median before correlation is checked
+            sinks: Callables receiving each Alert
+            snapshot_path: Current flags (default: DATA_DIR/anomalies.json)
+        """
+        if flat_samples > window:
+            raise ValueError("flat_samples must not exceed window")
+        self.window = window
+        self.z_threshold = z_threshold
+        self.flat_samples = flat_samples
+        self.min_mad = min_mad
+        self.min_correlation = min_correlation
+        self.min_fleet_std = min_fleet_std
+        self.sinks = sinks or []
+        self.snapshot_path = snapshot_path or data_path("anomalies.json")
+        self.device_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._capacity = 0
+        self._allocate(64)
+    
+    def _allocate(self, capacity: int):
+        """Grow the per-device buffers to capacity rows, keeping existing data"""
+        def grow(old, fill, dtype):
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=dtype)
+            new[:old.shape[0]] = old
+            return new
+        
+        if self._capacity == 0:
+            self.values = np.full((0, len(_METRICS), self.window), np.nan)
+            self.head = np.zeros(0, dtype=np.intp)
+            self.count = np.zeros(0, dtype=np.intp)
+            self.flags = np.zeros((0, len(CHECKS)), dtype=bool)
+            self.scores = np.full((0, len(CHECKS)), np.nan)
+        self.values = grow(self.values, np.nan, float)
+        self.head = grow(self.head, 0, np.intp)
+        self.count = grow(self.count, 0, np.intp)
+        self.flags = grow(self.flags, False, bool)
+        self.scores = grow(self.scores, np.nan, float)
+        self._capacity = capacity
+    
+    def _row(self, device_id: str) -> int:
+        row = self._rows.get(device_id)
+        if row is None:
+            row = len(self.device_ids)
+            if row >= self._capacity:
+                self._allocate(self._capacity * 2)
+            self.device_ids.append(device_id)
+            self._rows[device_id] = row
+        return row
+    
+    def _ordered(self, rows: np.ndarray) -> np.ndarray:
+        """Buffers of the given rows, oldest reading first"""
+        offsets = (self.head[rows, None] + np.arange(self.window)) % self.window
+        return np.take_along_axis(self.values[rows], offsets[:, None, :], axis=2)
+    
+    def process(self, samples: List[MeterStatus], now: Optional[float] = None) -> List[Alert]:
+        """
+        Check one tick of readings (poller subscriber)
+        
+        Args:
+            samples: Readings received this tick, at most one per device
+            now: Evaluation time (default: now)
+        
+        Returns:
+            Alerts for flags that started or cleared this tick
+        """
+        now = time.time() if now is None else now
+        if not samples:
+            return []
+        rows = np.fromiter((self._row(s.device_id) for s in samples), dtype=np.intp, count=len(samples))
+        current = np.array([
+            [np.nan if getattr(s, m) is None else getattr(s, m) for m in _METRICS] for s in samples
+        ], dtype=float)
+        n = len(self.device_ids)
+        new_flags = self.flags[:n].copy()
+        scores = self.scores[:n]
+        
+        # 全てNaNの窓に対する nanmedian などの警告は無視
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            # スパイク判定（今回の値を入れる前の直近15件と比較し、傾向の変化に引きずられないようにする）
+            past = self._ordered(rows)[:, 0, -min(self.window, 15):]
+            median = np.nanmedian(past, axis=1)
+            mad = np.nanmedian(np.abs(past - median[:, None]), axis=1)
+            z = np.abs(current[:, 0] - median) / (1.4826 * np.maximum(mad, self.min_mad))
+            enough = self.count[rows] >= min(self.window, 10)
+            spike = enough & (z > self.z_threshold)
+            scores[rows, 0] = np.where(enough, z, np.nan)
+            new_flags[rows, 0] = spike
+            
+            # リングバッファに書き込み（単発のスパイクは窓を汚さないよう欠測扱い、続けば段差として採用）
+            stored = current.copy()
+            stored[spike & ~self.flags[rows, 0], 0] = np.nan
+            self.values[rows, :, self.head[rows]] = stored
+            self.head[rows] = (self.head[rows] + 1) % self.window
+            self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+            
+            # フラットライン判定（温度・湿度とも変化なし）
+            ordered = self._ordered(rows)
+            recent = ordered[:, :, -self.flat_samples:]
+            span = np.nanmax(recent, axis=2) - np.nanmin(recent, axis=2)
+            full = self.count[rows] >= self.flat_samples
+            flat = full & np.all(span == 0, axis=1)
+            scores[rows, 1] = np.where(full, np.nanmax(span, axis=1), np.nan)
+            new_flags[rows, 1] = flat
+            
+            # 全体（中央値）の温度推移との相関
+            ready = np.flatnonzero(self.count[:n] == self.window)
+            new_flags[self.count[:n] < self.window, 2] = False
+            if len(ready) >= 3:
+                series = self._ordered(ready)[:, 0, :]
+                fleet = np.nanmedian(series, axis=0)
+                # 全体が動いていないときは前回の判定を維持
+                if np.nanstd(fleet) >= self.min_fleet_std:
+                    centered = series - np.nanmean(series, axis=1, keepdims=True)
+                    fleet = fleet - np.nanmean(fleet)
+                    num = np.nansum(centered * fleet, axis=1)
+                    den = np.sqrt(np.nansum(centered ** 2, axis=1) * np.nansum(fleet ** 2))
+                    corr = np.where(den > 0, num / den, np.nan)
+                    scores[ready, 2] = corr
+                    # 境界付近でのばたつきを防ぐため、解除は少し高い相関まで待つ
+                    limit = np.where(self.flags[ready, 2], self.min_correlation + 0.2, self.min_correlation)
+                    new_flags[ready, 2] = corr < limit
+        
+        alerts = []
+        started = np.argwhere(new_flags & ~self.flags[:n])
+        cleared = np.argwhere(self.flags[:n] & ~new_flags)
+        for (row, check), state in [(rc, "firing") for rc in started] + [(rc, "resolved") for rc in cleared]:
+            alerts.append(self._alert(row, check, state, now))
+        self.flags[:n] = new_flags
+        
+        for alert in alerts:
+            for sink in self.sinks:
+                try:
+                    sink(alert)
+                except Exception as e:
+                    print(f"[anomaly] sink failed: {str(e)}")
+        self._write_snapshot(now)
+        return alerts
+    
+    def _alert(self, row: int, check: int, state: str, now: float) -> Alert:
+        score = self.scores[row, check]
+        score = None if np.isnan(score) else round(float(score), 2)
+        details = {"spike": f"robust z-score {score}", "flatline": "no change in temperature and humidity",
+                   "decorrelated": f"correlation with fleet {score}"}
+        name = f"anomaly_{CHECKS[check]}"
+        return Alert(name, self.device_ids[row], state, "warning", score, f"{name}: {details[CHECKS[check]]}", now)
+    
+    def flagged(self) -> List[Dict]:
+        """Devices with at least one active flag"""
+        n = len(self.device_ids)
+        return [
+            {
+                "deviceId": self.device_ids[row],
+                "checks": [CHECKS[c] for c in np.flatnonzero(self.flags[row])],
+                "scores": {CHECKS[c]: None if np.isnan(v) else round(float(v), 2) for c, v in enumerate(self.scores[row])},
+            }
+            for row in np.flatnonzero(self.flags[:n].any(axis=1))
+        ]
+    
+    def _write_snapshot(self, now: float):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": now, "devices": self.flagged()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+
+def read_snapshot(path: Optional[str] = None) -> Dict:
+    """
+    Read the flags written by the poller
+    
+    Args:
+        path: Snapshot file (default: DATA_DIR/anomalies.json)
+    
+    Returns:
+        {"updated_at": ..., "devices": [...]} (empty when nothing was written yet)
+    """
+    try:
+        with open(path or data_path("anomalies.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"updated_at": None, "devices": []}
+
+def render_anomaly_panel(api, context: Dict):
+    """異常検知パネルを表示"""
+    import streamlit as st
+    from datetime import datetime
+    
+    snapshot = read_snapshot()
+    if snapshot["updated_at"] is None:
+        st.info("異常検知の結果はまだありません（`python meter_poller.py` で監視を開始します）")
+        return
+    
+    labels = {"spike": "⚡ スパイク", "flatline": "➖ 値が変化しない", "decorrelated": "🔀 他の部屋と不一致"}
+    names = {d.get("deviceId"): d.get("deviceName", d.get("deviceId")) for d in context.get("devices", [])}
+    st.caption(f"最終更新: {datetime.fromtimestamp(snapshot['updated_at']).strftime('%m-%d %H:%M')}")
+    if not snapshot["devices"]:
+        st.success("✅ 異常のある温度計はありません")
+        return
+    st.dataframe([
+        {
+            "デバイス": names.get(d["deviceId"], d["deviceId"]),
+            "検知": " / ".join(labels.get(c, c) for c in d["checks"]),
+            "zスコア": d["scores"].get("spike"),
+            "相関": d["scores"].get("decorrelated"),
+        }
+        for d in snapshot["devices"]
+    ], hide_index=True)
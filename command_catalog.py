@@ -0,0 +1,279 @@
+"""
+Declarative catalog of device commands
+
+Every command the client can send is described here once per device
+type (physical deviceType) or remote type (infrared remoteType), together
+with how its parameter is encoded and validated. SwitchBotAPI sends all
+commands through one path that consults this catalog, so malformed
+parameters (a temperature out of range, an unknown mode, a setAll
+string with the wrong number of fields) are rejected locally with a
+ValueError instead of costing an API call.
+
+    build_command("Air Conditioner", "setAll", 26, "cool", "auto", "on")
+    # -> {"command": "setAll", "parameter": "26,2,1,on", "commandType": "command"}
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# IRエアコンの setAll で使う値（"温度,モード,風量,電源"）
+AC_MODE_VALUES = {"auto": 1, "cool": 2, "dry": 3, "fan": 4, "heat": 5}
+AC_FAN_VALUES = {"auto": 1, "low": 2, "medium": 3, "high": 4}
+AC_TEMPERATURE_RANGE = (16, 30)
+
+# ===== パラメータの型 =====
+
+class Param:
+    """No parameter ("default")"""
+    
+    def encode(self, *args) -> str:
+        if args and args != ("default",):
+            raise ValueError("This command takes no parameter")
+        return "default"
+    
+    def check(self, value: str):
+        if value not in ("default", "", None):
+            raise ValueError(f"This command takes no parameter (got {value!r})")
+
+class IntParam(Param):
+    """Integer within an inclusive range"""
+    
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+    
+    def encode(self, *args) -> str:
+        if len(args) != 1:
+            raise ValueError("Expected one integer parameter")
+        self.check(str(args[0]))
+        return str(int(args[0]))
+    
+    def check(self, value: str):
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Expected an integer, got {value!r}")
+        if not self.low <= number <= self.high:
+            raise ValueError(f"Value {number} out of range {self.low}-{self.high}")
+
+class ChoiceParam(Param):
+    """One of a fixed set of strings"""
+    
+    def __init__(self, choices: Sequence[str]):
+        self.choices = tuple(choices)
+    
+    def encode(self, *args) -> str:
+        if len(args) != 1:
+            raise ValueError("Expected one parameter")
+        self.check(str(args[0]))
+        return str(args[0])
+    
+    def check(self, value: str):
+        if value not in self.choices:
+            raise ValueError(f"Expected one of {', '.join(self.choices)}, got {value!r}")
+
+class FieldsParam(Param):
+    """Several fields joined by a separator (e.g. setAll "26,2,1,on", setColor "255:0:0")"""
+    
+    def __init__(self, fields: Sequence[Tuple[str, Param]], separator: str = ","):
+        self.fields = tuple(fields)
+        self.separator = separator
+    
+    def encode(self, *args) -> str:
+        if len(args) != len(self.fields):
+            names = ", ".join(name for name, _ in self.fields)
+            raise ValueError(f"Expected {len(self.fields)} parameters ({names})")
+        value = self.separator.join(param.encode(arg) for (_, param), arg in zip(self.fields, args))
+        return value
+    
+    def check(self, value: str):
+        parts = str(value).split(self.separator)
+        if len(parts) != len(self.fields):
+            names = self.separator.join(name for name, _ in self.fields)
+            raise ValueError(f"Expected {names}, got {value!r}")
+        for (name, param), part in zip(self.fields, parts):
+            try:
+                param.check(part)
+            except ValueError as e:
+                raise ValueError(f"{name}: {str(e)}")
+
+class SetAllParam(FieldsParam):
+    """Infrared AC setAll; accepts mode / fan names when encoding"""
+    
+    def __init__(self):
+        super().__init__([
+            ("temperature", IntParam(*AC_TEMPERATURE_RANGE)),
+            ("mode", ChoiceParam([str(v) for v in AC_MODE_VALUES.values()])),
+            ("fan", ChoiceParam([str(v) for v in AC_FAN_VALUES.values()])),
+            ("power", ChoiceParam(["on", "off"])),
+        ])
+    
+    def encode(self, temperature, mode="auto", fan="auto", power="on") -> str:
+        mode = AC_MODE_VALUES.get(mode, mode)
+        fan = AC_FAN_VALUES.get(fan, fan)
+        return super().encode(temperature, mode, fan, power)
+
+@dataclass(frozen=True)
+class CommandSpec:
+    """One command accepted by a device or remote type"""
+    name: str
+    param: Param
+    command_type: str = "command"
+
+def _commands(*specs: Tuple) -> Dict[str, CommandSpec]:
+    """Build a name → CommandSpec table; bare names take no parameter"""
+    table = {}
+    for spec in specs:
+        name, param = (spec, Param()) if isinstance(spec, str) else spec
+        table[name] = CommandSpec(name, param)
+    return table
+
+_POWER = ("turnOn", "turnOff")
+_PERCENT = IntParam(0, 100)
+_BRIGHTNESS = IntParam(1, 100)
+_COLOR = FieldsParam([("red", IntParam(0, 255)), ("green", IntParam(0, 255)), ("blue", IntParam(0, 255))], ":")
+_COLOR_TEMPERATURE = IntParam(2700, 6500)
+_CURTAIN_POSITION = FieldsParam([("index", IntParam(0, 0)), ("mode", ChoiceParam(["0", "1", "ff"])),
+                                 ("position", _PERCENT)])
+_TV_COMMANDS = _commands(*_POWER, "volumeAdd", "volumeSub", "channelAdd", "channelSub",
+                         ("SetChannel", IntParam(1, 999)), ("setVolume", _PERCENT))
+_MEDIA_COMMANDS = _commands(*_POWER, "setMute", "FastForward", "Rewind", "Next", "Previous", "Pause", "Play",
+                            "Stop", "volumeAdd", "volumeSub")
+
+# 物理デバイスの deviceType → コマンド
+DEVICE_COMMANDS: Dict[str, Dict[str, CommandSpec]] = {
+    "Bot": _commands(*_POWER, "press"),
+    "Plug": _commands(*_POWER),
+    "Plug Mini (US)": _commands(*_POWER, "toggle"),
+    "Plug Mini (JP)": _commands(*_POWER, "toggle"),
+    "Curtain": _commands(*_POWER, "pause", ("setPosition", _CURTAIN_POSITION)),
+    "Curtain3": _commands(*_POWER, "pause", ("setPosition", _CURTAIN_POSITION)),
+    "Blind Tilt": _commands("fullyOpen", "closeUp", "closeDown", ("setPosition", FieldsParam(
+        [("direction", ChoiceParam(["up", "down"])), ("position", IntParam(0, 100))], ";"))),
+    "Smart Lock": _commands("lock", "unlock"),
+    "Smart Lock Pro": _commands("lock", "unlock"),
+    "Humidifier": _commands(*_POWER, ("setMode", ChoiceParam(["auto"] + [str(i) for i in range(104)]))),
+    "Color Bulb": _commands(*_POWER, "toggle", ("setBrightness", _BRIGHTNESS), ("setColor", _COLOR),
+                            ("setColorTemperature", _COLOR_TEMPERATURE)),
+    "Strip Light": _commands(*_POWER, "toggle", ("setBrightness", _BRIGHTNESS), ("setColor", _COLOR)),
+    "Ceiling Light": _commands(*_POWER, "toggle", ("setBrightness", _BRIGHTNESS),
+                               ("setColorTemperature", _COLOR_TEMPERATURE)),
+    "Ceiling Light Pro": _commands(*_POWER, "toggle", ("setBrightness", _BRIGHTNESS),
+                                   ("setColorTemperature", _COLOR_TEMPERATURE)),
+    "Robot Vacuum Cleaner S1": _commands("start", "stop", "dock", ("PowLevel", IntParam(0, 3))),
+}
+
+# 仮想IRリモコンの remoteType → コマンド
+REMOTE_COMMANDS: Dict[str, Dict[str, CommandSpec]] = {
+    "Air Conditioner": _commands(*_POWER, ("setAll", SetAllParam())),
+    "TV": _TV_COMMANDS,
+    "IPTV": _TV_COMMANDS,
+    "Streamer": _TV_COMMANDS,
+    "Set Top Box": _TV_COMMANDS,
+    "DVD": _MEDIA_COMMANDS,
+    "Speaker": _MEDIA_COMMANDS,
+    "Fan": _commands(*_POWER, "swing", "timer", "lowSpeed", "middleSpeed", "highSpeed"),
+    "Light": _commands(*_POWER, "brightnessUp", "brightnessDown"),
+}
+
+# 状態取得のみでコマンドを持たない deviceType
+STATUS_ONLY_TYPES = ("Meter", "MeterPlus", "Meter Plus (JP)", "MeterPro", "MeterPro(CO2)", "WoIOSensor",
+                     "Hub Mini", "Hub Plus", "Hub 2", "Motion Sensor", "Contact Sensor")
+
+def commands_for(device_type: str) -> Optional[Dict[str, CommandSpec]]:
+    """
+    Commands of a deviceType or remoteType
+    
+    Args:
+        device_type: deviceType or remoteType from /devices
+    
+    Returns:
+        name → CommandSpec, {} for status-only types, None for types not in the catalog
+    """
+    if device_type in DEVICE_COMMANDS:
+        return DEVICE_COMMANDS[device_type]
+    if device_type in REMOTE_COMMANDS:
+        return REMOTE_COMMANDS[device_type]
+    if device_type in STATUS_ONLY_TYPES:
+        return {}
+    return None
+
+def _find(command: str, device_type: Optional[str]) -> List[CommandSpec]:
+    """Specs for a command name, for one type or (type unknown) every type defining it"""
+    if device_type is not None:
+        table = commands_for(device_type)
+        if table is not None:
+            if command not in table:
+                raise ValueError(f"{device_type} does not support command {command!r}")
+            return [table[command]]
+    return [t[command] for t in list(DEVICE_COMMANDS.values()) + list(REMOTE_COMMANDS.values()) if command in t]
+
+def build_command(device_type: str, command: str, *args) -> Dict[str, str]:
+    """
+    Encode and validate a command for a device type
+    
+    Args:
+        device_type: deviceType or remoteType
+        command: Command name
+        *args: Parameter values (e.g. temperature, mode, fan, power for setAll)
+    
+    Returns:
+        Request payload {"command", "parameter", "commandType"}
+    """
+    specs = _find(command, device_type)
+    if not specs:
+        raise ValueError(f"Unknown command {command!r}")
+    spec = specs[0]
+    return {"command": spec.name, "parameter": spec.param.encode(*args), "commandType": spec.command_type}
+
+def validate_command(command: str, parameter: str = "default", device_type: Optional[str] = None,
+                     command_type: str = "command"):
+    """
+    Check an already encoded command before it is sent
+    
+    Commands the catalog does not know (and customize commands of
+    learned IR buttons) pass unchecked. Without a device type a parameter
+    is accepted when any type defining the command accepts it.
+    
+    Args:
+        command: Command name
+        parameter: Encoded parameter
+        device_type: deviceType or remoteType if known
+        command_type: "command" or "customize"
+    
+    Raises:
+        ValueError: The command or its parameter is invalid
+    """
+    if command_type != "command":
+        return
+    specs = _find(command, device_type)
+    errors = []
+    for spec in specs:
+        try:
+            spec.param.check(parameter)
+            return
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise ValueError(f"Invalid parameter for {command}: {errors[0]}")
+
+def format_set_all(temperature: int, mode: str = "auto", fan: str = "auto", power: str = "on") -> str:
+    """
+    Build the setAll parameter for an infrared air conditioner
+    
+    Args:
+        temperature: Temperature in Celsius (16-30)
+        mode: auto, cool, dry, fan or heat
+        fan: auto, low, medium or high
+        power: on or off
+    
+    Returns:
+        Parameter string "temperature,mode,fan,power"
+    """
+    return REMOTE_COMMANDS["Air Conditioner"]["setAll"].param.encode(temperature, mode, fan, power)
+
+def device_types() -> Dict[str, List[str]]:
+    """Every catalogued type and its command names (status-only types have none)"""
+    types = {name: list(table) for name, table in {**DEVICE_COMMANDS, **REMOTE_COMMANDS}.items()}
+    types.update({name: [] for name in STATUS_ONLY_TYPES})
+    return types
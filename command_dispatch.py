@@ -0,0 +1,118 @@
+"""
+Asynchronous device commands with optimistic acknowledgement
+
+Dashboard buttons hand their command to a CommandDispatcher and return
+immediately; the card shows the command as pending while a worker thread
+sends it. For physical devices the expected result (e.g. power "on") is
+then confirmed with a targeted status re-check, retried a few times
+because devices take a moment to report their new state. Infrared
+remotes have no status, so their commands are settled once the cloud
+accepts them.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from request_scheduler import INTERACTIVE, priority
+
+# 状態の遷移: sending → sent（確認なし）/ confirming → confirmed / mismatch、失敗時は failed
+PENDING_STATES = ("sending", "confirming")
+
+@dataclass
+class PendingCommand:
+    """Progress of one dispatched command"""
+    device_id: str
+    label: str
+    expected: Optional[Dict] = None
+    state: str = "sending"
+    error: Optional[str] = None
+    status: Optional[Dict] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    
+    @property
+    def pending(self) -> bool:
+        return self.state in PENDING_STATES
+
+class CommandDispatcher:
+    """Runs device commands in worker threads and confirms their effect"""
+    
+    def __init__(self, max_workers: int = 4, confirm_delay: float = 1.5, confirm_attempts: int = 3):
+        """
+        Args:
+            max_workers: Commands sent in parallel
+            confirm_delay: Seconds between sending and each status re-check
+            confirm_attempts: Status re-checks before reporting a mismatch
+        """
+        self.confirm_delay = confirm_delay
+        self.confirm_attempts = confirm_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command")
+        self._lock = threading.Lock()
+        self._latest: Dict[str, PendingCommand] = {}
+    
+    def submit(self, device_id: str, label: str, send: Callable[[], object],
+               check: Optional[Callable[[], Optional[Dict]]] = None,
+               expected: Optional[Dict] = None) -> PendingCommand:
+        """
+        Send a command in the background
+        
+        Args:
+            device_id: Target device
+            label: Text shown while the command is pending (e.g. "照明ON")
+            send: Performs the API call
+            check: Returns the device status (physical devices only)
+            expected: Status fields the command should produce, e.g. {"power": "on"}
+        
+        Returns:
+            PendingCommand updated in place as the command progresses
+        """
+        command = PendingCommand(device_id, label, expected if check else None)
+        with self._lock:
+            self._latest[device_id] = command
+        self._executor.submit(self._run, command, send, check)
+        return command
+    
+    def _run(self, command: PendingCommand, send: Callable[[], object], check):
+        try:
+            with priority(INTERACTIVE):
+                send()
+        except Exception as e:
+            self._finish(command, "failed", error=str(e))
+            return
+        if check is None or not command.expected:
+            self._finish(command, "sent")
+            return
+        
+        command.state = "confirming"
+        for _ in range(self.confirm_attempts):
+            time.sleep(self.confirm_delay)
+            try:
+                with priority(INTERACTIVE):
+                    command.status = check() or {}
+            except Exception as e:
+                command.error = str(e)
+                continue
+            if all(command.status.get(k) == v for k, v in command.expected.items()):
+                self._finish(command, "confirmed")
+                return
+        self._finish(command, "mismatch")
+    
+    def _finish(self, command: PendingCommand, state: str, error: Optional[str] = None):
+        command.error = error or command.error
+        command.finished_at = time.time()
+        command.state = state
+    
+    def latest(self, device_id: str) -> Optional[PendingCommand]:
+        """Most recent command sent to a device"""
+        with self._lock:
+            return self._latest.get(device_id)
+    
+    def has_pending(self) -> bool:
+        with self._lock:
+            return any(c.pending for c in self._latest.values())
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,219 @@
+"""
+Persistent device catalog with change detection
+
+The /devices response barely changes, so it is kept on disk and loaded
+instantly at startup. A background refresh compares a content hash and
+notifies subscribers only when devices are added, removed or renamed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from request_scheduler import BACKGROUND, priority
+from switchbot_api import SwitchBotAPI, data_path
+
+# 変更検知の対象となるフィールド
+HASHED_FIELDS = ("deviceId", "deviceName", "deviceType", "remoteType", "hubDeviceId")
+
+@dataclass
+class CatalogDiff:
+    """Difference between two catalog versions"""
+    added: List[Dict] = field(default_factory=list)
+    removed: List[Dict] = field(default_factory=list)
+    renamed: List[Dict] = field(default_factory=list)
+    
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.renamed)
+
+def catalog_hash(devices: List[Dict], remotes: List[Dict]) -> str:
+    """
+    Compute a content hash that ignores ordering and volatile fields
+    
+    Args:
+        devices: Physical device list
+        remotes: Infrared remote list
+    
+    Returns:
+        Hex digest of the catalog contents
+    """
+    entries = sorted(
+        [kind] + [str(d.get(f, "")) for f in HASHED_FIELDS]
+        for kind, items in (("device", devices), ("remote", remotes))
+        for d in items
+    )
+    return hashlib.sha256(json.dumps(entries, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def diff_catalogs(old: List[Dict], new: List[Dict]) -> CatalogDiff:
+    """
+    Compare two device lists by deviceId
+    
+    Args:
+        old: Previous devices and remotes
+        new: Current devices and remotes
+    
+    Returns:
+        CatalogDiff with added, removed and renamed entries
+    """
+    old_by_id = {d.get("deviceId"): d for d in old}
+    new_by_id = {d.get("deviceId"): d for d in new}
+    diff = CatalogDiff()
+    for device_id, device in new_by_id.items():
+        previous = old_by_id.get(device_id)
+        if previous is None:
+            diff.added.append(device)
+        elif previous.get("deviceName") != device.get("deviceName"):
+            diff.renamed.append({"deviceId": device_id, "from": previous.get("deviceName"), "to": device.get("deviceName")})
+    diff.removed = [d for device_id, d in old_by_id.items() if device_id not in new_by_id]
+    return diff
+
+class DeviceCatalog:
+    """Device and infrared remote list persisted on disk and refreshed in the background"""
+    
+    def __init__(self, api: SwitchBotAPI, path: Optional[str] = None, refresh_interval: float = 300):
+        """
+        Initialize the catalog and load the persisted copy if there is one
+        
+        Args:
+            api: SwitchBot API client
+            path: Catalog file path (default: DATA_DIR/device_catalog.json)
+            refresh_interval: Seconds between background refreshes
+        """
+        self.api = api
+        self.path = path or data_path("device_catalog.json")
+        self.refresh_interval = refresh_interval
+        
+        self.devices: List[Dict] = []
+        self.remotes: List[Dict] = []
+        self.version = ""
+        self.updated_at = 0.0
+        self.last_error: Optional[str] = None
+        
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[["DeviceCatalog", CatalogDiff], None]] = []
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        
+        self.load()
+    
+    @property
+    def is_loaded(self) -> bool:
+        """True once a catalog has been read from disk or fetched"""
+        return bool(self.version)
+    
+    def load(self) -> bool:
+        """
+        Load the persisted catalog
+        
+        Returns:
+            True if a catalog file was read
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        with self._lock:
+            self.devices = data.get("devices", [])
+            self.remotes = data.get("remotes", [])
+            self.version = data.get("version") or catalog_hash(self.devices, self.remotes)
+            self.updated_at = data.get("updated_at", 0.0)
+        return True
+    
+    def save(self):
+        """Write the catalog atomically"""
+        with self._lock:
+            data = {
+                "version": self.version,
+                "updated_at": self.updated_at,
+                "devices": self.devices,
+                "remotes": self.remotes,
+            }
+        # ダッシュボード・ポーリング・CLIが同じファイルを書くので一時ファイルはプロセスごとに分ける
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def subscribe(self, callback: Callable[["DeviceCatalog", CatalogDiff], None]):
+        """
+        Register a callback invoked only when the catalog contents change
+        
+        Args:
+            callback: Function receiving (catalog, diff)
+        """
+        self._listeners.append(callback)
+    
+    def refresh(self) -> Optional[CatalogDiff]:
+        """
+        Fetch /devices and update the catalog if its contents changed
+        
+        Returns:
+            CatalogDiff if the catalog changed, None otherwise
+        """
+        self.api.invalidate_cache()
+        try:
+            with priority(BACKGROUND):
+                devices, remotes = self.api.get_devices_and_remotes()
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+        self.last_error = None
+        
+        new_version = catalog_hash(devices, remotes)
+        with self._lock:
+            self.updated_at = time.time()
+            if new_version == self.version:
+                changed = False
+            else:
+                diff = diff_catalogs(self.devices + self.remotes, devices + remotes)
+                self.devices, self.remotes, self.version = devices, remotes, new_version
+                changed = True
+        if not changed:
+            return None
+        try:
+            self.save()
+        except OSError as e:
+            self.last_error = f"Failed to save device catalog: {str(e)}"
+        
+        for callback in list(self._listeners):
+            try:
+                callback(self, diff)
+            except Exception as e:
+                self.last_error = f"Catalog listener failed: {str(e)}"
+        return diff
+    
+    def refresh_async(self):
+        """Start a refresh in a background thread unless one is already running"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name="catalog-refresh", daemon=True)
+            self._refresh_thread.start()
+    
+    def start(self):
+        """Refresh now and then every refresh_interval seconds in a daemon thread"""
+        if self._loop_thread is not None and self._loop_thread.is_alive():
+            return
+        self._stop.clear()
+        
+        def loop():
+            while not self._stop.is_set():
+                # 予期しない例外でもループを止めない
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.last_error = str(e)
+                self._stop.wait(self.refresh_interval)
+        
+        self._loop_thread = threading.Thread(target=loop, name="catalog-refresh-loop", daemon=True)
+        self._loop_thread.start()
+    
+    def stop(self):
+        """Stop the background refresh loop"""
+        self._stop.set()
@@ -0,0 +1,256 @@
+"""
+Device classification registry and index
+
+Device and remote types are mapped to dashboard categories through
+explicit tables, with the old substring rules kept as a fallback for types
+that are not listed yet. The index is built once per catalog version and
+gives O(1) lookups by category and by device ID, plus text search over
+precomputed search keys. Rooms come from an optional DATA_DIR/rooms.json
+mapping device IDs to room names.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from switchbot_api import data_path
+
+@dataclass(frozen=True)
+class Category:
+    """Dashboard category"""
+    key: str
+    label: str
+    icon: str
+    title: str
+    columns: int = 3
+
+# 表示順に並んだカテゴリ
+CATEGORIES: Dict[str, Category] = {}
+
+# 物理デバイスの deviceType → カテゴリ
+DEVICE_TYPE_CATEGORIES: Dict[str, str] = {
+    "Meter": "thermometer",
+    "MeterPlus": "thermometer",
+    "Meter Plus (JP)": "thermometer",
+    "MeterPro": "thermometer",
+    "MeterPro(CO2)": "thermometer",
+    "WoIOSensor": "thermometer",
+    "Hub Mini": "hub",
+    "Hub Plus": "hub",
+    "Hub 2": "hub",
+    "Color Bulb": "light",
+    "Strip Light": "light",
+    "Ceiling Light": "light",
+    "Ceiling Light Pro": "light",
+}
+
+# 仮想IRリモコンの remoteType → カテゴリ
+REMOTE_TYPE_CATEGORIES: Dict[str, str] = {
+    "TV": "tv",
+    "Air Conditioner": "ac",
+    "Light": "light",
+}
+
+# テーブルにない deviceType 用の部分一致ルール（上から順に評価）
+FALLBACK_RULES: List[Tuple[Tuple[str, ...], str]] = [
+    (("Meter",), "thermometer"),
+    (("TV", "Television"), "tv"),
+    (("AC", "AirConditioner"), "ac"),
+    (("Light", "Bulb"), "light"),
+    (("Hub Mini",), "hub"),
+]
+
+DEFAULT_CATEGORY = "other"
+
+_type_cache: Dict[Tuple[str, str], str] = {}
+_indexes: Dict[str, "DeviceIndex"] = {}
+
+def register_category(key: str, label: str, icon: str, title: str, columns: int = 3):
+    """
+    Register a dashboard category (appended to the display order)
+    
+    Args:
+        key: Category key used in the type tables
+        label: Short label for the summary
+        icon: Emoji icon
+        title: Section title
+        columns: Number of card columns
+    """
+    CATEGORIES[key] = Category(key, label, icon, title, columns)
+    _indexes.clear()
+
+def register_device_type(device_type: str, category: str):
+    """
+    Map a physical deviceType to a category
+    
+    Args:
+        device_type: deviceType reported by /devices
+        category: Registered category key
+    """
+    DEVICE_TYPE_CATEGORIES[device_type] = category
+    _type_cache.clear()
+    _indexes.clear()
+
+def register_remote_type(remote_type: str, category: str):
+    """
+    Map an infrared remoteType to a category
+    
+    Args:
+        remote_type: remoteType reported by /devices
+        category: Registered category key
+    """
+    REMOTE_TYPE_CATEGORIES[remote_type] = category
+    _type_cache.clear()
+    _indexes.clear()
+
+def _classify_type(kind: str, type_name: str) -> str:
+    """Resolve a category for a (kind, type) pair without caching"""
+    if kind == "remote":
+        return REMOTE_TYPE_CATEGORIES.get(type_name, DEFAULT_CATEGORY)
+    category = DEVICE_TYPE_CATEGORIES.get(type_name)
+    if category is not None:
+        return category
+    for needles, fallback in FALLBACK_RULES:
+        if any(needle in type_name for needle in needles):
+            return fallback
+    return DEFAULT_CATEGORY
+
+def classify(device: Dict) -> str:
+    """
+    Get the category key for a device or infrared remote
+    
+    Args:
+        device: Device or remote entry from /devices
+    
+    Returns:
+        Category key
+    """
+    if "remoteType" in device:
+        key = ("remote", device.get("remoteType", ""))
+    else:
+        key = ("device", device.get("deviceType", ""))
+    category = _type_cache.get(key)
+    if category is None:
+        category = _classify_type(*key)
+        _type_cache[key] = category
+    return category
+
+class DeviceIndex:
+    """Category → devices and device ID → device lookups for one catalog version"""
+    
+    def __init__(self, devices: List[Dict], remotes: List[Dict], version: str = ""):
+        """
+        Build the index
+        
+        Args:
+            devices: Physical device list
+            remotes: Infrared remote list
+            version: Catalog version the index was built from
+        """
+        self.version = version
+        self.by_category: Dict[str, List[Dict]] = {key: [] for key in CATEGORIES}
+        self.by_id: Dict[str, Dict] = {}
+        self.category_of: Dict[str, str] = {}
+        # 検索用に名前・ID・種別を小文字でまとめておく
+        self._search_keys: Dict[str, str] = {}
+        
+        for device in devices + remotes:
+            category = classify(device)
+            self.by_category.setdefault(category, []).append(device)
+            device_id = device.get("deviceId")
+            if device_id:
+                self.by_id[device_id] = device
+                self.category_of[device_id] = category
+                self._search_keys[device_id] = " ".join((
+                    device.get("deviceName", ""), device_id,
+                    device.get("deviceType") or device.get("remoteType", ""), device.get("site", ""),
+                )).lower()
+    
+    def get(self, device_id: str) -> Optional[Dict]:
+        """Get a device or remote by ID"""
+        return self.by_id.get(device_id)
+    
+    def devices_in(self, category: str) -> List[Dict]:
+        """Get the devices of a category"""
+        return self.by_category.get(category, [])
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of devices per non-empty category"""
+        return {key: len(items) for key, items in self.by_category.items() if items}
+    
+    def search(self, query: str, category: Optional[str] = None, rooms: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        Devices whose name, ID, type, site or room contain every word of a query
+        
+        Args:
+            query: Space-separated words (case-insensitive); empty matches everything
+            category: Limit to one category
+            rooms: Device ID → room name (see load_rooms)
+        
+        Returns:
+            Matching devices in catalog order
+        """
+        devices = self.devices_in(category) if category else list(self.by_id.values())
+        words = query.lower().split()
+        if not words:
+            return devices
+        rooms = rooms or {}
+        matches = []
+        for device in devices:
+            device_id = device.get("deviceId", "")
+            key = self._search_keys.get(device_id, "")
+            room = rooms.get(device_id, "").lower()
+            if all(word in key or word in room for word in words):
+                matches.append(device)
+        return matches
+
+_rooms_cache: Tuple[Optional[float], Dict[str, str]] = (None, {})
+
+def load_rooms(path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Device ID → room name mapping, re-read only when the file changes
+    
+    Args:
+        path: Mapping file (default: DATA_DIR/rooms.json), e.g. {"C1...": "リビング"}
+    
+    Returns:
+        Mapping (empty when the file does not exist)
+    """
+    global _rooms_cache
+    path = path or data_path("rooms.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _rooms_cache[0]:
+        with open(path, "r", encoding="utf-8") as f:
+            _rooms_cache = (mtime, json.load(f))
+    return _rooms_cache[1]
+
+def index_for(catalog) -> DeviceIndex:
+    """
+    Get the index for a DeviceCatalog, building it only once per catalog version
+    
+    Args:
+        catalog: DeviceCatalog (or any object with devices, remotes and version)
+    
+    Returns:
+        DeviceIndex for the current catalog version
+    """
+    version = catalog.version
+    index = _indexes.get(version) if version else None
+    if index is None:
+        index = DeviceIndex(catalog.devices, catalog.remotes, version)
+        if version:
+            if len(_indexes) >= 16:
+                _indexes.clear()
+            _indexes[version] = index
+    return index
+
+register_category("thermometer", "温度計", "🌡️", "温度計デバイス", columns=4)
+register_category("tv", "テレビ", "📺", "テレビデバイス")
+register_category("ac", "エアコン", "❄️", "エアコンデバイス")
+register_category("light", "照明", "💡", "照明デバイス")
+register_category("hub", "Hub", "🔧", "Hubデバイス", columns=4)
+register_category("other", "その他", "🔧", "その他デバイス")
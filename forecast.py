@@ -0,0 +1,231 @@
+"""
+Short-horizon temperature forecasting
+
+ForecastBank keeps an additive Holt-Winters state per meter (level,
+damped trend per hour and 24 hourly seasonal offsets) in NumPy arrays and
+updates every meter of a poll tick in one vectorized step, so the cost
+per tick is a handful of array operations regardless of fleet size.
+Smoothing factors are scaled by the time since a meter's previous sample,
+which keeps the model consistent when polls are missed or the interval
+changes. Forecasts cover the next hours (1-6 h by default).
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import MeterStatus
+
+SEASON_BINS = 24
+# 平滑化係数は1時間あたりの値（サンプル間隔に応じてスケール）
+DEFAULT_ALPHA = 0.3
+DEFAULT_BETA = 0.02
+DEFAULT_GAMMA = 0.7
+DEFAULT_PHI = 0.7
+# 予測を出すのに必要な最小サンプル数
+MIN_SAMPLES = 30
+
+def _hour_bins(timestamps: np.ndarray) -> np.ndarray:
+    """Local hour of day for epoch timestamps"""
+    offset = datetime.now().astimezone().utcoffset().total_seconds()
+    return (((timestamps + offset) // 3600) % SEASON_BINS).astype(np.intp)
+
+class ForecastBank:
+    """Incremental Holt-Winters models for every meter"""
+    
+    def __init__(self, alpha: float = DEFAULT_ALPHA, beta: float = DEFAULT_BETA,
+                 gamma: float = DEFAULT_GAMMA, phi: float = DEFAULT_PHI):
+        """
+        Args:
+            alpha: Level smoothing per hour
+            beta: Trend smoothing per hour
+            gamma: Seasonal smoothing per hour spent in an hourly bin
+            phi: Trend damping per hour of horizon (1.0 = undamped)
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.device_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self.level = np.zeros(0)
+        self.trend = np.zeros(0)
+        self.season = np.zeros((0, SEASON_BINS))
+        self.last_ts = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+    
+    def _row(self, device_id: str) -> int:
+        row = self._rows.get(device_id)
+        if row is None:
+            row = self._rows[device_id] = len(self.device_ids)
+            self.device_ids.append(device_id)
+            if row >= len(self.level):
+                grow = max(16, len(self.level))
+                self.level = np.concatenate([self.level, np.zeros(grow)])
+                self.trend = np.concatenate([self.trend, np.zeros(grow)])
+                self.season = np.concatenate([self.season, np.zeros((grow, SEASON_BINS))])
+                self.last_ts = np.concatenate([self.last_ts, np.zeros(grow)])
+                self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+        return row
+    
+    def update(self, samples: List[MeterStatus]):
+        """
+        Fold one tick of readings into the models (poller subscriber)
+        
+        Args:
+            samples: Readings, at most one per device
+        """
+        valid = [s for s in samples if s.temperature is not None]
+        if not valid:
+            return
+        rows = np.fromiter((self._row(s.device_id) for s in valid), dtype=np.intp, count=len(valid))
+        ts = np.fromiter((s.timestamp for s in valid), dtype=float, count=len(valid))
+        y = np.fromiter((s.temperature for s in valid), dtype=float, count=len(valid))
+        
+        # 古い（既に取り込んだ）サンプルは無視
+        fresh = ts > self.last_ts[rows]
+        rows, ts, y = rows[fresh], ts[fresh], y[fresh]
+        if not len(rows):
+            return
+        
+        first = self.count[rows] == 0
+        bins = _hour_bins(ts)
+        dt_h = np.where(first, 0.0, (ts - self.last_ts[rows]) / 3600.0)
+        alpha = 1.0 - (1.0 - self.alpha) ** dt_h
+        beta = 1.0 - (1.0 - self.beta) ** dt_h
+        gamma = 1.0 - (1.0 - self.gamma) ** dt_h
+        
+        level, trend = self.level[rows], self.trend[rows]
+        season = self.season[rows, bins]
+        predicted = level + trend * dt_h
+        new_level = np.where(first, y - season, alpha * (y - season) + (1.0 - alpha) * predicted)
+        safe_dt = np.where(dt_h > 0, dt_h, 1.0)
+        new_trend = np.where(first | (dt_h <= 0), trend,
+                             beta * (new_level - level) / safe_dt + (1.0 - beta) * trend)
+        self.season[rows, bins] = np.where(first, season,
+                                           gamma * (y - new_level) + (1.0 - gamma) * season)
+        self.level[rows] = new_level
+        self.trend[rows] = new_trend
+        self.last_ts[rows] = ts
+        self.count[rows] += 1
+    
+    def warm_start(self, history, since: Optional[float] = None) -> float:
+        """
+        Replay persisted readings into the models
+        
+        Args:
+            history: meter_history.MeterHistory
+            since: Replay readings newer than this (default: 3 days ago)
+        
+        Returns:
+            Timestamp of the newest replayed reading (since when nothing was new),
+            to pass as since on the next incremental call
+        """
+        since = time.time() - 3 * 86400 if since is None else since
+        newest = since
+        for batch in history.iter_since(since):
+            newest = max(newest, batch[-1].timestamp)
+            # 1回の update では1デバイス1サンプルにまとめる
+            pending: Dict[str, MeterStatus] = {}
+            for sample in batch:
+                if sample.device_id in pending:
+                    self.update(list(pending.values()))
+                    pending = {}
+                pending[sample.device_id] = sample
+            self.update(list(pending.values()))
+        return newest
+    
+    def predict(self, device_id: str, hours: Tuple[float, ...] = (1, 2, 3, 4, 5, 6)) -> Optional[List[Tuple[float, float]]]:
+        """
+        Forecast a meter's temperature
+        
+        Args:
+            device_id: Meter device ID
+            hours: Horizons in hours after the last reading
+        
+        Returns:
+            [(timestamp, temperature), ...] or None when the model is not warmed up yet
+        """
+        row = self._rows.get(device_id)
+        if row is None or self.count[row] < MIN_SAMPLES:
+            return None
+        h = np.asarray(hours, dtype=float)
+        if self.phi < 1.0:
+            damped = self.phi * (1.0 - self.phi ** h) / (1.0 - self.phi)
+        else:
+            damped = h
+        ts = self.last_ts[row] + h * 3600.0
+        values = self.level[row] + self.trend[row] * damped + self.season[row, _hour_bins(ts)]
+        return list(zip(ts.tolist(), values.tolist()))
+    
+    def predict_at(self, device_id: str, timestamp: float) -> Optional[float]:
+        """
+        Forecast a meter's temperature at a point in time
+        
+        Args:
+            device_id: Meter device ID
+            timestamp: Target time (epoch seconds)
+        
+        Returns:
+            Temperature or None when the model is not warmed up yet
+        """
+        row = self._rows.get(device_id)
+        if row is None:
+            return None
+        forecast = self.predict(device_id, (max(0.0, (timestamp - self.last_ts[row]) / 3600.0),))
+        return forecast[0][1] if forecast else None
+
+# ダッシュボード用のモデル（プロセス内で共有し、前回読んだ時刻より新しい行だけを取り込む）
+_panel_bank: Optional[ForecastBank] = None
+_panel_since: Optional[float] = None
+_panel_lock = threading.Lock()
+
+def _dashboard_bank(history) -> ForecastBank:
+    global _panel_bank, _panel_since
+    with _panel_lock:
+        if _panel_bank is None:
+            _panel_bank = ForecastBank()
+        _panel_since = _panel_bank.warm_start(history, since=_panel_since)
+        return _panel_bank
+
+def render_forecast_panel(api, context: Dict):
+    """温度予測パネルを表示"""
+    import pandas as pd
+    import streamlit as st
+    from meter_history import get_history
+    
+    history = get_history()
+    # 温度計の一覧は取り込み済みのモデルから（描画のたびに履歴全体を走査しない）
+    bank = _dashboard_bank(history)
+    device_ids = list(bank.device_ids)
+    if not device_ids:
+        st.info("履歴がまだありません（`python meter_poller.py` で記録を開始します）")
+        return
+    
+    names = {d.get("deviceId"): d.get("deviceName", d.get("deviceId")) for d in context.get("devices", [])}
+    device_id = st.selectbox("温度計", device_ids, format_func=lambda d: names.get(d, d), key="forecast_device")
+    
+    # 直近24時間はポーリングサービスのリングバッファから（なければ履歴DBから）
+    from ring_buffer import recent_readings
+    recent = recent_readings(device_id, since=time.time() - 86400)
+    if recent is not None and len(recent):
+        timestamps, temperatures = recent["timestamp"], recent["temperature"]
+    else:
+        timestamps, temperatures = history.arrays(device_id, since=time.time() - 86400)
+    forecast = bank.predict(device_id)
+    if forecast is None:
+        st.info("予測にはもう少しデータが必要です")
+    else:
+        cols = st.columns(len(forecast))
+        for col, (ts, value) in zip(cols, forecast):
+            col.metric(datetime.fromtimestamp(ts).strftime("%H:%M"), f"{value:.1f}°C")
+    
+    frame = pd.DataFrame({"実測": temperatures}, index=[datetime.fromtimestamp(t) for t in timestamps])
+    if forecast:
+        predicted = pd.DataFrame({"予測": [v for _, v in forecast]},
+                                 index=[datetime.fromtimestamp(t) for t, _ in forecast])
+        frame = pd.concat([frame, predicted])
+    st.line_chart(frame)
@@ -0,0 +1,123 @@
+"""
+Export meter history to CSV, Parquet or Arrow IPC
+
+Rows are streamed from the history database in fixed-size batches and
+each batch is written out before the next one is read, so exporting a
+year of readings for a whole fleet runs in constant memory. Parquet and
+Arrow output need the optional pyarrow package; CSV has no extra
+dependency.
+"""
+
+import csv
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from meter_history import get_history
+
+FORMATS = ("csv", "parquet", "arrow")
+COLUMNS = ("device_id", "timestamp", "temperature", "humidity", "battery")
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise Exception("Parquet / Arrow export requires pyarrow (pip install pyarrow)")
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an ISO date or datetime in local time
+    
+    Args:
+        value: e.g. "2025-01-31" or "2025-01-31T12:00"
+    
+    Returns:
+        Epoch seconds (None for None)
+    """
+    if value is None:
+        return None
+    return datetime.fromisoformat(value).timestamp()
+
+def format_from_path(path: str) -> str:
+    """Guess the export format from a file name"""
+    if path.endswith(".parquet"):
+        return "parquet"
+    if path.endswith((".arrow", ".feather", ".ipc")):
+        return "arrow"
+    return "csv"
+
+def export_history(path: str, fmt: Optional[str] = None, device_ids: Optional[List[str]] = None,
+                   since: Optional[float] = None, until: Optional[float] = None,
+                   batch_size: int = 50000, history=None) -> int:
+    """
+    Write stored readings to a file
+    
+    Args:
+        path: Output file ("-" writes CSV to stdout)
+        fmt: csv, parquet or arrow (default: from the file name)
+        device_ids: Devices to export (default: all)
+        since: Oldest timestamp (inclusive)
+        until: Newest timestamp (exclusive)
+        batch_size: Rows read and written per batch
+        history: MeterHistory (default: shared history)
+    
+    Returns:
+        Number of exported rows
+    """
+    fmt = fmt or format_from_path(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    history = history or get_history()
+    batches = history.stream(device_ids, since or 0.0, until, batch_size)
+    if fmt == "csv":
+        return _write_csv(path, batches)
+    return _write_arrow(path, fmt, batches)
+
+def _write_csv(path: str, batches) -> int:
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        total = 0
+        for rows in batches:
+            writer.writerows(rows)
+            total += len(rows)
+        return total
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def _write_arrow(path: str, fmt: str, batches) -> int:
+    pa = _import_pyarrow()
+    schema = pa.schema([
+        ("device_id", pa.string()),
+        ("timestamp", pa.timestamp("ms", tz="UTC")),
+        ("temperature", pa.float32()),
+        ("humidity", pa.float32()),
+        ("battery", pa.int8()),
+    ])
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_file(path, schema)
+        write = writer.write_batch
+    
+    total = 0
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            batch = pa.record_batch([
+                pa.array(columns[0], pa.string()),
+                pa.array([int(ts * 1000) for ts in columns[1]], pa.int64()).cast(pa.timestamp("ms", tz="UTC")),
+                pa.array(columns[2], pa.float32()),
+                pa.array(columns[3], pa.float32()),
+                pa.array(columns[4], pa.int8()),
+            ], schema=schema)
+            write(batch)
+            total += len(rows)
+    finally:
+        writer.close()
+    return total
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Scripted IR remote test runner
+
+Runs a declarative test plan against many infrared remotes at once. Each
+remote's steps run in order on one worker (so a transmitter never gets
+two commands at the same time and the plan's gaps are respected), while
+different remotes run concurrently. Every command is timed and the run
+ends with a per-command summary of success rate and latency.
+
+Plan file (JSON):
+
+    {
+      "gap": 1.0,
+      "types": ["TV", "Light"],
+      "sequences": {
+        "TV": [{"command": "turnOn"}, {"command": "volumeAdd"}, {"wait": 2}, {"command": "volumeSub"}],
+        "Air Conditioner": [{"command": "setAll", "parameter": "26,2,1,on"}],
+        "*": [{"command": "turnOn"}, {"command": "turnOff"}]
+      },
+      "devices": {"02-XXXX": [{"command": "turnOn"}]}
+    }
+
+"sequences" is keyed by remoteType ("*" for any other type), "devices"
+overrides the sequence of single remotes, "types" limits the run to some
+remote types and "gap" is the pause in seconds after each command of a
+remote. Without --plan a default plan (the commands the dashboard sends)
+is used.
+
+    python ir_plan_runner.py --plan plan.json --concurrency 10 --report report.json
+    python ir_plan_runner.py --fake 50          # local fake cloud, no API calls
+
+The run is refused when the plan needs more calls than the budget allows.
+The runner cannot see what the dashboard or poller already spent today,
+so by default it assumes the account's full daily quota (settings.toml
+[budget], else daily_quota in SWITCHBOT_ACCOUNTS); pass --budget with the
+calls actually left. Commands sent to real remotes are recorded in the
+shared command log, so power commands show up in the runtime ledger.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from account_pool import DEFAULT_SITE, load_accounts
+from rate_budget import DEFAULT_DAILY_LIMIT, RateBudget
+from request_scheduler import RequestScheduler
+from settings import load_settings
+from switchbot_api import SwitchBotAPI, format_set_all, load_credentials
+from traffic_log import ReplayResponse, transport_from_env
+
+DEFAULT_PLAN = {
+    "gap": 1.0,
+    "sequences": {
+        "TV": [{"command": c} for c in ("turnOn", "volumeAdd", "volumeSub", "channelAdd", "channelSub")],
+        "Air Conditioner": [
+            {"command": "setAll", "parameter": format_set_all(26, "cool", "auto", "on")},
+            {"command": "setAll", "parameter": format_set_all(26, "cool", "auto", "off")},
+        ],
+        "Light": [{"command": "turnOn"}, {"command": "turnOff"}],
+        "*": [{"command": "turnOn"}, {"command": "turnOff"}],
+    },
+}
+
+@dataclass
+class StepResult:
+    """Outcome of one command sent to one remote"""
+    device_id: str
+    device_name: str
+    remote_type: str
+    command: str
+    parameter: str
+    ok: bool
+    latency: float
+    started_at: float
+    error: Optional[str] = None
+
+def _validate_steps(steps, where: str) -> List[Dict]:
+    if not isinstance(steps, list):
+        raise ValueError(f"{where}: steps must be a list")
+    for step in steps:
+        if not isinstance(step, dict) or ("command" in step) == ("wait" in step):
+            raise ValueError(f"{where}: each step needs exactly one of 'command' or 'wait': {step}")
+        if "wait" in step and float(step["wait"]) < 0:
+            raise ValueError(f"{where}: wait must not be negative")
+    return steps
+
+def load_plan(path: Optional[str] = None) -> Dict:
+    """
+    Read and validate a test plan
+    
+    Args:
+        path: Plan file (default: DEFAULT_PLAN)
+    
+    Returns:
+        Plan dict
+    """
+    if path is None:
+        return DEFAULT_PLAN
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    for remote_type, steps in plan.get("sequences", {}).items():
+        _validate_steps(steps, f"sequences.{remote_type}")
+    for device_id, steps in plan.get("devices", {}).items():
+        _validate_steps(steps, f"devices.{device_id}")
+    if float(plan.get("gap", 0)) < 0:
+        raise ValueError("gap must not be negative")
+    return plan
+
+def assign_steps(plan: Dict, remotes: List[Dict]) -> List[Tuple[Dict, List[Dict]]]:
+    """
+    Pick the steps each remote runs
+    
+    Args:
+        plan: Test plan
+        remotes: Infrared remotes from the API
+    
+    Returns:
+        [(remote, steps)] for every remote with at least one step
+    """
+    sequences = plan.get("sequences", {})
+    overrides = plan.get("devices", {})
+    types = plan.get("types")
+    assignments = []
+    for remote in remotes:
+        remote_type = remote.get("remoteType", "")
+        steps = overrides.get(remote.get("deviceId"))
+        if steps is None:
+            if types and remote_type not in types:
+                continue
+            steps = sequences.get(remote_type, sequences.get("*", []))
+        if any("command" in step for step in steps):
+            assignments.append((remote, steps))
+    return assignments
+
+def _run_remote(api: SwitchBotAPI, remote: Dict, steps: List[Dict], gap: float,
+                on_result=None) -> List[StepResult]:
+    """Run one remote's steps in order (one worker per remote)"""
+    results = []
+    device_id = remote.get("deviceId", "")
+    for step in steps:
+        if "wait" in step:
+            time.sleep(float(step["wait"]))
+            continue
+        command, parameter = step["command"], str(step.get("parameter", "default"))
+        started_at = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            # 同じ状態でもテストでは必ず送信する
+            api.send_infrared_command(device_id, command, parameter, force=True)
+        except Exception as e:
+            error = str(e)
+        result = StepResult(device_id, remote.get("deviceName", "Unknown"), remote.get("remoteType", ""),
+                            command, parameter, error is None, time.perf_counter() - started, started_at, error)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+        time.sleep(float(step.get("gap", gap)))
+    return results
+
+def run_plan(api: SwitchBotAPI, assignments: List[Tuple[Dict, List[Dict]]], concurrency: int = 10,
+             gap: float = 1.0, on_result=None) -> List[StepResult]:
+    """
+    Run every remote's steps, remotes in parallel
+    
+    Args:
+        api: Client whose scheduler allows at least `concurrency` requests in flight
+        assignments: Output of assign_steps
+        concurrency: Remotes tested at the same time
+        gap: Default pause after each command of a remote
+        on_result: Called with each StepResult as soon as it is known
+    
+    Returns:
+        All results, in completion order per remote
+    """
+    results: List[StepResult] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ir-plan") as executor:
+        futures = [executor.submit(_run_remote, api, remote, steps, gap, on_result) for remote, steps in assignments]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    return results
+
+def _latency_stats(latencies: List[float]) -> Dict:
+    values = np.array(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+
+def summarize(results: List[StepResult]) -> Dict:
+    """
+    Success rate and latency overall and per command
+    
+    Args:
+        results: Output of run_plan
+    
+    Returns:
+        {"total", "ok", "success_rate", latency stats, "commands": {...}, "failed_devices": [...]}
+    """
+    if not results:
+        return {"total": 0, "ok": 0, "success_rate": None, "commands": {}, "failed_devices": []}
+    by_command: Dict[str, List[StepResult]] = {}
+    for result in results:
+        by_command.setdefault(result.command, []).append(result)
+    ok = sum(r.ok for r in results)
+    return {
+        "total": len(results),
+        "ok": ok,
+        "success_rate": round(ok / len(results), 4),
+        **_latency_stats([r.latency for r in results]),
+        "commands": {
+            command: {
+                "total": len(items),
+                "ok": sum(r.ok for r in items),
+                "success_rate": round(sum(r.ok for r in items) / len(items), 4),
+                **_latency_stats([r.latency for r in items]),
+            }
+            for command, items in sorted(by_command.items())
+        },
+        "failed_devices": sorted({r.device_id for r in results if not r.ok}),
+    }
+
+class FakeTransport:
+    """
+    Local stand-in for the SwitchBot cloud with a fleet of fake IR remotes
+    
+    Commands succeed after a random latency, with an optional failure rate,
+    so plans can be checked and timed without touching real devices.
+    """
+    
+    def __init__(self, remotes: int = 50, latency: float = 0.3, failure_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            remotes: Number of fake remotes (types cycle through TV / AC / Light / Fan)
+            latency: Mean command latency in seconds
+            failure_rate: Fraction of commands answered with an error
+            seed: Random seed for reproducible runs
+        """
+        types = ["TV", "Air Conditioner", "Light", "Fan"]
+        self.remotes = [
+            {"deviceId": f"FAKE-{i:03d}", "deviceName": f"Fake {types[i % len(types)]} {i}",
+             "remoteType": types[i % len(types)], "hubDeviceId": "FAKE-HUB"}
+            for i in range(remotes)
+        ]
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _reply(self, url: str, status_code: int, body: Dict, message: str = "success"):
+        payload = {"statusCode": status_code, "message": message, "body": body}
+        return ReplayResponse(200, json.dumps(payload).encode("utf-8"), url)
+    
+    def get(self, url: str, **kwargs):
+        if url.endswith("/devices"):
+            return self._reply(url, 100, {"deviceList": [], "infraredRemoteList": self.remotes})
+        return self._reply(url, 100, {})
+    
+    def post(self, url: str, json: Optional[Dict] = None, **kwargs):
+        with self._lock:
+            delay = self._random.expovariate(1 / self.latency) if self.latency > 0 else 0
+            failed = self._random.random() < self.failure_rate
+        time.sleep(delay)
+        if failed:
+            return self._reply(url, 161, {}, "device offline")
+        return self._reply(url, 100, {})
+
+def daily_limit_for(token: str) -> int:
+    """
+    Daily quota of the account a token belongs to
+    
+    Args:
+        token: SwitchBot API token
+    
+    Returns:
+        [budget.sites] / [budget] daily_limit from settings.toml, else the
+        account's daily_quota in SWITCHBOT_ACCOUNTS, else the API default
+    """
+    account = next((a for a in load_accounts() if a.token == token), None)
+    site = account.name if account is not None else DEFAULT_SITE
+    budget = load_settings().budget
+    quota = budget.sites.get(site, budget.daily_limit)
+    if quota is not None:
+        return quota
+    return account.daily_quota if account is not None else DEFAULT_DAILY_LIMIT
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="IRリモコンのテストプランを並列実行")
+    parser.add_argument("--plan", help="テストプラン（JSON、省略時は標準プラン）")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時にテストするリモコン数")
+    parser.add_argument("--gap", type=float, help="同じリモコンへのコマンド間隔（秒、プランの値を上書き）")
+    parser.add_argument("--budget", type=int, metavar="N",
+                        help="今日まだ使えるAPI呼び出し数（省略時はアカウントの1日上限）")
+    parser.add_argument("--report", help="結果をJSONで保存するパス")
+    parser.add_argument("--fake", type=int, metavar="N", help="API の代わりに N 台の擬似リモコンで実行")
+    parser.add_argument("--fake-latency", type=float, default=0.3, help="擬似APIの平均応答時間（秒）")
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0, help="擬似APIの失敗率（0〜1）")
+    parser.add_argument("--quiet", action="store_true", help="コマンドごとの結果を表示しない")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    plan = load_plan(args.plan)
+    gap = args.gap if args.gap is not None else float(plan.get("gap", 1.0))
+    
+    # 並列数だけ同時に送信できる専用クライアント（ダッシュボードの送信枠は使わない）
+    if args.fake:
+        budget = RateBudget(args.budget or DEFAULT_DAILY_LIMIT)
+        scheduler = RequestScheduler(max_in_flight=max(1, args.concurrency), budget=budget)
+        transport = FakeTransport(args.fake, args.fake_latency, args.fake_failure_rate)
+        api = SwitchBotAPI("fake", "fake", budget=budget, transport=transport, scheduler=scheduler)
+    else:
+        token, secret = load_credentials()
+        if not token or not secret:
+            print("❌ SwitchBot API認証情報が見つかりません")
+            return 2
+        try:
+            # 他のプロセスが今日使った分は見えないので、残り回数は --budget で指定する
+            budget = RateBudget(args.budget or daily_limit_for(token))
+        except ValueError as e:
+            print(f"❌ 設定ファイルが不正です: {str(e)}")
+            return 2
+        scheduler = RequestScheduler(max_in_flight=max(1, args.concurrency), budget=budget)
+        from ir_state import get_state_store
+        from runtime_ledger import get_command_log
+        api = SwitchBotAPI(token, secret, budget=budget, transport=transport_from_env(token, secret),
+                           remote_state=get_state_store(), scheduler=scheduler, command_log=get_command_log())
+    
+    try:
+        remotes = api.get_infrared_remotes()
+    except Exception as e:
+        print(f"❌ IRリモコン一覧の取得に失敗しました: {str(e)}")
+        return 1
+    assignments = assign_steps(plan, remotes)
+    commands = sum(1 for _, steps in assignments for step in steps if "command" in step)
+    if not assignments:
+        print("❌ テスト対象のリモコンがありません")
+        return 1
+    if commands > budget.remaining:
+        print(f"❌ API予算が足りません（必要 {commands} / 残り {budget.remaining}）")
+        return 1
+    print(f"🎮 {len(assignments)}台のリモコンで {commands} コマンドを実行します（同時 {args.concurrency}台）")
+    
+    def report_step(result: StepResult):
+        if not args.quiet:
+            mark = "✅" if result.ok else "❌"
+            print(f"{mark} {result.device_name}: {result.command} {result.parameter} "
+                  f"{result.latency * 1000:.0f}ms{'' if result.ok else ' ' + str(result.error)}")
+    
+    started = time.perf_counter()
+    results = run_plan(api, assignments, args.concurrency, gap, on_result=report_step)
+    elapsed = time.perf_counter() - started
+    summary = summarize(results)
+    
+    print("=" * 60)
+    print(f"⏱️ {elapsed:.1f}秒 | 成功 {summary['ok']}/{summary['total']} ({summary['success_rate'] * 100:.1f}%) | "
+          f"p50 {summary['p50_ms']}ms | p95 {summary['p95_ms']}ms")
+    for command, stats in summary["commands"].items():
+        print(f"   {command:<12} {stats['ok']:>4}/{stats['total']:<4} p50 {stats['p50_ms']:>7}ms  "
+              f"p95 {stats['p95_ms']:>7}ms  max {stats['max_ms']:>7}ms")
+    if summary["failed_devices"]:
+        print(f"❌ 失敗したリモコン: {', '.join(summary['failed_devices'])}")
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": elapsed, "concurrency": args.concurrency, "summary": summary,
+                       "results": [asdict(r) for r in results]}, f, ensure_ascii=False, indent=2)
+        print(f"📄 レポート: {args.report}")
+    return 0 if summary["ok"] == summary["total"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
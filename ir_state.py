@@ -0,0 +1,180 @@
+"""
+Last-known state of infrared remotes
+
+IR commands are fire-and-forget, so the cloud cannot tell us what an IR
+air conditioner or TV is doing. RemoteStateStore keeps the state implied
+by every successful command (temperature, mode, fan, power, volume,
+channel) in a small JSON file shared by the dashboard and the poller.
+The client consults it to skip commands that would not change anything,
+and the dashboard initializes its widgets from it instead of defaults.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from switchbot_api import AC_FAN_VALUES, AC_MODE_VALUES, data_path
+
+# setAll の数値からモード名・風量名に戻すための逆引き
+_MODE_NAMES = {str(v): k for k, v in AC_MODE_VALUES.items()}
+_FAN_NAMES = {str(v): k for k, v in AC_FAN_VALUES.items()}
+
+def state_after(state: Dict, command: str, parameter: str = "default") -> Dict:
+    """
+    State of a remote after a command
+    
+    Args:
+        state: Current known state (may be empty)
+        command: Infrared command
+        parameter: Command parameter
+    
+    Returns:
+        New state dict (the input is not modified)
+    """
+    new = dict(state)
+    if command == "setAll":
+        parts = str(parameter).split(",")
+        if len(parts) == 4:
+            try:
+                new["temperature"] = int(parts[0])
+            except ValueError:
+                pass
+            new["mode"] = _MODE_NAMES.get(parts[1], parts[1])
+            new["fan"] = _FAN_NAMES.get(parts[2], parts[2])
+            new["power"] = parts[3]
+    elif command == "turnOn":
+        new["power"] = "on"
+    elif command == "turnOff":
+        new["power"] = "off"
+    elif command in ("volumeAdd", "volumeSub"):
+        if new.get("volume") is not None:
+            new["volume"] = max(0, new["volume"] + (1 if command == "volumeAdd" else -1))
+    elif command in ("channelAdd", "channelSub"):
+        if new.get("channel") is not None:
+            new["channel"] = max(1, new["channel"] + (1 if command == "channelAdd" else -1))
+    elif command == "SetChannel":
+        try:
+            new["channel"] = int(parameter)
+        except ValueError:
+            pass
+    elif command == "setVolume":
+        try:
+            new["volume"] = int(parameter)
+        except ValueError:
+            pass
+    return new
+
+class RemoteStateStore:
+    """Persisted desired state per infrared remote"""
+    
+    # 送っても状態が変わらなければ省略できるコマンド（音量・チャンネルの増減は常に送る）
+    IDEMPOTENT_COMMANDS = ("setAll", "turnOn", "turnOff", "SetChannel", "setVolume")
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: State file (default: DATA_DIR/ir_state.json)
+        """
+        self.path = path or data_path("ir_state.json")
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+        self._mtime = None
+    
+    def _reload(self):
+        """Re-read the file when another process has written it (caller holds the lock)"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._states = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self._mtime = mtime
+    
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._states, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+    
+    def get(self, remote_id: str) -> Dict:
+        """
+        Last known state of a remote
+        
+        Args:
+            remote_id: Infrared remote ID
+        
+        Returns:
+            State dict (empty when nothing was sent yet)
+        """
+        with self._lock:
+            self._reload()
+            return dict(self._states.get(remote_id, {}))
+    
+    def is_redundant(self, remote_id: str, command: str, parameter: str = "default") -> bool:
+        """
+        Whether a command would leave the known state unchanged
+        
+        Args:
+            remote_id: Infrared remote ID
+            command: Infrared command
+            parameter: Command parameter
+        
+        Returns:
+            True if the command can be skipped
+        """
+        if command not in self.IDEMPOTENT_COMMANDS:
+            return False
+        state = self.get(remote_id)
+        if not state:
+            return False
+        new = state_after(state, command, parameter)
+        new.pop("updated_at", None)
+        return all(state.get(k) == v for k, v in new.items())
+    
+    def record(self, remote_id: str, command: str, parameter: str = "default") -> Dict:
+        """
+        Apply a successfully sent command to the stored state
+        
+        Args:
+            remote_id: Infrared remote ID
+            command: Infrared command
+            parameter: Command parameter
+        
+        Returns:
+            New state of the remote
+        """
+        with self._lock:
+            self._reload()
+            state = state_after(self._states.get(remote_id, {}), command, parameter)
+            state["updated_at"] = time.time()
+            self._states[remote_id] = state
+            self._save()
+            return dict(state)
+
+_stores: Dict[str, RemoteStateStore] = {}
+_stores_lock = threading.Lock()
+
+def get_state_store(path: Optional[str] = None) -> RemoteStateStore:
+    """
+    Shared store for a state file
+    
+    Args:
+        path: State file (default: DATA_DIR/ir_state.json)
+    
+    Returns:
+        RemoteStateStore shared by every caller in the process
+    """
+    path = path or data_path("ir_state.json")
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = RemoteStateStore(path)
+        return store
@@ -0,0 +1,215 @@
+"""
+Persisted meter history
+
+The poller appends every tick to a SQLite database (WAL mode, one row per
+device and timestamp) so readings survive restarts and other processes
+(the dashboard, forecasting, exports) can read them while polling goes on.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from models import MeterStatus
+from switchbot_api import data_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    device_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    temperature REAL,
+    humidity REAL,
+    battery INTEGER,
+    PRIMARY KEY (device_id, ts)
+) WITHOUT ROWID;
+-- 時刻順の読み出し（iter_since / 予測の warm_start）用
+CREATE INDEX IF NOT EXISTS readings_ts ON readings(ts);
+"""
+
+class MeterHistory:
+    """SQLite-backed store of meter readings"""
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Database file (default: DATA_DIR/meter_history.sqlite3)
+        """
+        self.path = path or data_path("meter_history.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._pruned_at = 0.0
+    
+    def append(self, samples: List[MeterStatus]):
+        """
+        Store readings (poller subscriber; duplicates are ignored)
+        
+        Args:
+            samples: Readings of one tick
+        """
+        rows = [(s.device_id, s.timestamp, s.temperature, s.humidity, s.battery) for s in samples]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO readings VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+    
+    def device_ids(self) -> List[str]:
+        """Devices with at least one reading"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT device_id FROM readings")]
+    
+    def readings(self, device_id: str, since: float = 0.0, until: Optional[float] = None) -> List[MeterStatus]:
+        """
+        Readings of one device in time order
+        
+        Args:
+            device_id: Meter device ID
+            since: Oldest timestamp (inclusive)
+            until: Newest timestamp (exclusive, default: no limit)
+        
+        Returns:
+            List of MeterStatus
+        """
+        return [
+            MeterStatus(device_id, ts, temperature, humidity, battery)
+            for ts, temperature, humidity, battery in self._select(device_id, since, until)
+        ]
+    
+    def arrays(self, device_id: str, since: float = 0.0, until: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Timestamps and temperatures of one device as arrays (missing temperatures are NaN)
+        
+        Args:
+            device_id: Meter device ID
+            since: Oldest timestamp (inclusive)
+            until: Newest timestamp (exclusive, default: no limit)
+        
+        Returns:
+            (timestamps, temperatures)
+        """
+        rows = self._select(device_id, since, until)
+        data = np.array([(r[0], np.nan if r[1] is None else r[1]) for r in rows], dtype=float).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+    
+    def iter_since(self, since: float = 0.0, batch_size: int = 5000) -> Iterator[List[MeterStatus]]:
+        """
+        All readings newer than a timestamp, in time order and in batches
+        
+        Args:
+            since: Oldest timestamp (exclusive)
+            batch_size: Readings per batch
+        
+        Yields:
+            Lists of MeterStatus
+        """
+        query = "SELECT device_id, ts, temperature, humidity, battery FROM readings WHERE ts > ? ORDER BY ts"
+        for rows in self._stream(query, (since,), batch_size):
+            yield [MeterStatus(*row) for row in rows]
+    
+    def stream(self, device_ids: Optional[List[str]] = None, since: float = 0.0, until: Optional[float] = None,
+               batch_size: int = 50000) -> Iterator[List[Tuple]]:
+        """
+        Raw rows for a device set and time range, in (device, time) order and in batches
+        
+        Rows are read on a separate read-only connection with fetchmany, so
+        memory stays constant however much history is selected.
+        
+        Args:
+            device_ids: Devices to include (default: all)
+            since: Oldest timestamp (inclusive)
+            until: Newest timestamp (exclusive, default: no limit)
+            batch_size: Rows per batch
+        
+        Yields:
+            Lists of (device_id, ts, temperature, humidity, battery)
+        """
+        query = "SELECT device_id, ts, temperature, humidity, battery FROM readings WHERE ts >= ?"
+        params: list = [since]
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        if device_ids:
+            query += f" AND device_id IN ({', '.join('?' * len(device_ids))})"
+            params.extend(device_ids)
+        yield from self._stream(query + " ORDER BY device_id, ts", params, batch_size)
+    
+    def _stream(self, query: str, params, batch_size: int) -> Iterator[List[Tuple]]:
+        conn = sqlite3.connect(Path(self.path).resolve().as_uri() + "?mode=ro", uri=True, timeout=10)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
+    def prune(self, keep_days: float = 90) -> int:
+        """
+        Delete readings older than keep_days
+        
+        Returns:
+            Number of deleted rows
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM readings WHERE ts < ?", (time.time() - keep_days * 86400,))
+            self._conn.commit()
+            self._pruned_at = time.time()
+            return cursor.rowcount
+    
+    def prune_if_due(self, keep_days: float = 90, every: float = 86400) -> int:
+        """
+        prune() at most once per `every` seconds (called from the poller on every tick)
+        
+        Args:
+            keep_days: Days of readings to keep
+            every: Seconds between prunes
+        
+        Returns:
+            Number of deleted rows (0 when not due)
+        """
+        if time.time() - self._pruned_at < every:
+            return 0
+        return self.prune(keep_days)
+    
+    def _select(self, device_id: str, since: float, until: Optional[float]) -> List[Tuple]:
+        query = "SELECT ts, temperature, humidity, battery FROM readings WHERE device_id = ? AND ts >= ?"
+        params: list = [device_id, since]
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY ts", params).fetchall()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_histories: Dict[str, MeterHistory] = {}
+_histories_lock = threading.Lock()
+
+def get_history(path: Optional[str] = None) -> MeterHistory:
+    """
+    Shared history for a database file
+    
+    Args:
+        path: Database file (default: DATA_DIR/meter_history.sqlite3)
+    
+    Returns:
+        MeterHistory shared by every caller in the process
+    """
+    path = path or data_path("meter_history.sqlite3")
+    with _histories_lock:
+        history = _histories.get(path)
+        if history is None:
+            history = _histories[path] = MeterHistory(path)
+        return history
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Meter poller service
+
+Polls every meter of every configured account at a fixed interval and
+hands each tick's readings to subscribers (alert engine, automations,
+history, ...). Run it next to the dashboard:
+
+    python meter_poller.py --interval 60
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+from account_pool import AccountPool, AccountRouter, load_accounts
+from models import MeterStatus
+from status_sources import StatusSource, newest_reading
+
+class MeterPoller:
+    """Periodic meter polling with per-tick fan-out to subscribers"""
+    
+    def __init__(self, pool: AccountPool, interval: float = 60, use_processes: bool = True,
+                 local_sources: Optional[List[StatusSource]] = None):
+        """
+        Args:
+            pool: Account pool providing clients, budgets and catalogs
+            interval: Seconds between ticks
+            use_processes: Shard polling across worker processes
+            local_sources: Quota-free sources (e.g. BLE); meters they heard
+                within the last interval are not requested from the cloud
+        """
+        self.pool = pool
+        self.interval = interval
+        self.use_processes = use_processes
+        self.local_sources = local_sources or []
+        self.last_tick = 0.0
+        self.last_errors = {}
+        self._subscribers: List[Callable[[List[MeterStatus]], None]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def subscribe(self, callback: Callable[[List[MeterStatus]], None]):
+        """
+        Register a callback receiving every tick's readings
+        
+        Args:
+            callback: Function receiving a list of MeterStatus
+        """
+        self._subscribers.append(callback)
+    
+    def poll_once(self) -> List[MeterStatus]:
+        """
+        Poll all meters once and notify subscribers
+        
+        Site catalogs older than their refresh_interval are refreshed
+        first, so meters added or removed after startup are picked up.
+        
+        Returns:
+            Readings of this tick
+        """
+        now = time.time()
+        # 温度計の追加・削除を拾うため、refresh_interval（poll.catalog）ごとにカタログを更新
+        for catalog in self.pool.catalogs.values():
+            if not catalog.is_loaded or now - catalog.updated_at >= catalog.refresh_interval:
+                catalog.refresh()
+        
+        samples = []
+        errors = {}
+        device_ids_by_site = self.pool.meter_ids()
+        # ローカルで新しい値を受信できている温度計はAPIで取得しない
+        if self.local_sources:
+            for site, device_ids in device_ids_by_site.items():
+                remaining = []
+                for device_id in device_ids:
+                    reading = newest_reading(self.local_sources, device_id)
+                    if reading is not None and now - reading.timestamp <= self.interval:
+                        samples.append(reading)
+                    else:
+                        remaining.append(device_id)
+                device_ids_by_site[site] = remaining
+        for site, results in self.pool.poll_statuses(device_ids_by_site, use_processes=self.use_processes).items():
+            for device_id, result in results.items():
+                if "status" in result and result["status"] is not None:
+                    samples.append(MeterStatus.from_dict(device_id, result["status"], now))
+                else:
+                    errors[device_id] = result.get("error", "no status")
+        self.last_tick = now
+        self.last_errors = errors
+        
+        for callback in list(self._subscribers):
+            try:
+                callback(samples)
+            except Exception as e:
+                print(f"[poller] subscriber failed: {str(e)}")
+        return samples
+    
+    def run(self):
+        """Poll until stop() is called, keeping a fixed cadence"""
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[poller] tick failed: {str(e)}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+    
+    def start(self):
+        """Run the poller in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="meter-poller", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+
+def build_parser():
+    """引数パーサーを構築"""
+    parser = argparse.ArgumentParser(prog="meter_poller", description="Poll SwitchBot meters and feed subscribers")
+    parser.add_argument("--interval", type=float, default=None, help="seconds between ticks (default: poll.meters setting)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (1 = inline, default: concurrency.poll_workers)")
+    parser.add_argument("--once", action="store_true", help="poll a single tick and exit")
+    parser.add_argument("--rules", default=None, help="alert rule file (default: DATA_DIR/alert_rules.json)")
+    parser.add_argument("--webhook", default=None, help="local webhook URL receiving alerts")
+    parser.add_argument("--rooms", default=None, help="thermostat room file (default: DATA_DIR/thermostat.json)")
+    parser.add_argument("--push-port", type=int, default=None, help="serve live deltas over SSE on this port")
+    parser.add_argument("--push-host", default="127.0.0.1", help="bind address of the SSE server")
+    parser.add_argument("--ble", action="store_true", help="read nearby meters from BLE advertisements (needs bleak)")
+    parser.add_argument("--dry-run", action="store_true", help="log thermostat decisions without sending commands")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    accounts = load_accounts()
+    if not accounts:
+        print("❌ SwitchBot API認証情報が見つかりません")
+        return 2
+    
+    # 設定ファイル（不正なら起動しない。起動後の変更は再起動なしで反映）
+    from settings import SettingsStore, apply_to_pool
+    try:
+        settings = SettingsStore()
+    except ValueError as e:
+        print(f"❌ 設定ファイルが不正です: {str(e)}")
+        return 2
+    workers = args.workers or settings.settings.concurrency.poll_workers
+    
+    pool = AccountPool(accounts, max_workers=workers)
+    settings.subscribe(lambda s: apply_to_pool(pool, s))
+    
+    # BLEアドバタイズの受信（近くの温度計はAPIを使わずに読む）
+    local_sources = []
+    if args.ble:
+        from status_sources import BleAdvertisementSource
+        ble = BleAdvertisementSource()
+        ble.start()
+        local_sources.append(ble)
+        print("[poller] listening for BLE meter advertisements")
+    
+    poller = MeterPoller(pool, interval=args.interval or settings.settings.poll.meters, use_processes=workers != 1,
+                         local_sources=local_sources)
+    if args.interval is None:
+        settings.subscribe(lambda s: setattr(poller, "interval", s.poll.meters))
+    settings.start_watching()
+    poller.subscribe(lambda samples: print(f"[poller] {len(samples)} readings, {len(poller.last_errors)} errors"))
+    
+    # ダッシュボードへの差分プッシュ（SSE）
+    if args.push_port:
+        from push_server import PushHub, serve
+        from switchbot_api import data_path
+        hub = PushHub()
+        poller.subscribe(hub.publish_meters)
+        hub.watch_remote_state(data_path("ir_state.json"))
+        serve(hub, args.push_host, args.push_port)
+        print(f"[poller] pushing deltas on http://{args.push_host}:{args.push_port}/events")
+    
+    # 履歴の保存と温度予測
+    from forecast import ForecastBank
+    from meter_history import get_history
+    history = get_history()
+    poller.subscribe(history.append)
+    # 保存期間（history.keep_days）より古い行を1日1回削除
+    poller.subscribe(lambda samples: history.prune_if_due(settings.settings.history.keep_days))
+    from ring_buffer import RingBufferWriter
+    poller.subscribe(RingBufferWriter().append)
+    forecaster = ForecastBank()
+    forecaster.warm_start(history)
+    poller.subscribe(forecaster.update)
+    
+    # アラートエンジン
+    from alert_engine import AlertEngine, FileSink, WebhookSink, load_rules
+    sinks = [FileSink()]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+    alert_engine = AlertEngine(load_rules(args.rules), sinks)
+    poller.subscribe(alert_engine.process)
+    
+    # センサー異常の検知（アラートと同じ通知先へ）
+    from anomaly import AnomalyDetector
+    poller.subscribe(AnomalyDetector(sinks=sinks).process)
+    
+    # サーモスタット（部屋の設定があるときだけ）
+    from thermostat import ThermostatController, load_rooms
+    rooms = load_rooms(args.rooms)
+    if rooms:
+        thermostat = ThermostatController(AccountRouter(pool), rooms, dry_run=args.dry_run, forecaster=forecaster)
+        poller.subscribe(thermostat.process)
+    try:
+        if args.once:
+            poller.poll_once()
+        else:
+            poller.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Compact device and status models
+
+`__slots__` classes replace the raw JSON dicts for devices, infrared
+remotes and meter readings.
+"""
+
+import json
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+class Device:
+    """Physical SwitchBot device"""
+    __slots__ = ("device_id", "name", "device_type", "hub_device_id", "cloud_service_enabled")
+    
+    def __init__(self, device_id: str, name: str, device_type: str,
+                 hub_device_id: str = "", cloud_service_enabled: bool = False):
+        self.device_id = device_id
+        self.name = name
+        self.device_type = device_type
+        self.hub_device_id = hub_device_id
+        self.cloud_service_enabled = cloud_service_enabled
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Device":
+        return cls(
+            data.get("deviceId", "N/A"),
+            data.get("deviceName", "Unknown"),
+            data.get("deviceType", "Unknown"),
+            data.get("hubDeviceId", ""),
+            bool(data.get("enableCloudService", False)),
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "deviceId": self.device_id,
+            "deviceName": self.name,
+            "deviceType": self.device_type,
+            "hubDeviceId": self.hub_device_id,
+            "enableCloudService": self.cloud_service_enabled,
+        }
+    
+    def __repr__(self) -> str:
+        return f"Device({self.device_id!r}, {self.name!r}, {self.device_type!r})"
+
+class InfraredRemote:
+    """Virtual infrared remote registered on a hub"""
+    __slots__ = ("device_id", "name", "remote_type", "hub_device_id")
+    
+    def __init__(self, device_id: str, name: str, remote_type: str, hub_device_id: str = ""):
+        self.device_id = device_id
+        self.name = name
+        self.remote_type = remote_type
+        self.hub_device_id = hub_device_id
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "InfraredRemote":
+        return cls(
+            data.get("deviceId", "N/A"),
+            data.get("deviceName", "Unknown"),
+            data.get("remoteType", "Unknown"),
+            data.get("hubDeviceId", ""),
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "deviceId": self.device_id,
+            "deviceName": self.name,
+            "remoteType": self.remote_type,
+            "hubDeviceId": self.hub_device_id,
+        }
+    
+    def __repr__(self) -> str:
+        return f"InfraredRemote({self.device_id!r}, {self.name!r}, {self.remote_type!r})"
+
+class MeterStatus:
+    """Single meter reading (fields are None when the device does not report them)"""
+    __slots__ = ("device_id", "timestamp", "temperature", "humidity", "battery")
+    
+    def __init__(self, device_id: str, timestamp: float, temperature: Optional[float] = None,
+                 humidity: Optional[float] = None, battery: Optional[int] = None):
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.humidity = humidity
+        self.battery = battery
+    
+    @classmethod
+    def from_dict(cls, device_id: str, data: Dict, timestamp: Optional[float] = None) -> "MeterStatus":
+        temperature = data.get("temperature")
+        humidity = data.get("humidity")
+        battery = data.get("battery")
+        return cls(
+            data.get("deviceId", device_id),
+            time.time() if timestamp is None else timestamp,
+            None if temperature is None else float(temperature),
+            None if humidity is None else float(humidity),
+            None if battery is None else int(battery),
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "deviceId": self.device_id,
+            "timestamp": self.timestamp,
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "battery": self.battery,
+        }
+    
+    def __repr__(self) -> str:
+        return f"MeterStatus({self.device_id!r}, t={self.temperature}, h={self.humidity}, b={self.battery})"
+
+def _body(raw: Union[bytes, Dict]) -> Dict:
+    """Accept raw response bytes, a full response dict or an already unwrapped body"""
+    data = json_loads(raw) if isinstance(raw, (bytes, bytearray, memoryview, str)) else raw
+    if "statusCode" in data and "body" in data:
+        return data["body"] or {}
+    return data
+
+def parse_device_list(raw: Union[bytes, Dict]) -> Tuple[List[Device], List[InfraredRemote]]:
+    """
+    Parse a /devices response into models
+    
+    Args:
+        raw: Response bytes or decoded body
+    
+    Returns:
+        (devices, infrared remotes) tuple
+    """
+    body = _body(raw)
+    devices = [Device.from_dict(d) for d in body.get("deviceList", [])]
+    remotes = [InfraredRemote.from_dict(r) for r in body.get("infraredRemoteList", [])]
+    return devices, remotes
+
+def parse_meter_status(device_id: str, raw: Union[bytes, Dict], timestamp: Optional[float] = None) -> MeterStatus:
+    """
+    Parse a /devices/{id}/status response into a MeterStatus
+    
+    Args:
+        device_id: Device ID the status was requested for
+        raw: Response bytes or decoded body
+        timestamp: Sample time (default: now)
+    
+    Returns:
+        MeterStatus
+    """
+    return MeterStatus.from_dict(device_id, _body(raw), timestamp)
@@ -0,0 +1,259 @@
+"""
+Server-sent events push channel
+
+PushHub keeps the last published state of every device and turns each
+update into a delta (only the fields that changed). Connected clients
+receive the deltas over SSE as soon as the poller produces them, so wall
+displays update instantly and idle tabs cost no polling. The hub is fed
+by the meter poller and by changes to the shared IR remote state file.
+
+Endpoints:
+    GET /events    text/event-stream; a "snapshot" event, then "delta" events
+    GET /snapshot  current state of every device as JSON
+
+Run inside the poller:
+    python meter_poller.py --push-port 8765
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from models import MeterStatus
+
+# SSEの接続維持用コメントを送る間隔（秒）
+KEEPALIVE_INTERVAL = 15
+# 1クライアントあたりの未送信イベント上限（超えたら遅いクライアントとして切断）
+CLIENT_QUEUE_SIZE = 1000
+
+class _Client:
+    """Pending events of one SSE connection"""
+    
+    def __init__(self):
+        self.events: "queue.Queue[str]" = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.dropped = False
+
+class PushHub:
+    """Latest device state and per-client delta queues"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state: Dict[str, Dict] = {}
+        self._clients: List[_Client] = []
+        self.sequence = 0
+    
+    def publish(self, device_id: str, fields: Dict) -> Optional[Dict]:
+        """
+        Merge new fields into a device's state and push what changed
+        
+        Args:
+            device_id: Device or remote ID
+            fields: New values (e.g. {"temperature": 24.5})
+        
+        Returns:
+            The delta that was pushed, or None when nothing changed
+        """
+        with self._lock:
+            current = self.state.setdefault(device_id, {})
+            delta = {k: v for k, v in fields.items() if current.get(k) != v}
+            if not delta:
+                return None
+            current.update(delta)
+            self.sequence += 1
+            event = _format_event("delta", {"seq": self.sequence, "deviceId": device_id, **delta})
+            for client in list(self._clients):
+                try:
+                    client.events.put_nowait(event)
+                except queue.Full:
+                    client.dropped = True
+                    self._clients.remove(client)
+        return delta
+    
+    def publish_meters(self, samples: List[MeterStatus]):
+        """Poller subscriber: push meter readings that changed"""
+        for sample in samples:
+            self.publish(sample.device_id, {
+                "temperature": sample.temperature,
+                "humidity": sample.humidity,
+                "battery": sample.battery,
+            })
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"seq": self.sequence, "devices": {k: dict(v) for k, v in self.state.items()}}
+    
+    def connect(self) -> _Client:
+        """Register a client; its queue starts with a full snapshot"""
+        client = _Client()
+        with self._lock:
+            client.events.put_nowait(_format_event("snapshot", {
+                "seq": self.sequence, "devices": {k: dict(v) for k, v in self.state.items()},
+            }))
+            self._clients.append(client)
+        return client
+    
+    def disconnect(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+    
+    def watch_remote_state(self, path: str, interval: float = 1.0):
+        """
+        Push IR remote state changes written by other processes (runs in a daemon thread)
+        
+        Args:
+            path: ir_state.json
+            interval: Seconds between mtime checks
+        """
+        def run():
+            mtime = None
+            while True:
+                try:
+                    current = os.path.getmtime(path)
+                    if current != mtime:
+                        mtime = current
+                        with open(path, "r", encoding="utf-8") as f:
+                            states = json.load(f)
+                        for remote_id, state in states.items():
+                            self.publish(remote_id, {k: v for k, v in state.items() if k != "updated_at"})
+                except (OSError, json.JSONDecodeError):
+                    pass
+                time.sleep(interval)
+        
+        threading.Thread(target=run, name="push-remote-state", daemon=True).start()
+
+def _format_event(name: str, data: Dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+def _make_handler(hub: PushHub):
+    class PushHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def _headers(self, content_type: str):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Cache-Control", "no-cache")
+            # ダッシュボードの埋め込みコンポーネント（別オリジン）から接続するため
+            self.send_header("Access-Control-Allow-Origin", "*")
+        
+        def do_GET(self):
+            if self.path.startswith("/snapshot"):
+                body = json.dumps(hub.snapshot(), ensure_ascii=False).encode("utf-8")
+                self._headers("application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if not self.path.startswith("/events"):
+                self.send_error(404)
+                return
+            
+            self._headers("text/event-stream")
+            self.send_header("Connection", "keep-alive")
+            self.end_headers()
+            client = hub.connect()
+            try:
+                while not client.dropped:
+                    try:
+                        event = client.events.get(timeout=KEEPALIVE_INTERVAL)
+                    except queue.Empty:
+                        event = ": keepalive\n\n"
+                    self.wfile.write(event.encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                hub.disconnect(client)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return PushHandler
+
+def serve(hub: PushHub, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Start the SSE server in a daemon thread
+    
+    Args:
+        hub: Hub whose deltas are streamed
+        host: Bind address (local only by default)
+        port: TCP port
+    
+    Returns:
+        Running server (call shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(hub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="push-server", daemon=True).start()
+    return server
+
+# ===== ダッシュボード用コンポーネント =====
+
+_LIVE_TEMPLATE = """
+<style>
+  body { margin: 0; font-family: sans-serif; }
+  .grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(180px, 1fr)); gap: 8px; }
+  .card { border: 2px solid #e0e0e0; border-left: 4px solid #3498db; border-radius: 10px; padding: 8px 12px; }
+  .card h4 { margin: 0 0 4px 0; font-size: 0.95rem; }
+  .temp { font-size: 1.4rem; font-weight: bold; }
+  .flash { background: #eaf4fc; transition: background 1s; }
+  .status { font-size: 0.75rem; color: #888; margin-bottom: 4px; }
+</style>
+<div class="status" id="status">接続中...</div>
+<div class="grid" id="grid"></div>
+<script>
+const devices = __DEVICES__;
+const grid = document.getElementById("grid");
+const cards = {};
+for (const d of devices) {
+  const el = document.createElement("div");
+  el.className = "card";
+  el.innerHTML = `<h4></h4><div class="temp">--</div><small>💧 <span class="hum">--</span>% | 🔋 <span class="bat">--</span>%</small>`;
+  el.querySelector("h4").textContent = "🌡️ " + d.name;
+  grid.appendChild(el);
+  cards[d.id] = el;
+}
+function apply(id, fields) {
+  const el = cards[id];
+  if (!el) return;
+  if (fields.temperature != null) el.querySelector(".temp").textContent = fields.temperature.toFixed(1) + "°C";
+  if (fields.humidity != null) el.querySelector(".hum").textContent = fields.humidity;
+  if (fields.battery != null) el.querySelector(".bat").textContent = fields.battery;
+  el.classList.add("flash");
+  setTimeout(() => el.classList.remove("flash"), 1000);
+}
+const source = new EventSource("__URL__/events");
+const status = document.getElementById("status");
+source.addEventListener("snapshot", (e) => {
+  const data = JSON.parse(e.data);
+  for (const [id, fields] of Object.entries(data.devices)) apply(id, fields);
+  status.textContent = "📡 ライブ更新中";
+});
+source.addEventListener("delta", (e) => {
+  const data = JSON.parse(e.data);
+  apply(data.deviceId, data);
+});
+source.onerror = () => { status.textContent = "⚠️ プッシュサーバーに接続できません（再接続中）"; };
+</script>
+"""
+
+def render_live_meters(devices: List[Dict], url: str):
+    """
+    プッシュサーバーから差分を受け取って更新する温度計カードを表示
+    
+    Args:
+        devices: 表示する温度計（カタログのエントリ）
+        url: プッシュサーバーのURL（例: http://localhost:8765）
+    """
+    import streamlit.components.v1 as components
+    
+    payload = [{"id": d.get("deviceId"), "name": d.get("deviceName", "Unknown")} for d in devices]
+    # </script> を含む名前でスクリプトが閉じないようにエスケープ
+    html = _LIVE_TEMPLATE.replace("__DEVICES__", json.dumps(payload, ensure_ascii=False).replace("</", "<\\/"))
+    html = html.replace("__URL__", url.rstrip("/"))
+    rows = (len(devices) + 3) // 4
+    components.html(html, height=40 + rows * 110, scrolling=True)
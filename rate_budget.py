@@ -0,0 +1,88 @@
+"""
+Daily request budget for one SwitchBot account
+
+The Open API allows a fixed number of calls per account per day
+(10,000 at the time of writing). RateBudget counts calls against that
+limit so pollers can stop before the cloud starts rejecting requests.
+"""
+
+import threading
+import time
+
+# SwitchBot Open API の1日あたりのリクエスト上限
+DEFAULT_DAILY_LIMIT = 10000
+
+class RateBudget:
+    """Thread-safe per-day request counter"""
+    
+    def __init__(self, daily_limit: int = DEFAULT_DAILY_LIMIT, used: int = 0):
+        """
+        Args:
+            daily_limit: Requests allowed per day
+            used: Requests already spent today
+        """
+        self.daily_limit = daily_limit
+        self._used = used
+        self._day = self._today()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _today() -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime())
+    
+    def _roll_over(self):
+        """Reset the counter when the day changes (caller holds the lock)"""
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used = 0
+    
+    @property
+    def used(self) -> int:
+        with self._lock:
+            self._roll_over()
+            return self._used
+    
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            self._roll_over()
+            return max(0, self.daily_limit - self._used)
+    
+    def try_acquire(self, n: int = 1) -> bool:
+        """
+        Spend n requests if the budget allows it
+        
+        Args:
+            n: Number of requests
+        
+        Returns:
+            True if the requests were granted
+        """
+        with self._lock:
+            self._roll_over()
+            if self._used + n > self.daily_limit:
+                return False
+            self._used += n
+            return True
+    
+    def take_up_to(self, n: int) -> int:
+        """
+        Spend as many of n requests as the budget allows
+        
+        Args:
+            n: Requests wanted
+        
+        Returns:
+            Number of requests granted (0..n)
+        """
+        with self._lock:
+            self._roll_over()
+            granted = max(0, min(n, self.daily_limit - self._used))
+            self._used += granted
+            return granted
+    
+    def refund(self, n: int):
+        """Return requests that were granted but not used"""
+        with self._lock:
+            self._used = max(0, self._used - n)
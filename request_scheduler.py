@@ -0,0 +1,194 @@
+"""
+Prioritized admission of API requests
+
+Every SwitchBotAPI client sends its requests through a RequestScheduler
+that allows a few requests in flight at once. When all slots are busy,
+waiting requests are admitted by class:
+
+    INTERACTIVE  commands the user just triggered (buttons, sliders)
+    VISIBLE      statuses of cards currently on screen
+    BACKGROUND   catalog refreshes and bulk polls
+
+Classes share the slots by stride scheduling: each admission advances the
+class's virtual time by 1 / weight and the class with the lowest virtual
+time goes next (ties go to the more urgent class). A class that was idle
+rejoins at the current virtual time, so a button press waits at most for
+one in-flight request and background polling still makes progress while
+the user keeps clicking.
+
+The scheduler is also budget-aware: when the client's daily RateBudget
+runs low, background and then visible requests are refused so that the
+remaining calls stay available for commands.
+
+Callers mark their requests with the priority() context manager:
+
+    with priority(BACKGROUND):
+        catalog.refresh()
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+INTERACTIVE = 0
+VISIBLE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = ("interactive", "visible", "background")
+
+# 同時に送信中にできるリクエスト数
+DEFAULT_MAX_IN_FLIGHT = 4
+# 混雑時の取り分の比（interactive : visible : background）
+DEFAULT_WEIGHTS = (8, 3, 1)
+# 1日の上限のうち、この割合を下回ったら background / visible を断る
+DEFAULT_RESERVE = (0.0, 0.01, 0.05)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=None)
+
+@contextmanager
+def priority(level: int):
+    """
+    Run the enclosed requests at a priority class (in this thread / context)
+    
+    Args:
+        level: INTERACTIVE, VISIBLE or BACKGROUND
+    """
+    if level not in (INTERACTIVE, VISIBLE, BACKGROUND):
+        raise ValueError(f"Unknown request priority: {level}")
+    token = _current.set(level)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def current_priority(default: int = VISIBLE) -> int:
+    """Priority set by the innermost priority() block, or default"""
+    level = _current.get()
+    return default if level is None else level
+
+class RequestScheduler:
+    """Weighted, budget-aware gate in front of a client's HTTP calls"""
+    
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, budget=None,
+                 weights=DEFAULT_WEIGHTS, reserve=DEFAULT_RESERVE):
+        """
+        Args:
+            max_in_flight: Requests allowed in flight at once
+            budget: rate_budget.RateBudget whose remaining calls are protected
+            weights: Relative share of each class while slots are contended
+            reserve: Fraction of the daily limit below which each class is refused
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.budget = budget
+        self.weights = tuple(weights)
+        self.reserve = tuple(reserve)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting: List[List[object]] = [[] for _ in PRIORITY_NAMES]
+        self._pass = [0.0 for _ in PRIORITY_NAMES]
+        self._clock = 0.0
+        self._admitted = [0 for _ in PRIORITY_NAMES]
+        self._refused = [0 for _ in PRIORITY_NAMES]
+        self._max_wait = [0.0 for _ in PRIORITY_NAMES]
+    
+    def _check_budget(self, level: int):
+        if self.budget is None or self.reserve[level] <= 0:
+            return
+        if self.budget.remaining <= self.budget.daily_limit * self.reserve[level]:
+            with self._cond:
+                self._refused[level] += 1
+            raise Exception(f"Remaining API budget is reserved for interactive commands "
+                            f"({self.budget.remaining} left, {PRIORITY_NAMES[level]} request refused)")
+    
+    def _next_level(self) -> Optional[int]:
+        """Class to admit next (caller holds the lock)"""
+        waiting = [level for level, queue in enumerate(self._waiting) if queue]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda level: (self._pass[level], level))
+    
+    def acquire(self, level: int = VISIBLE, timeout: Optional[float] = None):
+        """
+        Wait for a request slot
+        
+        Args:
+            level: Priority class
+            timeout: Seconds to wait at most (default: no limit)
+        """
+        self._check_budget(level)
+        ticket = object()
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            if not self._waiting[level]:
+                # しばらく使われなかったクラスは現在の仮想時刻から再開（溜め込んだ優先度で独占しない）
+                self._pass[level] = max(self._pass[level], self._clock)
+            self._waiting[level].append(ticket)
+            try:
+                while not (self._in_flight < self.max_in_flight
+                           and self._next_level() == level and self._waiting[level][0] is ticket):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Exception(f"Timed out waiting for an API request slot ({PRIORITY_NAMES[level]})")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiting[level].remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._waiting[level].pop(0)
+            self._in_flight += 1
+            self._clock = self._pass[level]
+            self._pass[level] += 1.0 / self.weights[level]
+            self._admitted[level] += 1
+            self._max_wait[level] = max(self._max_wait[level], time.monotonic() - started)
+            # 同じクラスの次の待ちや空きスロットのために起こす
+            self._cond.notify_all()
+    
+    def release(self):
+        """Free a slot taken by acquire()"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+    
+    def configure(self, max_in_flight: Optional[int] = None, reserve=None):
+        """
+        Change limits while requests are in flight (e.g. on a settings reload)
+        
+        Args:
+            max_in_flight: New number of concurrent requests
+            reserve: New per-class budget reserve fractions
+        """
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        with self._cond:
+            if max_in_flight is not None:
+                self.max_in_flight = max_in_flight
+            if reserve is not None:
+                self.reserve = tuple(reserve)
+            # 上限が増えたときに待っているリクエストを起こす
+            self._cond.notify_all()
+    
+    @contextmanager
+    def slot(self, level: int = VISIBLE, timeout: Optional[float] = None):
+        """acquire() / release() around a block"""
+        self.acquire(level, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Admissions, refusals, current queue length and worst wait (ms) per class"""
+        with self._cond:
+            return {
+                name: {
+                    "admitted": self._admitted[level],
+                    "refused": self._refused[level],
+                    "waiting": len(self._waiting[level]),
+                    "max_wait_ms": round(self._max_wait[level] * 1000, 1),
+                }
+                for level, name in enumerate(PRIORITY_NAMES)
+            }
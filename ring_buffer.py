@@ -0,0 +1,242 @@
+"""
+Memory-mapped ring buffers of recent meter readings
+
+The poller keeps one fixed-size file per meter under DATA_DIR/ring/ with
+the last `capacity` readings (timestamp, temperature, humidity, battery)
+as a NumPy structured array. Dashboard processes map the same files
+read-only and get NumPy views straight onto the page cache, so any number
+of Streamlit sessions share recent data without queries or serialization.
+
+File layout: a 32-byte header of four int64 (magic, capacity, next write
+slot, write sequence) followed by `capacity` records. The writer makes
+the sequence odd while it updates a slot and even again afterwards;
+readers retry when the sequence changed underneath them.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import MeterStatus
+from switchbot_api import data_path
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("temperature", "<f4"),
+    ("humidity", "<f4"),
+    ("battery", "<i1"),
+], align=True)
+HEADER_DTYPE = np.dtype("<i8")
+HEADER_LEN = 4
+MAGIC = 0x53535242  # "SSRB"
+# 1分間隔で24時間分
+DEFAULT_CAPACITY = 1440
+
+def ring_dir() -> str:
+    """Directory holding the ring buffer files"""
+    path = data_path("ring")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _file_name(device_id: str) -> str:
+    return os.path.join(ring_dir(), re.sub(r"[^A-Za-z0-9_.-]", "_", device_id) + ".ring")
+
+class RingBuffer:
+    """One meter's ring buffer file"""
+    
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY, writable: bool = False):
+        """
+        Args:
+            path: Ring buffer file
+            capacity: Records kept (only used when a writer creates the file)
+            writable: Open for writing (creating the file if needed)
+        """
+        self.path = path
+        header_bytes = HEADER_LEN * HEADER_DTYPE.itemsize
+        if writable and not os.path.exists(path):
+            # 読み取り側が作成途中のファイルを開かないよう、別名で作ってから置き換える
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(np.array([MAGIC, capacity, 0, 0], dtype=HEADER_DTYPE).tobytes())
+                f.truncate(header_bytes + capacity * RECORD_DTYPE.itemsize)
+            os.replace(tmp_path, path)
+        mode = "r+" if writable else "r"
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(HEADER_LEN,))
+        if self.header[0] != MAGIC:
+            raise Exception(f"Not a ring buffer file: {path}")
+        self.capacity = int(self.header[1])
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode=mode, offset=header_bytes, shape=(self.capacity,))
+    
+    def append(self, sample: MeterStatus):
+        """Write one reading into the next slot (writer only)"""
+        slot = int(self.header[2])
+        seq = int(self.header[3])
+        self.header[3] = seq + 1
+        self.records[slot % self.capacity] = (
+            sample.timestamp,
+            np.nan if sample.temperature is None else sample.temperature,
+            np.nan if sample.humidity is None else sample.humidity,
+            -1 if sample.battery is None else sample.battery,
+        )
+        self.header[2] = slot + 1
+        self.header[3] = seq + 2
+    
+    def segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stored records as two zero-copy views, oldest first
+        
+        The views alias the shared file: copy them (or use snapshot()) if a
+        consistent picture is needed while the poller keeps writing.
+        
+        Returns:
+            (older part, newer part); concatenated they are in time order
+        """
+        written = int(self.header[2])
+        if written <= self.capacity:
+            return self.records[:0], self.records[:written]
+        split = written % self.capacity
+        return self.records[split:], self.records[:split]
+    
+    def snapshot(self, since: float = 0.0, retries: int = 5) -> np.ndarray:
+        """
+        Consistent copy of the records newer than a timestamp
+        
+        Args:
+            since: Oldest timestamp (inclusive)
+            retries: Attempts when the writer updates the file meanwhile
+        
+        Returns:
+            Structured array in time order (empty when no consistent copy
+            could be taken within the retries)
+        """
+        for _ in range(retries):
+            seq = int(self.header[3])
+            older, newer = self.segments()
+            records = np.concatenate([older, newer])
+            if seq % 2 == 0 and int(self.header[3]) == seq:
+                return records[records["timestamp"] >= since]
+        # 書き込み中のレコードを含むかもしれないコピーは返さない
+        return self.records[:0].copy()
+    
+    def latest(self, retries: int = 5) -> Optional[np.void]:
+        """
+        Consistent copy of the newest record
+        
+        Args:
+            retries: Attempts when the writer updates the file meanwhile
+        
+        Returns:
+            Record, or None when nothing was written yet or no consistent
+            copy could be taken within the retries
+        """
+        for _ in range(retries):
+            seq = int(self.header[3])
+            written = int(self.header[2])
+            last = self.records[(written - 1) % self.capacity].copy() if written else None
+            if seq % 2 == 0 and int(self.header[3]) == seq:
+                return last
+        return None
+    
+    def flush(self):
+        """Write dirty pages back to the file (writer only)"""
+        self.records.flush()
+        self.header.flush()
+
+class RingBufferWriter:
+    """Poller subscriber appending every reading to its meter's ring buffer"""
+    
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        Args:
+            capacity: Records kept per meter for newly created files
+        """
+        self.capacity = capacity
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+    
+    def append(self, samples: List[MeterStatus]):
+        """
+        Store one tick of readings
+        
+        Args:
+            samples: Readings of one tick
+        """
+        with self._lock:
+            for sample in samples:
+                buffer = self._buffers.get(sample.device_id)
+                if buffer is None:
+                    buffer = RingBuffer(_file_name(sample.device_id), self.capacity, writable=True)
+                    self._buffers[sample.device_id] = buffer
+                buffer.append(sample)
+    
+    def flush(self):
+        """Write every buffer back to disk (the OS does this lazily otherwise)"""
+        with self._lock:
+            for buffer in self._buffers.values():
+                buffer.flush()
+
+# 読み取り側はプロセス内でマップを共有する
+_readers: Dict[str, RingBuffer] = {}
+_readers_lock = threading.Lock()
+
+def open_reader(device_id: str) -> Optional[RingBuffer]:
+    """
+    Shared read-only ring buffer of a meter
+    
+    Args:
+        device_id: Meter device ID
+    
+    Returns:
+        RingBuffer, or None when the poller has not written one yet
+    """
+    path = _file_name(device_id)
+    with _readers_lock:
+        reader = _readers.get(path)
+        if reader is None:
+            if not os.path.exists(path):
+                return None
+            reader = _readers[path] = RingBuffer(path)
+        return reader
+
+def latest_reading(device_id: str, max_age: float = 600) -> Optional[MeterStatus]:
+    """
+    Newest reading of a meter if the poller wrote one recently
+    
+    Args:
+        device_id: Meter device ID
+        max_age: Maximum age in seconds
+    
+    Returns:
+        MeterStatus or None
+    """
+    reader = open_reader(device_id)
+    if reader is None:
+        return None
+    last = reader.latest()
+    if last is None or time.time() - float(last["timestamp"]) > max_age:
+        return None
+    temperature, humidity, battery = float(last["temperature"]), float(last["humidity"]), int(last["battery"])
+    return MeterStatus(
+        device_id, float(last["timestamp"]),
+        None if temperature != temperature else round(temperature, 1),
+        None if humidity != humidity else round(humidity, 1),
+        None if battery < 0 else battery,
+    )
+
+def recent_readings(device_id: str, since: float = 0.0) -> Optional[np.ndarray]:
+    """
+    Recent readings of a meter from its ring buffer
+    
+    Args:
+        device_id: Meter device ID
+        since: Oldest timestamp (inclusive)
+    
+    Returns:
+        Structured array (timestamp, temperature, humidity, battery) or None
+    """
+    reader = open_reader(device_id)
+    return None if reader is None else reader.snapshot(since)
@@ -0,0 +1,401 @@
+"""
+Runtime accounting for air conditioners and lights
+
+Every power command the client sends successfully (turnOn, turnOff and
+setAll, which carries the power field) is appended to an event log, one
+JSON line per command, shared by the dashboard, the CLI and the poller.
+RuntimeLedger turns that log into on-intervals and seconds of runtime
+per device and local calendar day. It keeps its read position and the
+intervals still open in a checkpoint file, so each update() only parses
+the lines appended since the previous one however long the log grows.
+
+The log records what devices were told, not what they did: an AC
+switched off with its own remote keeps counting until the next command.
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from switchbot_api import data_path
+
+# 稼働時間に影響するコマンド（ac_power は turnOn を送る）
+POWER_COMMANDS = ("turnOn", "turnOff", "setAll")
+EXPORT_COLUMNS = ("date", "device_id", "runtime_hours", "switch_ons")
+
+def power_after(command: str, parameter: str = "default") -> Optional[bool]:
+    """
+    Power state a command leaves a device in
+    
+    Args:
+        command: Command name
+        parameter: Command parameter ("temperature,mode,fan,power" for setAll)
+    
+    Returns:
+        True (on), False (off) or None when the command does not set power
+    """
+    if command == "turnOn":
+        return True
+    if command == "turnOff":
+        return False
+    if command == "setAll":
+        parts = str(parameter).split(",")
+        if len(parts) == 4:
+            return parts[3] == "on"
+    return None
+
+def split_by_day(start: float, end: float) -> Iterator[Tuple[str, float]]:
+    """
+    Split an interval at local midnights
+    
+    Args:
+        start: Interval start (epoch seconds)
+        end: Interval end (epoch seconds)
+    
+    Yields:
+        ("YYYY-MM-DD", seconds within that day)
+    """
+    while start < end:
+        day = datetime.fromtimestamp(start).date()
+        midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        stop = min(end, midnight)
+        yield day.isoformat(), stop - start
+        start = stop
+
+class CommandLog:
+    """Append-only log of power commands"""
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Log file (default: DATA_DIR/command_log.jsonl)
+        """
+        self.path = path or data_path("command_log.jsonl")
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+    
+    def append(self, device_id: str, command: str, parameter: str = "default", timestamp: Optional[float] = None):
+        """
+        Record a successfully sent command (non-power commands are ignored)
+        
+        A write failure is kept in last_error instead of raised, so the
+        command that was already sent is not reported as failed.
+        
+        Args:
+            device_id: Device or remote ID
+            command: Command name
+            parameter: Command parameter
+            timestamp: When it was sent (default: now)
+        """
+        if command not in POWER_COMMANDS:
+            return
+        event = {
+            "t": time.time() if timestamp is None else timestamp,
+            "deviceId": device_id,
+            "command": command,
+            "parameter": parameter,
+        }
+        # 1行を1回の追記で書くので、複数プロセスから書いても行が混ざらない
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                self.last_error = f"Failed to record command: {str(e)}"
+                return
+            self.last_error = None
+
+class RuntimeLedger:
+    """Incremental on-interval and daily runtime aggregation of a CommandLog"""
+    
+    def __init__(self, log_path: Optional[str] = None, checkpoint_path: Optional[str] = None,
+                 keep_intervals_days: int = 90):
+        """
+        Args:
+            log_path: Command log (default: DATA_DIR/command_log.jsonl)
+            checkpoint_path: Aggregation state (default: DATA_DIR/runtime_ledger.json)
+            keep_intervals_days: Individual intervals older than this are dropped
+                (daily totals are kept)
+        """
+        self.log_path = log_path or data_path("command_log.jsonl")
+        self.checkpoint_path = checkpoint_path or data_path("runtime_ledger.json")
+        self.keep_intervals_days = keep_intervals_days
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+    
+    def _reset(self):
+        self._offset = 0
+        self._on_since: Dict[str, float] = {}
+        self._daily: Dict[str, Dict[str, float]] = {}
+        self._switch_ons: Dict[str, Dict[str, int]] = {}
+        self._intervals: Dict[str, List[Tuple[float, float]]] = {}
+    
+    def _load(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self._offset = data.get("offset", 0)
+        self._on_since = data.get("on_since", {})
+        self._daily = data.get("daily", {})
+        self._switch_ons = data.get("switch_ons", {})
+        self._intervals = {k: [tuple(i) for i in v] for k, v in data.get("intervals", {}).items()}
+    
+    def _save(self):
+        data = {
+            "offset": self._offset,
+            "on_since": self._on_since,
+            "daily": self._daily,
+            "switch_ons": self._switch_ons,
+            "intervals": self._intervals,
+        }
+        tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def update(self) -> int:
+        """
+        Aggregate the lines appended to the log since the last update
+        
+        Returns:
+            Number of events applied
+        """
+        with self._lock:
+            try:
+                size = os.path.getsize(self.log_path)
+            except OSError:
+                return 0
+            # ログが作り直された（短くなった）ときは最初から数え直す
+            if size < self._offset:
+                self._reset()
+            if size == self._offset:
+                return 0
+            with open(self.log_path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(size - self._offset)
+            # 書き込み途中の最終行は次回に回す
+            end = chunk.rfind(b"\n") + 1
+            applied = 0
+            for line in chunk[:end].splitlines():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if self._apply(event):
+                    applied += 1
+            self._offset += end
+            self._prune()
+            self._save()
+            return applied
+    
+    def _apply(self, event: Dict) -> bool:
+        power = power_after(event.get("command", ""), event.get("parameter", "default"))
+        device_id = event.get("deviceId")
+        if power is None or device_id is None:
+            return False
+        t = float(event["t"])
+        since = self._on_since.get(device_id)
+        if power and since is None:
+            self._on_since[device_id] = t
+            day = datetime.fromtimestamp(t).date().isoformat()
+            counts = self._switch_ons.setdefault(device_id, {})
+            counts[day] = counts.get(day, 0) + 1
+        elif not power and since is not None:
+            del self._on_since[device_id]
+            self._close(device_id, since, t)
+        return True
+    
+    def _close(self, device_id: str, start: float, end: float):
+        if end <= start:
+            return
+        self._intervals.setdefault(device_id, []).append((start, end))
+        daily = self._daily.setdefault(device_id, {})
+        for day, seconds in split_by_day(start, end):
+            daily[day] = daily.get(day, 0.0) + seconds
+    
+    def _prune(self):
+        cutoff = time.time() - self.keep_intervals_days * 86400
+        for device_id, intervals in self._intervals.items():
+            if intervals and intervals[0][1] < cutoff:
+                self._intervals[device_id] = [i for i in intervals if i[1] >= cutoff]
+    
+    def intervals(self, device_id: str, since: float = 0.0) -> List[Tuple[float, Optional[float]]]:
+        """
+        On-intervals of a device
+        
+        Args:
+            device_id: Device or remote ID
+            since: Only intervals ending after this time
+        
+        Returns:
+            (start, end) pairs in order; end is None while the device is on
+        """
+        with self._lock:
+            result: List[Tuple[float, Optional[float]]] = [i for i in self._intervals.get(device_id, []) if i[1] > since]
+            if device_id in self._on_since:
+                result.append((self._on_since[device_id], None))
+            return result
+    
+    def is_on(self, device_id: str) -> bool:
+        """Whether the last power command switched the device on"""
+        with self._lock:
+            return device_id in self._on_since
+    
+    def daily_runtime(self, since: Optional[date] = None, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Seconds of runtime per device and day, including intervals still open
+        
+        Args:
+            since: First day to include (default: all)
+            now: End of open intervals (default: now)
+        
+        Returns:
+            {device_id: {"YYYY-MM-DD": seconds}}
+        """
+        now = time.time() if now is None else now
+        first = since.isoformat() if since else ""
+        with self._lock:
+            result = {
+                device_id: {day: s for day, s in days.items() if day >= first}
+                for device_id, days in self._daily.items()
+            }
+            for device_id, start in self._on_since.items():
+                days = result.setdefault(device_id, {})
+                for day, seconds in split_by_day(start, now):
+                    if day >= first:
+                        days[day] = days.get(day, 0.0) + seconds
+            return {device_id: days for device_id, days in result.items() if days}
+    
+    def rows(self, since: Optional[date] = None, until: Optional[date] = None,
+             now: Optional[float] = None) -> List[Dict]:
+        """
+        Daily runtime as flat rows for reports
+        
+        Args:
+            since: First day (inclusive)
+            until: Last day (exclusive)
+            now: End of open intervals (default: now)
+        
+        Returns:
+            Rows with date, device_id, runtime_hours and switch_ons, sorted by date and device
+        """
+        last = until.isoformat() if until else "9999-12-31"
+        runtime = self.daily_runtime(since, now)
+        with self._lock:
+            switch_ons = {k: dict(v) for k, v in self._switch_ons.items()}
+        rows = [
+            {
+                "date": day,
+                "device_id": device_id,
+                "runtime_hours": round(seconds / 3600, 3),
+                "switch_ons": switch_ons.get(device_id, {}).get(day, 0),
+            }
+            for device_id, days in runtime.items()
+            for day, seconds in days.items()
+            if day < last
+        ]
+        rows.sort(key=lambda r: (r["date"], r["device_id"]))
+        return rows
+
+def export_runtime(path: str, since: Optional[date] = None, until: Optional[date] = None,
+                   ledger: Optional[RuntimeLedger] = None) -> int:
+    """
+    Write daily runtime per device as CSV
+    
+    Args:
+        path: Output file ("-" writes to stdout)
+        since: First day (inclusive)
+        until: Last day (exclusive)
+        ledger: RuntimeLedger (default: the shared ledger, updated first)
+    
+    Returns:
+        Number of rows written
+    """
+    ledger = ledger or get_ledger()
+    ledger.update()
+    rows = ledger.rows(since, until)
+    out = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+    try:
+        writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        return len(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+_command_log: Optional[CommandLog] = None
+_ledger: Optional[RuntimeLedger] = None
+_shared_lock = threading.Lock()
+
+def get_command_log() -> CommandLog:
+    """Command log shared by every client in the process"""
+    global _command_log
+    with _shared_lock:
+        if _command_log is None:
+            _command_log = CommandLog()
+        return _command_log
+
+def get_ledger() -> RuntimeLedger:
+    """Runtime ledger shared by every caller in the process"""
+    global _ledger
+    with _shared_lock:
+        if _ledger is None:
+            _ledger = RuntimeLedger()
+        return _ledger
+
+def render_runtime_panel(api, context: Dict):
+    """エアコン・照明の稼働時間パネルを表示"""
+    import streamlit as st
+    from device_index import classify
+    
+    command_log = get_command_log()
+    if command_log.last_error:
+        st.warning(f"⚠️ コマンドの記録に失敗しました（稼働時間が欠ける可能性があります）: {command_log.last_error}")
+    ledger = get_ledger()
+    ledger.update()
+    targets = {
+        d.get("deviceId"): d.get("deviceName", d.get("deviceId"))
+        for d in context.get("devices", []) + context.get("remotes", [])
+        if classify(d) in ("ac", "light")
+    }
+    days = st.select_slider("期間（日）", [1, 7, 14, 30], value=7, key="runtime_days")
+    since = date.today() - timedelta(days=days - 1)
+    rows = [r for r in ledger.rows(since) if r["device_id"] in targets]
+    if not rows:
+        st.info("この期間にエアコン・照明の電源操作の記録はありません（ダッシュボード・CLIから送ったコマンドが記録されます）")
+        return
+    
+    # デバイスごとの合計と日別の表
+    totals = {}
+    for row in rows:
+        totals[row["device_id"]] = totals.get(row["device_id"], 0.0) + row["runtime_hours"]
+    st.dataframe([
+        {
+            "デバイス": targets[device_id],
+            "合計 (時間)": round(hours, 1),
+            "1日平均 (時間)": round(hours / days, 1),
+            "稼働中": "🟢" if ledger.is_on(device_id) else "",
+        }
+        for device_id, hours in sorted(totals.items(), key=lambda item: -item[1])
+    ], hide_index=True)
+    table = {}
+    for row in rows:
+        table.setdefault(row["date"], {"日付": row["date"]})[targets[row["device_id"]]] = round(row["runtime_hours"], 2)
+    st.dataframe(list(table.values()), hide_index=True)
+    
+    lines = [",".join(("date", "device_name") + EXPORT_COLUMNS[1:])]
+    for row in rows:
+        name = targets[row["device_id"]].replace(",", " ")
+        lines.append(f"{row['date']},{name},{row['device_id']},{row['runtime_hours']},{row['switch_ons']}")
+    st.download_button("📥 CSVをダウンロード", "\n".join(lines) + "\n", file_name=f"runtime_{since.isoformat()}.csv",
+                       mime="text/csv", key="runtime_csv")
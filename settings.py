@@ -0,0 +1,332 @@
+"""
+Runtime settings from a TOML file
+
+Poll intervals, cache ages, concurrency limits, API budgets, history
+retention, the default layout and room names live in DATA_DIR/settings.toml (or the file named
+by SWITCHSENSE_SETTINGS). Every section and key is optional; missing
+values keep the built-in defaults. Unknown keys and bad values are
+rejected with a ValueError when the file is first loaded, so typos fail
+at startup instead of being silently ignored.
+
+SettingsStore re-reads the file whenever it changes. Components
+subscribe and adopt new values in place (scheduler limits, budgets,
+cache ages, refresh intervals), so the poller keeps running and caches
+keep their contents. An invalid edit at runtime is reported and the
+previous settings stay in effect. Worker pool sizes are only read at
+startup. Credentials stay in the environment / .env.
+
+    [poll]
+    meters = 60              # poller tick (seconds)
+    catalog = 300            # /devices refresh
+
+    [cache]
+    devices_ttl = 30
+    stale = 300              # cards are marked stale after this
+    [cache.max_age]          # status refresh age per category
+    default = 60
+    thermometer = 30
+
+    [concurrency]
+    max_in_flight = 4        # API requests in flight per account
+
+    [budget]
+    reserve_background = 0.05
+    [budget.sites]
+    tokyo = 5000             # daily quota override per site
+
+    [history]
+    keep_days = 90           # meter history retention
+
+    [layout]
+    page_size = 12
+
+    [rooms]
+    C1234567890A = "リビング"
+"""
+
+import os
+import threading
+import tomllib
+from dataclasses import dataclass, field, fields
+from typing import Callable, Dict, List, Optional
+
+from request_scheduler import BACKGROUND, DEFAULT_MAX_IN_FLIGHT, DEFAULT_RESERVE, VISIBLE
+from switchbot_api import data_path
+
+def _number(section: str, key: str, value, minimum: float = 0.0, integer: bool = False, inclusive: bool = False):
+    """Validate a numeric setting and return it"""
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        raise ValueError(f"{section}.{key} must be {'an integer' if integer else 'a number'}, got {value!r}")
+    if value < minimum or (value == minimum and not inclusive):
+        raise ValueError(f"{section}.{key} must be {'>=' if inclusive else '>'} {minimum:g}, got {value!r}")
+    return value
+
+def _known_keys(cls, section: str, data: Dict):
+    """Reject keys the section does not define (typos)"""
+    if not isinstance(data, dict):
+        raise ValueError(f"[{section}] must be a table")
+    unknown = set(data) - {f.name for f in fields(cls)}
+    if unknown:
+        raise ValueError(f"Unknown key(s) in [{section}]: {', '.join(sorted(unknown))}")
+
+@dataclass
+class PollSettings:
+    """Background polling intervals in seconds"""
+    meters: float = 60.0
+    catalog: float = 300.0
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PollSettings":
+        _known_keys(cls, "poll", data)
+        return cls(**{k: _number("poll", k, v) for k, v in data.items()})
+
+@dataclass
+class CacheSettings:
+    """Ages after which cached data is refreshed or flagged"""
+    devices_ttl: float = 30.0
+    stale: float = 300.0
+    max_age: Dict[str, float] = field(default_factory=lambda: {"default": 60.0})
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CacheSettings":
+        _known_keys(cls, "cache", data)
+        values = {k: _number("cache", k, v) for k, v in data.items() if k != "max_age"}
+        if "max_age" in data:
+            ages = data["max_age"]
+            if not isinstance(ages, dict):
+                raise ValueError("[cache.max_age] must be a table of category = seconds")
+            values["max_age"] = {"default": 60.0, **{k: _number("cache.max_age", k, v) for k, v in ages.items()}}
+        return cls(**values)
+    
+    def max_age_for(self, category: str) -> float:
+        """Refresh age of a device category (falls back to "default")"""
+        return self.max_age.get(category, self.max_age["default"])
+
+@dataclass
+class ConcurrencySettings:
+    """Parallelism limits (worker counts apply at startup only)"""
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT
+    poll_workers: Optional[int] = None
+    status_refresh_workers: int = 4
+    command_workers: int = 4
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ConcurrencySettings":
+        _known_keys(cls, "concurrency", data)
+        return cls(**{k: _number("concurrency", k, v, 1, integer=True, inclusive=True) for k, v in data.items()})
+
+@dataclass
+class BudgetSettings:
+    """Daily API quota and the share kept back from background work"""
+    daily_limit: Optional[int] = None
+    reserve_visible: float = DEFAULT_RESERVE[VISIBLE]
+    reserve_background: float = DEFAULT_RESERVE[BACKGROUND]
+    sites: Dict[str, int] = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BudgetSettings":
+        _known_keys(cls, "budget", data)
+        values = {}
+        if "daily_limit" in data:
+            values["daily_limit"] = _number("budget", "daily_limit", data["daily_limit"], 1, integer=True, inclusive=True)
+        for key in ("reserve_visible", "reserve_background"):
+            if key in data:
+                values[key] = _number("budget", key, data[key], 0, inclusive=True)
+                if values[key] >= 1:
+                    raise ValueError(f"budget.{key} is a fraction of the daily limit and must be below 1")
+        if "sites" in data:
+            if not isinstance(data["sites"], dict):
+                raise ValueError("[budget.sites] must be a table of site = daily quota")
+            values["sites"] = {k: _number("budget.sites", k, v, 1, integer=True, inclusive=True)
+                               for k, v in data["sites"].items()}
+        settings = cls(**values)
+        if settings.reserve_background < settings.reserve_visible:
+            raise ValueError("budget.reserve_background must not be smaller than budget.reserve_visible")
+        return settings
+    
+    def reserve(self):
+        """Reserve tuple for RequestScheduler (interactive requests are never refused)"""
+        return (0.0, self.reserve_visible, self.reserve_background)
+
+@dataclass
+class HistorySettings:
+    """Meter history retention"""
+    keep_days: float = 90.0
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HistorySettings":
+        _known_keys(cls, "history", data)
+        return cls(**{k: _number("history", k, v) for k, v in data.items()})
+
+@dataclass
+class LayoutSettings:
+    """Dashboard defaults"""
+    page_size: int = 12
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LayoutSettings":
+        _known_keys(cls, "layout", data)
+        return cls(**{k: _number("layout", k, v, 1, integer=True, inclusive=True) for k, v in data.items()})
+
+@dataclass
+class Settings:
+    """All runtime settings"""
+    poll: PollSettings = field(default_factory=PollSettings)
+    cache: CacheSettings = field(default_factory=CacheSettings)
+    concurrency: ConcurrencySettings = field(default_factory=ConcurrencySettings)
+    budget: BudgetSettings = field(default_factory=BudgetSettings)
+    history: HistorySettings = field(default_factory=HistorySettings)
+    layout: LayoutSettings = field(default_factory=LayoutSettings)
+    rooms: Dict[str, str] = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Settings":
+        """
+        Build and validate settings from a parsed TOML document
+        
+        Args:
+            data: Sections (see module docstring)
+        
+        Returns:
+            Settings
+        """
+        _known_keys(cls, "settings", data)
+        sections = {name: section.from_dict(data[name]) for name, section in (
+            ("poll", PollSettings), ("cache", CacheSettings), ("concurrency", ConcurrencySettings),
+            ("budget", BudgetSettings), ("history", HistorySettings), ("layout", LayoutSettings),
+        ) if name in data}
+        if "rooms" in data:
+            rooms = data["rooms"]
+            if not isinstance(rooms, dict) or not all(isinstance(v, str) for v in rooms.values()):
+                raise ValueError("[rooms] must be a table of device ID = room name")
+            sections["rooms"] = dict(rooms)
+        return cls(**sections)
+
+def settings_path() -> str:
+    """Settings file (SWITCHSENSE_SETTINGS or DATA_DIR/settings.toml)"""
+    return os.getenv("SWITCHSENSE_SETTINGS") or data_path("settings.toml")
+
+def load_settings(path: Optional[str] = None) -> Settings:
+    """
+    Load and validate a settings file
+    
+    Args:
+        path: TOML file (default: settings_path())
+    
+    Returns:
+        Settings (defaults when the file does not exist)
+    
+    Raises:
+        ValueError: The file is not valid TOML or a value is invalid
+    """
+    path = path or settings_path()
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except FileNotFoundError:
+        return Settings()
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"Invalid settings file {path}: {str(e)}")
+    return Settings.from_dict(data)
+
+class SettingsStore:
+    """Current settings, reloaded when the file changes"""
+    
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: TOML file (default: settings_path())
+        
+        Raises:
+            ValueError: The file is invalid at startup
+        """
+        self.path = path or settings_path()
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[Settings], None]] = []
+        self._mtime = self._file_mtime()
+        self.settings = load_settings(self.path)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+    
+    def subscribe(self, callback: Callable[[Settings], None]):
+        """
+        Call a function with the current settings now and after every reload
+        
+        Args:
+            callback: Applies settings to a component
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+            settings = self.settings
+        callback(settings)
+    
+    def reload(self) -> bool:
+        """
+        Re-read the file if it changed since the last load
+        
+        Returns:
+            True if new settings were applied
+        """
+        with self._lock:
+            mtime = self._file_mtime()
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            try:
+                settings = load_settings(self.path)
+            except ValueError as e:
+                # 起動後の不正な編集では止めずに、直前の設定を使い続ける
+                self.last_error = str(e)
+                print(f"[settings] keeping previous settings: {str(e)}")
+                return False
+            self.settings = settings
+            self.last_error = None
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(settings)
+            except Exception as e:
+                print(f"[settings] failed to apply: {str(e)}")
+        print(f"[settings] reloaded {self.path}")
+        return True
+    
+    def start_watching(self, period: float = 2.0):
+        """Check the file for changes every period seconds in a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        
+        def watch():
+            while not self._stop.wait(period):
+                self.reload()
+        
+        self._stop.clear()
+        self._thread = threading.Thread(target=watch, name="settings-watch", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+
+def apply_to_pool(pool, settings: Settings):
+    """
+    Apply limits to every account of an AccountPool in place
+    
+    Args:
+        pool: account_pool.AccountPool
+        settings: Settings to apply
+    """
+    for site, client in pool.clients.items():
+        client.DEVICES_CACHE_TTL = settings.cache.devices_ttl
+        client.scheduler.configure(settings.concurrency.max_in_flight, settings.budget.reserve())
+        quota = settings.budget.sites.get(site, settings.budget.daily_limit)
+        # 指定がなければアカウント設定（SWITCHBOT_ACCOUNTS の daily_quota）のまま
+        client.budget.daily_limit = quota if quota is not None else pool.accounts[site].daily_quota
+    for catalog in pool.catalogs.values():
+        catalog.refresh_interval = settings.poll.catalog
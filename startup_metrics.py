@@ -0,0 +1,54 @@
+"""
+起動メトリクスパネル
+⏱️ ダッシュボードの起動時間とimport時間を表示します（パネルを開いたときだけ読み込まれます）
+"""
+
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import streamlit as st
+
+def profile_imports(modules: List[str], top: int = 15) -> List[Tuple[str, int, int]]:
+    """
+    Profile module import cost with `python -X importtime` in a fresh interpreter
+    
+    Args:
+        modules: Module names to import
+        top: Number of most expensive entries to return
+    
+    Returns:
+        List of (module, self_us, cumulative_us) sorted by cumulative time
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        capture_output=True, text=True, timeout=60
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    entries.sort(key=lambda e: e[2], reverse=True)
+    return entries[:top]
+
+def render_startup_panel(api, context: Dict):
+    """起動メトリクスを表示"""
+    timings = context.get("timings", {})
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("初回描画 (コールド)", f"{timings.get('cold_first_paint_ms', 0):.0f} ms")
+    with col2:
+        st.metric("初回描画 (今回)", f"{timings.get('first_paint_ms', 0):.0f} ms")
+    with col3:
+        st.metric("前回の全体描画", f"{timings.get('last_render_ms', 0):.0f} ms")
+    
+    if st.button("🔍 import時間を計測", key="profile_imports"):
+        with st.spinner("計測中..."):
+            entries = profile_imports(["streamlit", "switchbot_api"])
+        st.table([
+            {"module": name, "self (ms)": round(s / 1000, 1), "cumulative (ms)": round(c / 1000, 1)}
+            for name, s, c in entries
+        ])
@@ -0,0 +1,106 @@
+"""
+Stale-while-revalidate device status cache
+
+get() never waits for the cloud: it returns the last known status of a
+device (or None the very first time) together with its age, and when
+that status is older than max_age it schedules a background refresh.
+Only one refresh per device is in flight at a time. Each completed
+refresh bumps `version`, which the dashboard watches to rerun once new
+values are in, so rendering time does not depend on API latency.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from request_scheduler import VISIBLE, priority
+
+@dataclass
+class CachedStatus:
+    """Last known status of one device"""
+    value: Optional[Dict] = None
+    fetched_at: Optional[float] = None
+    error: Optional[str] = None
+    refreshing: bool = False
+    attempted_at: Optional[float] = None
+    
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the value was fetched (None when there is no value yet)"""
+        if self.fetched_at is None:
+            return None
+        return (time.time() if now is None else now) - self.fetched_at
+
+class StatusCache:
+    """Per-device statuses served immediately and refreshed in the background"""
+    
+    def __init__(self, max_age: float = 60, max_workers: int = 4):
+        """
+        Args:
+            max_age: Seconds after which a value is refreshed on the next get()
+            max_workers: Refreshes running in parallel
+        """
+        self.max_age = max_age
+        self.version = 0
+        self._entries: Dict[str, CachedStatus] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="status-refresh")
+    
+    def get(self, device_id: str, fetch: Callable[[], Optional[Dict]], max_age: Optional[float] = None) -> CachedStatus:
+        """
+        Last known status, scheduling a refresh when it is missing or stale
+        
+        Args:
+            device_id: Device ID
+            fetch: Loads the current status (called in a worker thread)
+            max_age: Refresh age for this device (default: the cache's max_age)
+        
+        Returns:
+            Copy of the cached entry (value may be None while the first fetch runs)
+        """
+        with self._lock:
+            entry = self._entries.setdefault(device_id, CachedStatus())
+            now = time.time()
+            # 失敗した取得も試行時刻で数え、max_age の間は再試行しない（再描画のたびに呼び続けないように）
+            last = max(entry.fetched_at or 0.0, entry.attempted_at or 0.0)
+            if now - last > (self.max_age if max_age is None else max_age) and not entry.refreshing:
+                entry.refreshing = True
+                entry.attempted_at = now
+                self._executor.submit(self._refresh, device_id, fetch)
+            return CachedStatus(entry.value, entry.fetched_at, entry.error, entry.refreshing, entry.attempted_at)
+    
+    def put(self, device_id: str, value: Dict, fetched_at: Optional[float] = None):
+        """
+        Store a status obtained elsewhere (e.g. the poller) if it is newer
+        
+        Args:
+            device_id: Device ID
+            value: Status dict
+            fetched_at: When it was measured (default: now)
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            entry = self._entries.setdefault(device_id, CachedStatus())
+            if entry.fetched_at is None or fetched_at > entry.fetched_at:
+                entry.value, entry.fetched_at, entry.error = value, fetched_at, None
+                self.version += 1
+    
+    def _refresh(self, device_id: str, fetch: Callable[[], Optional[Dict]]):
+        try:
+            with priority(VISIBLE):
+                value = fetch()
+            error = None if value else "empty status"
+        except Exception as e:
+            value, error = None, str(e)
+        with self._lock:
+            entry = self._entries[device_id]
+            entry.refreshing = False
+            if value:
+                entry.value, entry.fetched_at, entry.error = value, time.time(), None
+            else:
+                entry.error = error
+            self.version += 1
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
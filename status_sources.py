@@ -0,0 +1,261 @@
+"""
+Where meter readings come from
+
+A StatusSource returns the newest MeterStatus it knows for a device.
+CloudSource asks the SwitchBot API (one request of the daily quota per
+call), RingBufferSource reads what the poller last wrote, and
+BleAdvertisementSource listens to the readings the meters broadcast
+over Bluetooth LE themselves: no quota at all and a new value every few
+seconds for meters within range of the host.
+
+SwitchBot device IDs of BLE devices are their MAC addresses without
+separators, so advertisements map onto catalog devices directly.
+
+Scanning needs the optional bleak package (pip install bleak); the
+advertisement parser has no dependencies and can be run against the
+byte fixtures in its docstring with `python -m doctest status_sources.py`.
+"""
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from models import MeterStatus
+
+# SwitchBot のサービスデータUUID（新旧）とメーカーID
+SERVICE_UUIDS = ("0000fd3d-0000-1000-8000-00805f9b34fb", "00000d00-0000-1000-8000-00805f9b34fb")
+MANUFACTURER_ID = 0x0969
+
+# サービスデータ先頭バイト（下位7ビット）→ deviceType
+METER_MODELS = {"T": "Meter", "i": "MeterPlus", "w": "WoIOSensor"}
+
+def _import_bleak():
+    try:
+        from bleak import BleakScanner
+        return BleakScanner
+    except ImportError:
+        raise Exception("BLE scanning requires bleak (pip install bleak)")
+
+def device_id_for(address: str) -> str:
+    """SwitchBot device ID of a BLE address ("AA:BB:CC:DD:EE:FF" -> "AABBCCDDEEFF")"""
+    return address.replace(":", "").replace("-", "").upper()
+
+def parse_meter_advertisement(service_data: bytes, manufacturer_data: Optional[bytes] = None) -> Optional[Dict]:
+    """
+    Decode the reading a SwitchBot meter broadcasts
+    
+    Service data: model, flags, battery (bits 0-6), then three temperature /
+    humidity bytes: tenths of a degree (bits 0-3), sign (bit 7, set when
+    positive) and whole degrees (bits 0-6), Fahrenheit display flag (bit 7)
+    and humidity (bits 0-6). Newer firmware and the outdoor meter carry the
+    same three bytes at offset 8 of the manufacturer data (after the MAC
+    address); when present those take precedence.
+    
+    Args:
+        service_data: Service data of the SwitchBot service UUID
+        manufacturer_data: Manufacturer data of company ID 0x0969, if any
+    
+    Returns:
+        Dict with deviceType, temperature, humidity, battery and fahrenheit,
+        or None for other devices and incomplete payloads
+    
+    Recorded fixtures:
+    
+    >>> parse_meter_advertisement(bytes.fromhex("5400e40697ad"))
+    {'deviceType': 'Meter', 'temperature': 23.6, 'humidity': 45, 'battery': 100, 'fahrenheit': True}
+    >>> parse_meter_advertisement(bytes.fromhex("6900570289b7"))
+    {'deviceType': 'MeterPlus', 'temperature': 9.2, 'humidity': 55, 'battery': 87, 'fahrenheit': True}
+    >>> parse_meter_advertisement(bytes.fromhex("770055"), bytes.fromhex("aabbccddeeff1e0003053c00"))
+    {'deviceType': 'WoIOSensor', 'temperature': -5.3, 'humidity': 60, 'battery': 85, 'fahrenheit': False}
+    >>> parse_meter_advertisement(bytes.fromhex("480090")) is None  # Bot
+    True
+    >>> parse_meter_advertisement(bytes.fromhex("5400e4")) is None  # truncated
+    True
+    """
+    if not service_data:
+        return None
+    device_type = METER_MODELS.get(chr(service_data[0] & 0x7F))
+    if device_type is None:
+        return None
+    if manufacturer_data is not None and len(manufacturer_data) >= 11:
+        data = manufacturer_data[8:11]
+    elif len(service_data) >= 6:
+        data = service_data[3:6]
+    else:
+        return None
+    sign = 1 if data[1] & 0x80 else -1
+    temperature = sign * ((data[1] & 0x7F) + (data[0] & 0x0F) / 10)
+    return {
+        "deviceType": device_type,
+        "temperature": round(temperature, 1),
+        "humidity": data[2] & 0x7F,
+        "battery": service_data[2] & 0x7F if len(service_data) >= 3 else None,
+        "fahrenheit": bool(data[2] & 0x80),
+    }
+
+# ===== ソース =====
+
+class StatusSource(ABC):
+    """Source of meter readings (subclasses implement read)"""
+    name = "source"
+    # True のソースは読み取りごとにAPIの割り当てを消費する
+    uses_quota = False
+    
+    @abstractmethod
+    def read(self, device_id: str) -> Optional[MeterStatus]:
+        """
+        Newest reading of a meter
+        
+        Args:
+            device_id: Meter device ID
+        
+        Returns:
+            MeterStatus or None when this source has nothing for the device
+        """
+
+class CloudSource(StatusSource):
+    """Current status from the SwitchBot API"""
+    name = "cloud"
+    uses_quota = True
+    
+    def __init__(self, api):
+        """
+        Args:
+            api: SwitchBotAPI (or AccountRouter)
+        """
+        self.api = api
+    
+    def read(self, device_id: str) -> Optional[MeterStatus]:
+        status = self.api.get_device_status(device_id)
+        if not status:
+            return None
+        return MeterStatus.from_dict(device_id, status)
+
+class RingBufferSource(StatusSource):
+    """Latest reading the poller wrote to the shared ring buffers"""
+    name = "poller"
+    
+    def __init__(self, max_age: float = float("inf")):
+        """
+        Args:
+            max_age: Ignore readings older than this many seconds
+        """
+        self.max_age = max_age
+    
+    def read(self, device_id: str) -> Optional[MeterStatus]:
+        from ring_buffer import latest_reading
+        return latest_reading(device_id, max_age=self.max_age)
+
+class BleAdvertisementSource(StatusSource):
+    """Readings broadcast by meters over Bluetooth LE"""
+    name = "ble"
+    
+    def __init__(self, max_age: float = 300):
+        """
+        Args:
+            max_age: Forget readings of meters not heard for this many seconds
+        """
+        self.max_age = max_age
+        self.last_error: Optional[str] = None
+        self._readings: Dict[str, MeterStatus] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def feed(self, address: str, service_data: bytes, manufacturer_data: Optional[bytes] = None,
+             timestamp: Optional[float] = None) -> Optional[MeterStatus]:
+        """
+        Record one advertisement (called by the scanner, or with recorded payloads)
+        
+        Args:
+            address: BLE address of the sender
+            service_data: SwitchBot service data
+            manufacturer_data: SwitchBot manufacturer data, if any
+            timestamp: Reception time (default: now)
+        
+        Returns:
+            The decoded reading, or None when the payload is not a meter reading
+        """
+        parsed = parse_meter_advertisement(service_data, manufacturer_data)
+        if parsed is None:
+            return None
+        # macOS ではアドレスがUUIDになるため、メーカーデータ先頭のMACアドレスを優先する
+        if manufacturer_data is not None and len(manufacturer_data) >= 6:
+            device_id = manufacturer_data[:6].hex().upper()
+        else:
+            device_id = device_id_for(address)
+        reading = MeterStatus(device_id, time.time() if timestamp is None else timestamp,
+                              parsed["temperature"], float(parsed["humidity"]), parsed["battery"])
+        with self._lock:
+            self._readings[device_id] = reading
+        return reading
+    
+    def read(self, device_id: str) -> Optional[MeterStatus]:
+        with self._lock:
+            reading = self._readings.get(device_id_for(device_id))
+        if reading is None or time.time() - reading.timestamp > self.max_age:
+            return None
+        return reading
+    
+    def readings(self) -> List[MeterStatus]:
+        """Every meter heard within max_age"""
+        now = time.time()
+        with self._lock:
+            return [r for r in self._readings.values() if now - r.timestamp <= self.max_age]
+    
+    def _on_advertisement(self, device, advertisement):
+        service_data = next((advertisement.service_data[u] for u in SERVICE_UUIDS if u in advertisement.service_data), None)
+        if service_data is not None:
+            self.feed(device.address, service_data, advertisement.manufacturer_data.get(MANUFACTURER_ID))
+    
+    async def _scan(self, scanner_class):
+        scanner = scanner_class(detection_callback=self._on_advertisement)
+        await scanner.start()
+        try:
+            while not self._stop.is_set():
+                await asyncio.sleep(0.5)
+        finally:
+            await scanner.stop()
+    
+    def _run(self, scanner_class):
+        try:
+            asyncio.run(self._scan(scanner_class))
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[ble] scanner stopped: {str(e)}")
+    
+    def start(self):
+        """Scan in a daemon thread (requires bleak and a Bluetooth adapter)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        scanner_class = _import_bleak()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(scanner_class,), name="ble-scanner", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+
+def newest_reading(sources: List[StatusSource], device_id: str) -> Optional[MeterStatus]:
+    """
+    Newest reading of a meter across several sources
+    
+    Args:
+        sources: Sources to consult
+        device_id: Meter device ID
+    
+    Returns:
+        The most recent MeterStatus, or None when no source has one
+    """
+    newest = None
+    for source in sources:
+        try:
+            reading = source.read(device_id)
+        except Exception as e:
+            print(f"[{source.name}] read failed: {str(e)}")
+            continue
+        if reading is not None and (newest is None or reading.timestamp > newest.timestamp):
+            newest = reading
+    return newest
@@ -1,52 +1,65 @@
 import requests
+import os
 import json
 import time
-import hashlib
-import hmac
-import base64
-import uuid
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from models import json_loads, parse_device_list, parse_meter_status
+from rate_budget import DEFAULT_DAILY_LIMIT, RateBudget
+from request_scheduler import INTERACTIVE, VISIBLE, RequestScheduler, current_priority
+from request_signer import RequestSigner
+from command_catalog import (AC_FAN_VALUES, AC_MODE_VALUES, REMOTE_COMMANDS, build_command, device_types,
+                             format_set_all, validate_command)
+from traffic_log import transport_from_env
 
 class SwitchBotAPI:
     """SwitchBot Open API v1.1 client"""
     
     BASE_URL = "https://api.switch-bot.com/v1.1"
     
-    def __init__(self, token: str, secret: str):
+    # /devices のレスポンスを使い回す秒数
+    DEVICES_CACHE_TTL = 30
+    
+    def __init__(self, token: str, secret: str, budget: Optional[RateBudget] = None, transport=None,
+                 remote_state=None, scheduler: Optional[RequestScheduler] = None, command_log=None):
         """
         Initialize SwitchBot API client
         
         Args:
             token: SwitchBot API token
             secret: SwitchBot API secret
+            budget: Daily request budget shared by every call of this client
+            transport: requests.Session-compatible object (e.g. traffic_log.RecordingTransport
+                or ReplayTransport); defaults to a new requests.Session
+            remote_state: ir_state.RemoteStateStore tracking infrared remotes; redundant
+                infrared commands are skipped when set
+            scheduler: Admission gate ordering commands ahead of status polls
+                (default: a RequestScheduler protecting this client's budget)
+            command_log: runtime_ledger.CommandLog receiving every successful power command
         """
         self.token = token
         self.secret = secret
+        self.budget = budget
+        self.remote_state = remote_state
+        self.command_log = command_log
+        self.scheduler = scheduler or RequestScheduler(budget=budget)
+        # HMACの鍵とトークン部分は1回だけ準備し、リクエストごとに使い回す
+        self.signer = RequestSigner(token, secret)
+        
+        # 接続を使い回すためのHTTPセッション（録画・再生時は差し替え）
+        self.session = transport or requests.Session()
+        
+        # /devices レスポンスのキャッシュ（物理デバイスとIRリモコンで共有）
+        self._devices_body: Optional[Dict] = None
+        self._devices_fetched_at = 0.0
+        self._devices_lock = threading.Lock()
     
     def _generate_headers(self) -> Dict[str, str]:
         """Generate authentication headers for API requests"""
-        # Generate timestamp and nonce
-        t = int(round(time.time() * 1000))
-        nonce = str(uuid.uuid4())
-        
-        # Create signature
-        string_to_sign = f"{self.token}{t}{nonce}"
-        string_to_sign_bytes = bytes(string_to_sign, 'utf-8')
-        secret_bytes = bytes(self.secret, 'utf-8')
-        sign = base64.b64encode(
-            hmac.new(secret_bytes, msg=string_to_sign_bytes, digestmod=hashlib.sha256).digest()
-        ).decode('utf-8')
-        
-        return {
-            'Authorization': self.token,
-            'Content-Type': 'application/json',
-            'charset': 'utf8',
-            't': str(t),
-            'sign': sign,
-            'nonce': nonce
-        }
+        return self.signer.headers()
     
-    def _make_request(self, endpoint: str, method: str = 'GET', data: Optional[Dict] = None) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, method: str = 'GET', data: Optional[Dict] = None,
+                      priority: Optional[int] = None, headers: Optional[Dict[str, str]] = None) -> Optional[Dict]:
         """
         Make authenticated request to SwitchBot API
         
@@ -54,24 +67,38 @@ class SwitchBotAPI:
             endpoint: API endpoint
             method: HTTP method
             data: Request payload
+            priority: request_scheduler class (default: the enclosing priority()
+                block, otherwise INTERACTIVE for commands and VISIBLE for reads)
+            headers: Pre-signed headers (e.g. from signer.sign_many); signed now if omitted
             
         Returns:
             Response data or None if error
         """
-        url = f"{self.BASE_URL}{endpoint}"
-        headers = self._generate_headers()
+        if priority is None:
+            priority = current_priority(INTERACTIVE if method == 'POST' else VISIBLE)
         
-        try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, timeout=10)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, json=data, timeout=10)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+        with self.scheduler.slot(priority):
+            if self.budget is not None and not self.budget.try_acquire():
+                raise Exception(f"Daily API quota exhausted ({self.budget.daily_limit} requests)")
             
-            response.raise_for_status()
+            url = f"{self.BASE_URL}{endpoint}"
+            headers = headers or self._generate_headers()
             
-            result = response.json()
+            try:
+                if method == 'GET':
+                    response = self.session.get(url, headers=headers, timeout=10)
+                elif method == 'POST':
+                    response = self.session.post(url, headers=headers, json=data, timeout=10)
+                else:
+                    raise ValueError(f"Unsupported HTTP method: {method}")
+                
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Network error: {str(e)}")
+        
+        try:
+            # レスポンスのバイト列から直接デコード
+            result = json_loads(response.content)
             
             # Check API response status
             if result.get('statusCode') != 100:
@@ -80,257 +107,243 @@ class SwitchBotAPI:
             
             return result.get('body', {})
             
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Network error: {str(e)}")
         except json.JSONDecodeError:
             raise Exception("Invalid JSON response from API")
         except Exception as e:
             raise Exception(f"API request failed: {str(e)}")
     
-    def get_devices(self) -> List[Dict]:
+    def _get_devices_body(self) -> Dict:
+        """
+        Get the /devices response body, reusing it for DEVICES_CACHE_TTL seconds
+        
+        Returns:
+            Response body containing deviceList and infraredRemoteList
+        """
+        with self._devices_lock:
+            now = time.monotonic()
+            if self._devices_body is None or now - self._devices_fetched_at > self.DEVICES_CACHE_TTL:
+                self._devices_body = self._make_request('/devices') or {}
+                self._devices_fetched_at = now
+            return self._devices_body
+    
+    def invalidate_cache(self):
+        """Drop the cached /devices response so the next call refetches it"""
+        with self._devices_lock:
+            self._devices_body = None
+    
+    def get_devices(self, as_model: bool = False) -> List:
         """
         Get list of all devices
         
+        Args:
+            as_model: Return models.Device objects instead of dicts
+            
         Returns:
             List of device information
         """
         try:
-            result = self._make_request('/devices')
+            result = self._get_devices_body()
+            if as_model:
+                return parse_device_list(result)[0]
             if result and 'deviceList' in result:
                 return result['deviceList']
             return []
         except Exception as e:
             raise Exception(f"Failed to get devices: {str(e)}")
     
-    def get_device_status(self, device_id: str) -> Optional[Dict]:
+    def get_devices_and_remotes(self, as_model: bool = False) -> Tuple[List, List]:
         """
-        Get status of a specific device
+        Get physical devices and infrared remotes from a single /devices call
         
         Args:
-            device_id: Device ID
+            as_model: Return models.Device / models.InfraredRemote objects instead of dicts
             
         Returns:
-            Device status data or None if error
+            (device list, infrared remote list) tuple
         """
         try:
-            result = self._make_request(f'/devices/{device_id}/status')
-            return result
+            result = self._get_devices_body() or {}
+            if as_model:
+                return parse_device_list(result)
+            return result.get('deviceList', []), result.get('infraredRemoteList', [])
         except Exception as e:
-            raise Exception(f"Failed to get device status for {device_id}: {str(e)}")
-    
-    # ===== デバイス操作機能 =====
+            raise Exception(f"Failed to get devices: {str(e)}")
     
-    def turn_on_device(self, device_id: str) -> bool:
+    def get_device_status(self, device_id: str, as_model: bool = False):
         """
-        Turn on a device
+        Get status of a specific device
         
         Args:
             device_id: Device ID
+            as_model: Return a models.MeterStatus instead of a dict
             
         Returns:
-            True if successful, False otherwise
+            Device status data or None if error
         """
         try:
-            data = {"command": "turnOn", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
+            result = self._make_request(f'/devices/{device_id}/status')
+            if as_model and result is not None:
+                return parse_meter_status(device_id, result)
+            return result
         except Exception as e:
-            raise Exception(f"Failed to turn on device {device_id}: {str(e)}")
+            raise Exception(f"Failed to get device status for {device_id}: {str(e)}")
     
-    def turn_off_device(self, device_id: str) -> bool:
+    def iter_device_statuses(self, device_ids: List[str], batch_size: int = 20) -> Iterator[Tuple[str, object]]:
         """
-        Turn off a device
+        Get statuses of many devices with batch-signed requests
+        
+        Headers are signed batch_size at a time with a shared timestamp, so
+        bulk polls spend less CPU on signing. Errors are yielded per device
+        instead of raised.
         
         Args:
-            device_id: Device ID
+            device_ids: Device IDs
+            batch_size: Requests signed together (keeps timestamps fresh)
             
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "turnOff", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to turn off device {device_id}: {str(e)}")
+        Yields:
+            (device_id, status dict) or (device_id, Exception)
+        """
+        for start in range(0, len(device_ids), batch_size):
+            batch = device_ids[start:start + batch_size]
+            for device_id, headers in zip(batch, self.signer.sign_many(len(batch))):
+                try:
+                    yield device_id, self._make_request(f'/devices/{device_id}/status', headers=headers)
+                except Exception as e:
+                    yield device_id, Exception(f"Failed to get device status for {device_id}: {str(e)}")
     
-    # ===== テレビ操作機能 =====
+    # ===== デバイス操作機能 =====
     
-    def tv_power(self, device_id: str) -> bool:
+    def _post_command(self, device_id: str, data: Dict) -> None:
         """
-        Toggle TV power
+        Single dispatch path of every device and infrared command
         
         Args:
-            device_id: TV device ID
-            
-        Returns:
-            True if successful, False otherwise
+            device_id: Device or remote ID
+            data: Validated payload {"command", "parameter", "commandType"}
         """
-        try:
-            data = {"command": "turnOn", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to toggle TV power for {device_id}: {str(e)}")
+        self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
+        if self.command_log is not None:
+            # 記録の失敗は command_log.last_error に残り、送信済みのコマンドを失敗扱いにしない
+            self.command_log.append(device_id, data["command"], data.get("parameter", "default"))
     
-    def tv_volume_up(self, device_id: str) -> bool:
+    def send_command(self, device_id: str, command: str, parameter: str = "default",
+                     command_type: str = "command", device_type: Optional[str] = None) -> bool:
         """
-        Increase TV volume
+        Send a command to any device or infrared remote
+        
+        The command is checked against command_catalog first; invalid
+        parameters raise ValueError without calling the API.
         
         Args:
-            device_id: TV device ID
+            device_id: Device ID
+            command: Command name (e.g. turnOn, setAll)
+            parameter: Command parameter
+            command_type: Command type ("command" or "customize")
+            device_type: deviceType / remoteType for stricter validation
             
         Returns:
             True if successful, False otherwise
         """
+        validate_command(command, parameter, device_type, command_type)
         try:
-            data = {"command": "volumeAdd", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
+            self._post_command(device_id, {"command": command, "parameter": parameter, "commandType": command_type})
             return True
         except Exception as e:
-            raise Exception(f"Failed to increase TV volume for {device_id}: {str(e)}")
+            raise Exception(f"Failed to send command {command} to {device_id}: {str(e)}")
     
-    def tv_volume_down(self, device_id: str) -> bool:
+    def execute(self, device_id: str, device_type: str, command: str, *args) -> bool:
         """
-        Decrease TV volume
+        Encode a catalogued command from plain values and send it
         
         Args:
-            device_id: TV device ID
+            device_id: Device or remote ID
+            device_type: deviceType or remoteType (see command_catalog)
+            command: Command name
+            *args: Parameter values, e.g. execute(id, "Air Conditioner", "setAll", 26, "cool", "auto", "on")
             
         Returns:
-            True if successful, False otherwise
+            True if successful
         """
-        try:
-            data = {"command": "volumeSub", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to decrease TV volume for {device_id}: {str(e)}")
+        data = build_command(device_type, command, *args)
+        if device_type in REMOTE_COMMANDS:
+            return self.send_infrared_command(device_id, data["command"], data["parameter"])
+        return self.send_command(device_id, data["command"], data["parameter"], data["commandType"])
+    
+    def turn_on_device(self, device_id: str) -> bool:
+        """Turn on a device"""
+        return self.send_command(device_id, "turnOn")
+    
+    def turn_off_device(self, device_id: str) -> bool:
+        """Turn off a device"""
+        return self.send_command(device_id, "turnOff")
+    
+    # ===== テレビ操作機能 =====
+    
+    def tv_power(self, device_id: str) -> bool:
+        """Toggle TV power"""
+        return self.send_command(device_id, "turnOn", device_type="TV")
+    
+    def tv_volume_up(self, device_id: str) -> bool:
+        """Increase TV volume"""
+        return self.send_command(device_id, "volumeAdd", device_type="TV")
+    
+    def tv_volume_down(self, device_id: str) -> bool:
+        """Decrease TV volume"""
+        return self.send_command(device_id, "volumeSub", device_type="TV")
     
     def tv_channel_up(self, device_id: str) -> bool:
-        """
-        Increase TV channel
-        
-        Args:
-            device_id: TV device ID
-            
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "channelAdd", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to increase TV channel for {device_id}: {str(e)}")
+        """Increase TV channel"""
+        return self.send_command(device_id, "channelAdd", device_type="TV")
     
     def tv_channel_down(self, device_id: str) -> bool:
-        """
-        Decrease TV channel
-        
-        Args:
-            device_id: TV device ID
-            
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "channelSub", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to decrease TV channel for {device_id}: {str(e)}")
+        """Decrease TV channel"""
+        return self.send_command(device_id, "channelSub", device_type="TV")
     
     def tv_set_channel(self, device_id: str, channel: int) -> bool:
-        """
-        Set TV to specific channel
-        
-        Args:
-            device_id: TV device ID
-            channel: Channel number
-            
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "SetChannel", "parameter": str(channel), "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to set TV channel for {device_id}: {str(e)}")
+        """Set TV to specific channel"""
+        return self.send_command(device_id, "SetChannel", str(channel), device_type="TV")
     
     def tv_set_volume(self, device_id: str, volume: int) -> bool:
-        """
-        Set TV volume to specific level
-        
-        Args:
-            device_id: TV device ID
-            volume: Volume level (0-100)
-            
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "setVolume", "parameter": str(volume), "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to set TV volume for {device_id}: {str(e)}")
+        """Set TV volume to specific level (0-100)"""
+        return self.send_command(device_id, "setVolume", str(volume), device_type="TV")
     
     # ===== エアコン操作機能 =====
     
     def ac_power(self, device_id: str) -> bool:
-        """
-        Toggle AC power
-        
-        Args:
-            device_id: AC device ID
-            
-        Returns:
-            True if successful, False otherwise
-        """
-        try:
-            data = {"command": "turnOn", "parameter": "default", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to toggle AC power for {device_id}: {str(e)}")
+        """Turn the AC on"""
+        return self.send_command(device_id, "turnOn", device_type="Air Conditioner")
     
-    def ac_set_temperature(self, device_id: str, temperature: int) -> bool:
+    def ac_set_temperature(self, device_id: str, temperature: int, mode: str = "auto", fan: str = "auto") -> bool:
         """
-        Set AC temperature
+        Set AC temperature (switches the AC on)
         
         Args:
             device_id: AC device ID
-            temperature: Temperature in Celsius
+            temperature: Temperature in Celsius (16-30)
+            mode: auto, cool, dry, fan or heat
+            fan: auto, low, medium or high
             
         Returns:
-            True if successful, False otherwise
+            True if successful
         """
-        try:
-            data = {"command": "setAll", "parameter": f"25,{temperature},auto", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to set AC temperature for {device_id}: {str(e)}")
+        return self.send_command(device_id, "setAll", format_set_all(temperature, mode, fan, "on"),
+                                 device_type="Air Conditioner")
     
-    def ac_set_mode(self, device_id: str, mode: str) -> bool:
+    def ac_set_mode(self, device_id: str, mode: str, temperature: int = 26, fan: str = "auto") -> bool:
         """
-        Set AC mode (cool, heat, auto, fan, dry)
+        Set AC mode (switches the AC on)
         
         Args:
             device_id: AC device ID
-            mode: Mode (cool, heat, auto, fan, dry)
+            mode: auto, cool, dry, fan or heat
+            temperature: Temperature in Celsius sent with the mode (setAll sets everything at once)
+            fan: auto, low, medium or high
             
         Returns:
-            True if successful, False otherwise
+            True if successful
         """
-        try:
-            data = {"command": "setAll", "parameter": f"25,25,{mode}", "commandType": "command"}
-            self._make_request(f'/devices/{device_id}/commands', method='POST', data=data)
-            return True
-        except Exception as e:
-            raise Exception(f"Failed to set AC mode for {device_id}: {str(e)}")
+        return self.send_command(device_id, "setAll", format_set_all(temperature, mode, fan, "on"),
+                                 device_type="Air Conditioner")
     
     # ===== シーン機能 =====
     
@@ -372,27 +385,24 @@ class SwitchBotAPI:
         Get supported device types and their commands
         
         Returns:
-            Dictionary of device types and their supported commands
+            Dictionary of device / remote types and their command names (from command_catalog)
         """
-        return {
-            "TV": ["power", "volume_up", "volume_down", "channel_up", "channel_down", "set_channel", "set_volume"],
-            "AC": ["power", "set_temperature", "set_mode"],
-            "Light": ["turn_on", "turn_off"],
-            "Switch": ["turn_on", "turn_off"],
-            "Meter": ["get_status"],
-            "MeterPlus": ["get_status"],
-            "OutdoorMeter": ["get_status"]
-        }
+        return device_types()
     
-    def get_infrared_remotes(self) -> List[Dict]:
+    def get_infrared_remotes(self, as_model: bool = False) -> List:
         """
         Get list of infrared remote devices
         
+        Args:
+            as_model: Return models.InfraredRemote objects instead of dicts
+            
         Returns:
             List of infrared remote device information
         """
         try:
-            result = self._make_request('/devices')
+            result = self._get_devices_body()
+            if as_model:
+                return parse_device_list(result)[1]
             if result and 'infraredRemoteList' in result:
                 return result['infraredRemoteList']
             return []
@@ -415,21 +425,95 @@ class SwitchBotAPI:
         except Exception as e:
             raise Exception(f"Failed to get infrared remote status for {remote_id}: {str(e)}")
     
-    def send_infrared_command(self, remote_id: str, command: str, parameter: str = "default") -> bool:
+    def send_infrared_command(self, remote_id: str, command: str, parameter: str = "default", force: bool = False) -> bool:
         """
         Send infrared command to a remote device
         
+        Commands that would not change the remote's last known state are
+        skipped (see ir_state.py) unless force is set. Invalid parameters
+        raise ValueError without calling the API.
+        
         Args:
             remote_id: Infrared remote device ID
             command: Command to send
             parameter: Command parameter
+            force: Send even if the state would not change
             
         Returns:
             True if successful, False otherwise
         """
+        validate_command(command, parameter)
+        if not force and self.remote_state is not None and self.remote_state.is_redundant(remote_id, command, parameter):
+            return True
         try:
-            data = {"command": command, "parameter": parameter, "commandType": "command"}
-            self._make_request(f'/devices/{remote_id}/commands', method='POST', data=data)
+            self._post_command(remote_id, {"command": command, "parameter": parameter, "commandType": "command"})
+            if self.remote_state is not None:
+                self.remote_state.record(remote_id, command, parameter)
             return True
         except Exception as e:
             raise Exception(f"Failed to send infrared command to {remote_id}: {str(e)}")
+
+# ===== クライアント共有 =====
+
+# 永続化データの保存先（カタログ・履歴など）
+DATA_DIR = os.getenv("SWITCHSENSE_DATA_DIR", ".switchsense")
+
+def data_path(name: str) -> str:
+    """
+    Get a path inside DATA_DIR, creating the directory if needed
+    
+    Args:
+        name: File name
+        
+    Returns:
+        Path to the file
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
+
+_clients: Dict[Tuple[str, str], SwitchBotAPI] = {}
+_clients_lock = threading.Lock()
+
+def load_credentials() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read SWITCHBOT_TOKEN / SWITCHBOT_SECRET, loading .env when python-dotenv is available
+    
+    Returns:
+        (token, secret) tuple; values are None when not configured
+    """
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    return os.getenv("SWITCHBOT_TOKEN"), os.getenv("SWITCHBOT_SECRET")
+
+def get_client(token: str, secret: str, daily_limit: int = DEFAULT_DAILY_LIMIT) -> SwitchBotAPI:
+    """
+    Get the shared client for a token/secret pair
+    
+    The client keeps its HTTP connection pool, /devices cache and daily
+    request budget, so every caller in the same process should go through
+    this function. Infrared remotes are tracked in the shared
+    ir_state store. SWITCHBOT_RECORD / SWITCHBOT_REPLAY switch the client to
+    recording or replaying traffic (see traffic_log.py).
+    
+    Args:
+        token: SwitchBot API token
+        secret: SwitchBot API secret
+        daily_limit: Daily request budget used when the client is first created
+        
+    Returns:
+        Shared SwitchBotAPI instance
+    """
+    key = (token, secret)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from ir_state import get_state_store
+            from runtime_ledger import get_command_log
+            client = SwitchBotAPI(token, secret, budget=RateBudget(daily_limit),
+                                  transport=transport_from_env(token, secret),
+                                  remote_state=get_state_store(), command_log=get_command_log())
+            _clients[key] = client
+        return client
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+SwitchBot CLI - ヘッドレス操作ツール
+⚡ Streamlitを読み込まずにデバイス一覧・状態取得・コマンド送信・シーン実行を行います
+
+使い方:
+    python switchbot_cli.py devices [--format table|json|ndjson]
+    python switchbot_cli.py status [DEVICE_ID ...] [--format json|ndjson] [--meters-only]
+    python switchbot_cli.py command DEVICE_ID COMMAND [PARAMETER]
+    python switchbot_cli.py scenes [--format table|json|ndjson]
+    python switchbot_cli.py scene SCENE_ID
+    python switchbot_cli.py poll [--site NAME ...] [--workers N]
+    python switchbot_cli.py export OUTPUT [--device ID ...] [--since DATE] [--until DATE] [--format csv|parquet|arrow]
+    python switchbot_cli.py runtime OUTPUT [--since DATE] [--until DATE]
+"""
+
+import argparse
+import json
+import sys
+from device_index import classify
+from switchbot_api import get_client, load_credentials
+
+def write_records(records, fmt, columns=None):
+    """レコードを指定フォーマットで標準出力に書き出す"""
+    if fmt == "ndjson":
+        for record in records:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    elif fmt == "json":
+        json.dump(list(records), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for record in records:
+            sys.stdout.write("\t".join(str(record.get(c, "")) for c in columns) + "\n")
+
+def list_all_devices(api):
+    """物理デバイスと仮想IRリモコンをまとめて返す（/devices は1回だけ呼ばれる）"""
+    devices = [dict(d, kind="device") for d in api.get_devices()]
+    remotes = [dict(r, kind="remote") for r in api.get_infrared_remotes()]
+    return devices + remotes
+
+def cmd_devices(api, args):
+    """デバイス一覧を表示"""
+    records = []
+    for device in list_all_devices(api):
+        records.append({
+            "deviceId": device.get("deviceId", "N/A"),
+            "deviceName": device.get("deviceName", "Unknown"),
+            "type": device.get("deviceType") or device.get("remoteType", "Unknown"),
+            "kind": device["kind"],
+            "hubDeviceId": device.get("hubDeviceId", ""),
+        })
+    write_records(records, args.format, ["deviceId", "type", "kind", "deviceName"])
+    return 0
+
+def iter_statuses(api, device_ids):
+    """デバイス状態を1件ずつ取得してレコードを返す（失敗しても続行）"""
+    for device_id in device_ids:
+        try:
+            yield {"deviceId": device_id, "status": api.get_device_status(device_id)}
+        except Exception as e:
+            yield {"deviceId": device_id, "error": str(e)}
+
+def cmd_status(api, args):
+    """デバイス状態を出力"""
+    device_ids = args.device_ids
+    if not device_ids:
+        devices = api.get_devices()
+        if args.meters_only:
+            # ダッシュボードと同じ分類で温度計を選ぶ
+            devices = [d for d in devices if classify(d) == "thermometer"]
+        device_ids = [d['deviceId'] for d in devices]
+    
+    failed = False
+    records = []
+    for record in iter_statuses(api, device_ids):
+        failed = failed or "error" in record
+        if args.format == "ndjson":
+            write_records([record], "ndjson")
+        else:
+            records.append(record)
+    if args.format != "ndjson":
+        write_records(records, "json")
+    return 1 if failed else 0
+
+def cmd_command(api, args):
+    """コマンドを送信"""
+    api.send_command(args.device_id, args.command, args.parameter)
+    print(f"✅ {args.command} を {args.device_id} に送信しました", file=sys.stderr)
+    return 0
+
+def cmd_scenes(api, args):
+    """シーン一覧を表示"""
+    write_records(api.get_scenes(), args.format, ["sceneId", "sceneName"])
+    return 0
+
+def cmd_scene(api, args):
+    """シーンを実行"""
+    api.execute_scene(args.scene_id)
+    print(f"✅ シーン {args.scene_id} を実行しました", file=sys.stderr)
+    return 0
+
+def cmd_poll(args):
+    """全拠点の温度計をアカウントごとの予算内でポーリング（NDJSON出力）"""
+    from account_pool import AccountPool, load_accounts
+    
+    accounts = load_accounts()
+    if not accounts:
+        print("❌ SwitchBot API認証情報が見つかりません (SWITCHBOT_ACCOUNTS / SWITCHBOT_TOKEN)", file=sys.stderr)
+        return 2
+    
+    pool = AccountPool(accounts, max_workers=args.workers)
+    try:
+        for catalog in pool.catalogs.values():
+            if not catalog.is_loaded:
+                catalog.refresh()
+        results = pool.poll_meters(args.sites or None, use_processes=args.workers != 1)
+    finally:
+        pool.close()
+    
+    failed = False
+    for site, statuses in results.items():
+        for device_id, result in statuses.items():
+            failed = failed or "error" in result
+            write_records([dict(result, site=site, deviceId=device_id)], "ndjson")
+    return 1 if failed else 0
+
+def cmd_export(args):
+    """保存済みの温度計履歴をCSV / Parquet / Arrowに書き出す"""
+    from history_export import export_history, parse_time
+    
+    count = export_history(
+        args.output, fmt=args.format, device_ids=args.device_ids,
+        since=parse_time(args.since), until=parse_time(args.until), batch_size=args.batch_size,
+    )
+    print(f"✅ {count}件を書き出しました", file=sys.stderr)
+    return 0
+
+def cmd_runtime(args):
+    """エアコン・照明などの日別稼働時間をCSVに書き出す（電源コマンドの記録から集計）"""
+    from datetime import date
+    from runtime_ledger import export_runtime
+    
+    since = date.fromisoformat(args.since) if args.since else None
+    until = date.fromisoformat(args.until) if args.until else None
+    count = export_runtime(args.output, since=since, until=until)
+    print(f"✅ {count}件を書き出しました", file=sys.stderr)
+    return 0
+
+def build_parser():
+    """引数パーサーを構築"""
+    parser = argparse.ArgumentParser(prog="switchbot_cli", description="SwitchBot headless CLI")
+    sub = parser.add_subparsers(dest="subcommand", required=True)
+    
+    p = sub.add_parser("devices", help="list devices and infrared remotes")
+    p.add_argument("--format", choices=["table", "json", "ndjson"], default="table")
+    p.set_defaults(func=cmd_devices)
+    
+    p = sub.add_parser("status", help="dump device statuses")
+    p.add_argument("device_ids", nargs="*", metavar="DEVICE_ID")
+    p.add_argument("--format", choices=["json", "ndjson"], default="json")
+    p.add_argument("--meters-only", action="store_true", help="only thermometers (as classified on the dashboard) when no ID is given")
+    p.set_defaults(func=cmd_status)
+    
+    p = sub.add_parser("command", help="send a command to a device or remote")
+    p.add_argument("device_id")
+    p.add_argument("command")
+    p.add_argument("parameter", nargs="?", default="default")
+    p.set_defaults(func=cmd_command)
+    
+    p = sub.add_parser("scenes", help="list scenes")
+    p.add_argument("--format", choices=["table", "json", "ndjson"], default="table")
+    p.set_defaults(func=cmd_scenes)
+    
+    p = sub.add_parser("scene", help="execute a scene")
+    p.add_argument("scene_id")
+    p.set_defaults(func=cmd_scene)
+    
+    p = sub.add_parser("poll", help="poll meters of every account under each account's budget")
+    p.add_argument("--site", dest="sites", action="append", help="limit to a site (repeatable)")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (1 = inline)")
+    p.set_defaults(func=cmd_poll, needs_client=False)
+    
+    p = sub.add_parser("export", help="export stored meter history (CSV, Parquet or Arrow IPC)")
+    p.add_argument("output", help="output file (.csv, .parquet, .arrow) or - for CSV on stdout")
+    p.add_argument("--device", dest="device_ids", action="append", help="limit to a device (repeatable)")
+    p.add_argument("--since", default=None, help="start date/time, e.g. 2025-01-01")
+    p.add_argument("--until", default=None, help="end date/time (exclusive)")
+    p.add_argument("--format", choices=["csv", "parquet", "arrow"], default=None, help="default: from the file name")
+    p.add_argument("--batch-size", type=int, default=50000, help="rows per streamed batch")
+    p.set_defaults(func=cmd_export, needs_client=False)
+    
+    p = sub.add_parser("runtime", help="export daily runtime per device from the power command log (CSV)")
+    p.add_argument("output", help="output CSV file or - for stdout")
+    p.add_argument("--since", default=None, help="first day, e.g. 2025-01-01")
+    p.add_argument("--until", default=None, help="end day (exclusive)")
+    p.set_defaults(func=cmd_runtime, needs_client=False)
+    
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not getattr(args, "needs_client", True):
+        return args.func(args)
+    
+    token, secret = load_credentials()
+    if not token or not secret:
+        print("❌ SwitchBot API認証情報が見つかりません (SWITCHBOT_TOKEN / SWITCHBOT_SECRET)", file=sys.stderr)
+        return 2
+    
+    api = get_client(token, secret)
+    try:
+        return args.func(api, args)
+    except Exception as e:
+        print(f"❌ エラー: {str(e)}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
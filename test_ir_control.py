@@ -4,28 +4,21 @@
 🎮 実際にIRリモコンを操作してみます〜！
 """
 
-import os
-import time
-from switchbot_api import SwitchBotAPI
-from dotenv import load_dotenv
+from switchbot_api import get_client, load_credentials
 
 def main():
     print("🎮 仮想IRリモコン操作テストを開始します...")
     print("=" * 50)
     
-    # 環境変数を読み込み
-    load_dotenv()
-    
-    # API認証情報を取得
-    token = os.getenv("SWITCHBOT_TOKEN")
-    secret = os.getenv("SWITCHBOT_SECRET")
+    # API認証情報を取得（.envも読み込み）
+    token, secret = load_credentials()
     
     if not token or not secret:
         print("❌ SwitchBot API認証情報が見つかりません")
         return
     
     # APIクライアントを初期化
-    api = SwitchBotAPI(token, secret)
+    api = get_client(token, secret)
     
     try:
         # 仮想IRリモコン一覧を取得
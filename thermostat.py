@@ -0,0 +1,281 @@
+"""
+Closed-loop thermostat automation
+
+Each room pairs a meter with an air conditioner, which is either an
+infrared remote (driven with setAll) or a cloud-connected AC (driven with
+ac_set_temperature / turnOff). The controller subscribes to the meter
+poller and decides on every tick whether the AC should run, using a
+hysteresis band around the target and a minimum dwell time between
+switches. A command is sent only when the desired state differs from the
+last state sent, so steady rooms cost no IR traffic or API calls. Every
+decision is appended to an NDJSON log for offline review.
+
+Room file (DATA_DIR/thermostat.json):
+    [{"name": "living", "meter_id": "C1...", "ac_id": "02-...", "kind": "ir",
+      "mode": "cool", "target": 26.0, "hysteresis": 0.5, "setpoint": 25,
+      "fan": "auto", "min_dwell_minutes": 10, "lead_minutes": 30}]
+
+With lead_minutes set and a forecaster attached, an idle AC inside the
+band is started early when the forecast for that lead time is outside
+it (pre-cooling / pre-heating).
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import MISSING, dataclass, fields
+from typing import Dict, List, Optional
+
+from command_catalog import AC_TEMPERATURE_RANGE
+from models import MeterStatus
+from switchbot_api import AC_FAN_VALUES, data_path, format_set_all
+
+AC_KINDS = ("ir", "physical")
+# dry-run で送信を省略したときの _send() の戻り値
+SIMULATED = "simulated"
+CONTROL_MODES = ("cool", "heat")
+
+@dataclass
+class Room:
+    """Meter / air conditioner pair with its control parameters"""
+    name: str
+    meter_id: str
+    ac_id: str
+    kind: str = "ir"
+    mode: str = "cool"
+    target: float = 26.0
+    hysteresis: float = 0.5
+    setpoint: Optional[int] = None
+    fan: str = "auto"
+    min_dwell_minutes: float = 10.0
+    stale_minutes: float = 15.0
+    lead_minutes: float = 0.0
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Room":
+        """
+        Build and validate a room
+        
+        Args:
+            data: Room fields (see module docstring)
+        
+        Returns:
+            Room
+        
+        Raises:
+            ValueError: A key is unknown or missing, or a value is invalid
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"Room entry must be an object, got {data!r}")
+        where = data.get("name", "room")
+        names = {f.name for f in fields(cls)}
+        unknown = set(data) - names
+        if unknown:
+            raise ValueError(f"Unknown key(s) in {where}: {', '.join(sorted(unknown))}")
+        missing = [f.name for f in fields(cls) if f.default is MISSING and f.name not in data]
+        if missing:
+            raise ValueError(f"Missing key(s) in {where}: {', '.join(missing)}")
+        room = cls(**data)
+        if room.kind not in AC_KINDS:
+            raise ValueError(f"Unknown AC kind for {room.name}: {room.kind}")
+        if room.mode not in CONTROL_MODES:
+            raise ValueError(f"Unknown control mode for {room.name}: {room.mode}")
+        if room.fan not in AC_FAN_VALUES:
+            raise ValueError(f"Unknown fan speed for {room.name}: {room.fan}")
+        if room.hysteresis < 0 or room.min_dwell_minutes < 0:
+            raise ValueError(f"Room {room.name} needs hysteresis and min_dwell_minutes >= 0")
+        if room.setpoint is None:
+            room.setpoint = int(round(room.target))
+        low, high = AC_TEMPERATURE_RANGE
+        if isinstance(room.setpoint, bool) or not isinstance(room.setpoint, int) or not low <= room.setpoint <= high:
+            raise ValueError(f"Setpoint for {room.name} must be an integer from {low} to {high}, got {room.setpoint!r}")
+        return room
+    
+    def wants_on(self, temperature: float) -> Optional[bool]:
+        """
+        Desired AC state for a reading
+        
+        Args:
+            temperature: Room temperature in Celsius
+        
+        Returns:
+            True / False outside the hysteresis band, None inside it (keep state)
+        """
+        error = temperature - self.target if self.mode == "cool" else self.target - temperature
+        if error >= self.hysteresis:
+            return True
+        if error <= -self.hysteresis:
+            return False
+        return None
+
+def load_rooms(path: Optional[str] = None) -> List[Room]:
+    """
+    Load rooms from a JSON list
+    
+    Args:
+        path: Room file (default: DATA_DIR/thermostat.json)
+    
+    Returns:
+        List of validated rooms (empty when the file does not exist)
+    """
+    path = path or data_path("thermostat.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return []
+    return [Room.from_dict(e) for e in entries]
+
+class ThermostatController:
+    """Hysteresis / dwell-time controller fed by meter poller ticks"""
+    
+    def __init__(self, api, rooms: List[Room], state_path: Optional[str] = None,
+                 log_path: Optional[str] = None, dry_run: bool = False, forecaster=None):
+        """
+        Args:
+            api: SwitchBotAPI or AccountRouter used to send commands
+            rooms: Rooms to control
+            state_path: Last sent state per room (default: DATA_DIR/thermostat_state.json)
+            log_path: Decision log (default: DATA_DIR/thermostat_decisions.ndjson)
+            dry_run: Log decisions without sending commands
+            forecaster: forecast.ForecastBank used for rooms with lead_minutes
+        """
+        self.api = api
+        self.rooms = rooms
+        self.state_path = state_path or data_path("thermostat_state.json")
+        self.log_path = log_path or data_path("thermostat_decisions.ndjson")
+        self.dry_run = dry_run
+        self.forecaster = forecaster
+        self._lock = threading.Lock()
+        self._by_meter: Dict[str, List[Room]] = {}
+        for room in rooms:
+            self._by_meter.setdefault(room.meter_id, []).append(room)
+        # {room名: {"on": bool, "changed_at": float}}
+        self.state: Dict[str, Dict] = self._load_state()
+        # dry-run で仮に切り替えた状態（ヒステリシス・最短運転時間の判定用。保存はしない）
+        self._simulated: Dict[str, Dict] = {}
+    
+    def _load_state(self) -> Dict[str, Dict]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def _save_state(self):
+        # 一時ファイルはプロセスごとに分ける（常駐のポーリングと --once の手動実行が重なっても壊さない）
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+    
+    def _log(self, entries: List[Dict]):
+        if not entries:
+            return
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    
+    def _send(self, room: Room, on: bool):
+        """Send the command switching a room's AC on or off (SIMULATED in dry-run)"""
+        if self.dry_run:
+            return SIMULATED
+        if room.kind == "ir":
+            parameter = format_set_all(room.setpoint, room.mode, room.fan, "on" if on else "off")
+            return self.api.send_infrared_command(room.ac_id, "setAll", parameter)
+        if on:
+            return self.api.ac_set_temperature(room.ac_id, room.setpoint, room.mode, room.fan)
+        return self.api.turn_off_device(room.ac_id)
+    
+    def decide(self, room: Room, sample: MeterStatus, now: float) -> Dict:
+        """
+        Evaluate one room for one reading and send a command if its state changes
+        
+        Args:
+            room: Room to evaluate
+            sample: Latest reading of the room's meter
+            now: Current time (epoch seconds)
+        
+        Returns:
+            Decision record (also written to the decision log)
+        """
+        state = self._simulated.get(room.name) or self.state.get(room.name, {"on": None, "changed_at": 0.0})
+        decision = {
+            "timestamp": now,
+            "room": room.name,
+            "temperature": sample.temperature,
+            "target": room.target,
+            "mode": room.mode,
+            "on": state["on"],
+            "action": "hold",
+            "reason": "",
+            "sent": False,
+        }
+        if sample.temperature is None:
+            decision["reason"] = "no reading"
+            return decision
+        if now - sample.timestamp > room.stale_minutes * 60:
+            decision["reason"] = "stale reading"
+            return decision
+        
+        wanted = room.wants_on(sample.temperature)
+        reason = f"{sample.temperature:.1f}°C vs target {room.target:.1f}±{room.hysteresis:.1f}"
+        if wanted is None and not state["on"] and room.lead_minutes > 0 and self.forecaster is not None:
+            # 予測が帯の外に出るなら先回りして運転開始
+            predicted = self.forecaster.predict_at(room.meter_id, now + room.lead_minutes * 60)
+            if predicted is not None and room.wants_on(predicted):
+                wanted = True
+                decision["forecast"] = round(predicted, 2)
+                reason = f"forecast {predicted:.1f}°C in {room.lead_minutes:.0f} min vs target {room.target:.1f}±{room.hysteresis:.1f}"
+        if wanted is None:
+            decision["reason"] = "within hysteresis band"
+            return decision
+        if wanted == state["on"]:
+            decision["reason"] = "already " + ("on" if wanted else "off")
+            return decision
+        dwell_left = room.min_dwell_minutes * 60 - (now - state["changed_at"])
+        if state["on"] is not None and dwell_left > 0:
+            decision["reason"] = f"min dwell ({int(dwell_left)}s left)"
+            return decision
+        
+        decision["action"] = "on" if wanted else "off"
+        decision["reason"] = reason
+        try:
+            result = self._send(room, wanted)
+        except Exception as e:
+            result = False
+            decision["error"] = str(e)
+        if result == SIMULATED:
+            # 実際の状態ファイルには反映しない（本番の制御が偽の状態から始まらないように）
+            decision["dry_run"] = True
+            self._simulated[room.name] = {"on": wanted, "changed_at": now}
+            decision["on"] = wanted
+            return decision
+        decision["sent"] = bool(result)
+        if decision["sent"]:
+            self.state[room.name] = {"on": wanted, "changed_at": now}
+            decision["on"] = wanted
+        return decision
+    
+    def process(self, samples: List[MeterStatus], now: Optional[float] = None) -> List[Dict]:
+        """
+        Poller subscriber: evaluate every room whose meter reported this tick
+        
+        Args:
+            samples: Readings of one poll tick
+            now: Current time (default: time.time())
+        
+        Returns:
+            Decision records of this tick
+        """
+        now = now or time.time()
+        decisions = []
+        with self._lock:
+            for sample in samples:
+                for room in self._by_meter.get(sample.device_id, ()):
+                    decisions.append(self.decide(room, sample, now))
+            if any(d["sent"] for d in decisions):
+                self._save_state()
+            self._log(decisions)
+        return decisions
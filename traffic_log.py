@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Record and replay SwitchBot API traffic
+
+RecordingTransport wraps the HTTP session used by SwitchBotAPI and
+appends one compact JSON line per request (method, endpoint, payload,
+status, latency and response body) with credentials removed.
+ReplayTransport serves such a log back with the original latencies, or
+scaled ones, so a slow dashboard render can be reproduced and profiled
+locally on identical traffic. With pacing enabled it also holds each
+response until its recorded offset from the start of the recording
+("at", scaled by the same speed), reproducing the gaps between requests.
+
+Usage:
+    SWITCHBOT_RECORD=traffic.ndjson.gz streamlit run SwitchbotMoniter.py
+    SWITCHBOT_REPLAY=traffic.ndjson.gz SWITCHBOT_REPLAY_SPEED=1.0 streamlit run SwitchbotMoniter.py
+    SWITCHBOT_REPLAY=traffic.ndjson.gz SWITCHBOT_REPLAY_PACE=1 streamlit run SwitchbotMoniter.py
+    python traffic_log.py traffic.ndjson.gz
+"""
+
+import atexit
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+def _open_log(path: str, mode: str):
+    """Open a log file, gzip-compressed when the name ends with .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _endpoint(url: str) -> str:
+    """Strip scheme, host and API version so recordings survive BASE_URL changes"""
+    path = urlsplit(url).path
+    parts = path.split("/", 2)
+    return "/" + parts[2] if len(parts) > 2 and parts[1].startswith("v") else path
+
+class _SharedLog:
+    """
+    One append handle per log file, shared by every RecordingTransport writing to it
+    
+    Each record goes out in a single os.write() on an O_APPEND descriptor
+    (as its own gzip member for ".gz" logs, which gzip readers concatenate),
+    so polling worker processes can record into the same file without
+    their lines interleaving.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.users = 0
+        self._compress = path.endswith(".gz")
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        atexit.register(self.close)
+    
+    def write(self, line: str):
+        data = (line + "\n").encode("utf-8")
+        if self._compress:
+            data = gzip.compress(data)
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, data)
+    
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+# プロセス内ではパスごとに1つの書き込みハンドルを共有する
+_logs: Dict[str, _SharedLog] = {}
+_logs_lock = threading.Lock()
+
+def _acquire_log(path: str) -> _SharedLog:
+    key = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = _SharedLog(path)
+        log.users += 1
+        return log
+
+def _release_log(log: _SharedLog):
+    with _logs_lock:
+        log.users -= 1
+        if log.users > 0:
+            return
+        _logs.pop(os.path.abspath(log.path), None)
+    log.close()
+
+class RecordingTransport:
+    """requests.Session-compatible wrapper that logs every request"""
+    
+    def __init__(self, path: str, inner=None, secrets: Tuple[str, ...] = ()):
+        """
+        Args:
+            path: Log file (".gz" suffix for gzip)
+            inner: Session doing the real requests (default: new requests.Session)
+            secrets: Strings replaced with "***" wherever they appear in the log
+        """
+        self.path = path
+        self.inner = inner or requests.Session()
+        self.secrets = tuple(s for s in secrets if s)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._log: Optional[_SharedLog] = _acquire_log(path)
+        atexit.register(self.close)
+    
+    def _redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "***")
+        return text
+    
+    def _record(self, method: str, url: str, payload: Optional[Dict], started: float, elapsed: float,
+                response: Optional[requests.Response], error: Optional[Exception]):
+        entry = {
+            "at": round(started - self._started, 4),
+            "method": method,
+            "endpoint": _endpoint(url),
+            "payload": payload,
+            "elapsed": round(elapsed, 4),
+        }
+        if response is not None:
+            entry["status"] = response.status_code
+            entry["body"] = response.content.decode("utf-8", errors="replace")
+        else:
+            entry["error"] = str(error)
+        line = self._redact(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+        with self._lock:
+            log = self._log
+        if log is not None:
+            log.write(line)
+    
+    def request(self, method: str, url: str, json: Optional[Dict] = None, **kwargs):
+        """Send a request through the inner session and log it (headers are never logged)"""
+        started = time.time()
+        perf = time.perf_counter()
+        try:
+            response = self.inner.request(method, url, json=json, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self._record(method, url, json, started, time.perf_counter() - perf, None, e)
+            raise
+        self._record(method, url, json, started, time.perf_counter() - perf, response, None)
+        return response
+    
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, json: Optional[Dict] = None, **kwargs):
+        return self.request("POST", url, json=json, **kwargs)
+    
+    def close(self):
+        with self._lock:
+            log, self._log = self._log, None
+        if log is not None:
+            _release_log(log)
+
+class ReplayResponse:
+    """Minimal requests.Response stand-in built from a log entry"""
+    
+    def __init__(self, status_code: int, content: bytes, url: str = ""):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+    
+    def json(self):
+        return json.loads(self.content)
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} replayed error for {self.url}", response=self)
+
+def load_log(path: str) -> List[Dict]:
+    """Read every entry of a traffic log (a gzip stream cut off by a crash is read up to the last flush)"""
+    entries = []
+    with _open_log(path, "r") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        except EOFError:
+            pass
+    return entries
+
+class ReplayTransport:
+    """requests.Session-compatible transport that answers from a recording"""
+    
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = True, pace: bool = False):
+        """
+        Args:
+            path: Log written by RecordingTransport
+            speed: Latency multiplier (1.0 = original, 0 = no delay, 0.5 = twice as fast)
+            loop: Start over for an endpoint once its recorded responses are used up
+            pace: Also keep the recorded timing between requests: a response is not
+                started before its "at" offset (times speed) since this transport was created
+        """
+        self.speed = speed
+        self.loop = loop
+        self.pace = pace
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        for entry in load_log(path):
+            self._entries[(entry["method"], entry["endpoint"])].append(entry)
+        self._queues: Dict[Tuple[str, str], Deque[Dict]] = {
+            key: deque(entries) for key, entries in self._entries.items()
+        }
+    
+    def _next_entry(self, key: Tuple[str, str]) -> Optional[Dict]:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                if not self.loop or key not in self._entries:
+                    return None
+                queue = self._queues[key] = deque(self._entries[key])
+            return queue.popleft()
+    
+    def request(self, method: str, url: str, **kwargs):
+        """Serve the next recorded response for (method, endpoint)"""
+        entry = self._next_entry((method, _endpoint(url)))
+        if entry is None:
+            return ReplayResponse(404, b'{"message":"not recorded"}', url)
+        if self.speed > 0:
+            if self.pace:
+                # 録画時のリクエスト間隔を再現（予定より遅れている場合は待たない）
+                time.sleep(max(0.0, self._started + entry.get("at", 0) * self.speed - time.monotonic()))
+            time.sleep(entry.get("elapsed", 0) * self.speed)
+        if "error" in entry:
+            raise requests.exceptions.ConnectionError(f"replayed error: {entry['error']}")
+        return ReplayResponse(entry.get("status", 200), entry.get("body", "").encode("utf-8"), url)
+    
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+def transport_from_env(token: str = "", secret: str = ""):
+    """
+    Build a transport from SWITCHBOT_REPLAY / SWITCHBOT_RECORD
+    
+    SWITCHBOT_REPLAY_SPEED scales replayed latencies and SWITCHBOT_REPLAY_PACE=1
+    also reproduces the recorded gaps between requests.
+    
+    Args:
+        token: API token to redact from recordings
+        secret: API secret to redact from recordings
+    
+    Returns:
+        ReplayTransport, RecordingTransport or None
+    """
+    replay_path = os.getenv("SWITCHBOT_REPLAY")
+    if replay_path:
+        return ReplayTransport(replay_path, speed=float(os.getenv("SWITCHBOT_REPLAY_SPEED", "1.0")),
+                               pace=os.getenv("SWITCHBOT_REPLAY_PACE") == "1")
+    record_path = os.getenv("SWITCHBOT_RECORD")
+    if record_path:
+        return RecordingTransport(record_path, secrets=(token, secret))
+    return None
+
+def summarize(path: str) -> List[Dict]:
+    """
+    Per-endpoint request counts and latency percentiles of a traffic log
+    
+    Args:
+        path: Traffic log
+    
+    Returns:
+        One dict per (method, endpoint pattern), slowest p95 first
+    """
+    groups: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+    for entry in load_log(path):
+        parts = entry["endpoint"].split("/")
+        # デバイスIDを伏せてエンドポイント単位で集計
+        pattern = "/".join("{id}" if i == 2 and len(parts) > 3 else p for i, p in enumerate(parts))
+        groups[(entry["method"], pattern)].append(entry.get("elapsed", 0.0))
+    rows = []
+    for (method, pattern), values in groups.items():
+        values.sort()
+        rows.append({
+            "method": method,
+            "endpoint": pattern,
+            "count": len(values),
+            "p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 1),
+            "total_ms": round(sum(values) * 1000, 1),
+        })
+    rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+    return rows
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python traffic_log.py <traffic log>", file=sys.stderr)
+        sys.exit(2)
+    for row in summarize(sys.argv[1]):
+        print(f"{row['method']:4} {row['endpoint']:40} n={row['count']:<5} p50={row['p50_ms']}ms p95={row['p95_ms']}ms total={row['total_ms']}ms")